@@ -3,21 +3,330 @@
 import keypirinha as kp
 import keypirinha_util as kpu
 import keypirinha_wintypes as kpwt
+import collections
+import concurrent.futures
+import copy
+import fnmatch
 import os
 import glob
+import itertools
 import re
+import threading
 import time
 import traceback
 
+class _ScanCache:
+    """
+    A process-wide cache of directory listings, shared by the plugins of this
+    package so that a directory scanned by several of them (e.g. a Start Menu
+    folder listed in *extra_paths*) is read only once, whatever they look for
+    in it.
+
+    The listing of a directory is reused as long as the modification time of
+    that directory has not changed. The results of :py:meth:`scan_directory`
+    are built in memory from the listings. Concurrent requests of the same
+    listing wait for the first one instead of reading the directory again.
+
+    A plugin scans through a :py:meth:`session` of the cache, which records the
+    directories it lists. The listings that are not used anymore by the last
+    catalog pass of any plugin are dropped (see :py:meth:`retain`).
+    """
+    FILE_ATTRIBUTE_HIDDEN = 0x2
+
+    # the keys of the listings used through a session, None for the cache
+    keys = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listings = {} # normalized path -> future of (mtime, entries)
+        self._retained = {} # plugin class name -> keys of its last session
+
+    def session(self):
+        """
+        Return a view of the cache that records the keys of the listings used
+        through it. It may be used from several threads.
+        """
+        session = copy.copy(self)
+        session.keys = set()
+        return session
+
+    def retain(self, plugin, session=None):
+        """
+        Keep the listings used through *session* on behalf of *plugin*, in
+        place of the ones of its previous session, and drop the listings that
+        no plugin has used in its last session. A *session* of ``None`` keeps
+        nothing for *plugin*.
+        """
+        # a reloaded plugin replaces its former instance
+        name = plugin.__class__.__name__
+        with self._lock:
+            self._retained[name] = session.keys if session is not None else ()
+            retained = set().union(*self._retained.values())
+            for key in [key for key, future in self._listings.items()
+                        if key not in retained and future.done()]:
+                del self._listings[key]
+
+    def scan_directory(self, base_dir, name_patterns, flags, max_level):
+        """
+        Same as ``kpu.scan_directory()``, except that the entries are returned
+        as a tuple, along with a boolean that tells whether they all come from
+        the cache
+        """
+        if isinstance(name_patterns, str):
+            name_patterns = (name_patterns, )
+        if not flags & (kpu.ScanFlags.FILES | kpu.ScanFlags.DIRS):
+            flags |= kpu.ScanFlags.FILES
+        name_match = re.compile(
+            "|".join(fnmatch.translate(p) for p in name_patterns),
+            0 if flags & kpu.ScanFlags.CASE_SENSITIVE else re.IGNORECASE).match
+
+        # the base directory must be readable, the sub-directories that are
+        # not are skipped
+        entries, all_cached = self.list_directory(base_dir)
+        results = []
+        dirs = collections.deque(((base_dir, "", 0, entries), ))
+        while dirs:
+            dir_path, rel_dir, level, entries = dirs.popleft()
+            for name, is_dir, is_hidden in entries:
+                if is_hidden and not flags & kpu.ScanFlags.HIDDEN:
+                    continue
+                if (flags & (kpu.ScanFlags.DIRS if is_dir else
+                             kpu.ScanFlags.FILES)) and name_match(name):
+                    rel_path = os.path.join(rel_dir, name)
+                    if flags & kpu.ScanFlags.ABSPATH:
+                        results.append(os.path.join(base_dir, rel_path))
+                    else:
+                        results.append(rel_path)
+                if is_dir and (max_level < 0 or level < max_level):
+                    sub_dir = os.path.join(dir_path, name)
+                    try:
+                        sub_entries, cached = self.list_directory(sub_dir)
+                    except OSError:
+                        continue
+                    all_cached = all_cached and cached
+                    dirs.append((sub_dir, os.path.join(rel_dir, name),
+                                 level + 1, sub_entries))
+
+        return tuple(results), all_cached
+
+    def list_directory(self, dir_path):
+        """
+        Return the content of *dir_path* as a tuple of
+        ``(name, is_dir, is_hidden)`` tuples, in the order of
+        :py:func:`os.scandir`, along with a boolean that tells whether it comes
+        from the cache
+        """
+        key = os.path.normcase(os.path.normpath(dir_path))
+        if self.keys is not None:
+            self.keys.add(key)
+
+        while True:
+            with self._lock:
+                future = self._listings.get(key, None)
+                if future is None:
+                    # this thread reads the directory
+                    future = concurrent.futures.Future()
+                    self._listings[key] = future
+                    break
+
+            # raises the OSError of the listing, if it failed
+            mtime, entries = future.result()
+            if self._mtime(dir_path) == mtime:
+                return entries, True
+            with self._lock:
+                if self._listings.get(key, None) is future:
+                    del self._listings[key]
+
+        try:
+            mtime, entries = self._read_directory(dir_path)
+        except Exception as exc:
+            with self._lock:
+                if self._listings.get(key, None) is future:
+                    del self._listings[key]
+            future.set_exception(exc)
+            raise
+        future.set_result((mtime, entries))
+        return entries, False
+
+    def iglob(self, pattern):
+        """
+        Yield the paths matching *pattern*, like ``glob.iglob(pattern,
+        recursive=True)`` does (same matching rules, same handling of the names
+        starting with a dot, same order), except that the directories are
+        listed through the cache
+        """
+        # like glob.iglob(), only the part of the pattern that follows the
+        # drive is expanded since a drive may contain a "?" (e.g. \\?\C:\dir)
+        drive, tail = os.path.splitdrive(pattern)
+        if not glob.has_magic(tail):
+            if os.path.basename(pattern):
+                if os.path.lexists(pattern):
+                    yield pattern
+            elif os.path.isdir(os.path.dirname(pattern)):
+                # a trailing separator only matches a directory
+                yield pattern
+            return
+
+        # split the pattern into its non-magic base directory and the
+        # segments to match below it
+        segments = tail.split(os.sep)
+        idx = 0
+        while not glob.has_magic(segments[idx]):
+            idx += 1
+        base_dir = os.sep.join(segments[0:idx])
+        if not base_dir and tail.startswith(os.sep):
+            base_dir = os.sep
+        yield from self._iglob_segments(drive + base_dir, segments[idx:])
+
+    def _iglob_segments(self, dir_path, segments):
+        segment = segments[0]
+        is_last = len(segments) == 1
+
+        if not glob.has_magic(segment):
+            path = os.path.join(dir_path, segment)
+            if not segment:
+                # trailing separator
+                if os.path.isdir(dir_path):
+                    yield path
+            elif os.path.lexists(path):
+                if is_last:
+                    yield path
+                else:
+                    yield from self._iglob_segments(path, segments[1:])
+            return
+
+        if segment == "**":
+            names = itertools.chain(
+                ("", ), self._iglob_descendants(dir_path, not is_last))
+        else:
+            names = self._iglob_names(dir_path, not is_last)
+            if segment[0] != ".":
+                names = (name for name, _ in names if name[0] != ".")
+            else:
+                names = (name for name, _ in names)
+            names = fnmatch.filter(names, segment)
+
+        for name in names:
+            path = os.path.join(dir_path, name)
+            if is_last:
+                yield path
+            else:
+                yield from self._iglob_segments(path, segments[1:])
+
+    def _iglob_names(self, dir_path, dirs_only):
+        # the (name, is_dir) pairs of the content of *dir_path*
+        try:
+            entries, _ = self.list_directory(dir_path or os.curdir)
+        except OSError:
+            return []
+        return [(name, is_dir) for name, is_dir, _ in entries
+                if is_dir or not dirs_only]
+
+    def _iglob_descendants(self, dir_path, dirs_only):
+        # the relative paths of the descendants of *dir_path* which names do
+        # not start with a dot, parents first, as the "**" segment expands to
+        for name, is_dir in self._iglob_names(dir_path, dirs_only):
+            if name[0] == ".":
+                continue
+            yield name
+            if is_dir:
+                for sub_name in self._iglob_descendants(
+                        os.path.join(dir_path, name), dirs_only):
+                    yield os.path.join(name, sub_name)
+
+    def _read_directory(self, dir_path):
+        # the modification time is read first so that a change made while
+        # the directory is being read invalidates the listing
+        mtime = os.stat(dir_path).st_mtime_ns
+        entries = []
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                try:
+                    is_hidden = bool(
+                        entry.stat(follow_symlinks=False).st_file_attributes &
+                        self.FILE_ATTRIBUTE_HIDDEN)
+                except AttributeError:
+                    # not on Windows
+                    is_hidden = entry.name[0] == "."
+                except OSError:
+                    is_hidden = False
+                entries.append((entry.name, is_dir, is_hidden))
+        return mtime, tuple(entries)
+
+    def _mtime(self, dir_path):
+        try:
+            return os.stat(dir_path).st_mtime_ns
+        except OSError:
+            return None
+
+_scan_cache = _ScanCache()
+
+class _CatalogRegistry:
+    """
+    The targets of the files cataloged by the plugins of this package, so that
+    a file found by several of them is cataloged only once, by the plugin with
+    the lowest *CATALOG_RANK*.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._targets = {} # rank -> set of normalized targets
+        self._dirty = set() # ranks of the plugins that must commit again
+
+    def commit(self, plugin, catalog):
+        """
+        Commit the *catalog* of *plugin*, minus the items already cataloged by
+        a plugin of a lower rank. The plugins of a higher rank are marked as
+        :py:meth:`dirty` if this changes the set of targets they must skip.
+        """
+        rank = plugin.CATALOG_RANK
+        targets = set(os.path.normcase(item.target()) for item in catalog)
+        with self._lock:
+            self._dirty.discard(rank)
+            skipped = set()
+            for other_rank, other_targets in self._targets.items():
+                if other_rank < rank:
+                    skipped |= other_targets
+            if self._targets.get(rank, None) != targets:
+                self._dirty.update(
+                    other_rank for other_rank in self._targets
+                    if other_rank > rank)
+            self._targets[rank] = targets
+
+        if skipped:
+            catalog = [item for item in catalog
+                       if os.path.normcase(item.target()) not in skipped]
+        plugin.set_catalog(catalog)
+        return len(catalog)
+
+    def dirty(self, plugin):
+        """
+        Return ``True`` if a plugin of a lower rank than *plugin* has changed
+        its catalog since *plugin* last committed its own. It is up to
+        *plugin* to commit it again, from its own thread.
+        """
+        with self._lock:
+            return plugin.CATALOG_RANK in self._dirty
+
+_catalog_registry = _CatalogRegistry()
+
 class _BasePlugin(kp.Plugin):
     ITEMCAT_CUSTOMCMD = kp.ItemCategory.USER_BASE + 1
 
+    # precedence of the plugin when a file is found by several of them, the
+    # lower the better
+    CATALOG_RANK = None
+
     CONFIG_SECTION_MAIN = "main"
     CONFIG_SECTION_CUSTOMCMD_DEFAULTS = "custom_commands"
     CONFIG_SECTION_CUSTOMCMD = "cmd"
 
     def __init__(self):
         super().__init__()
+        self._catalog = []
 
     def on_start(self):
         self._read_config()
@@ -32,9 +341,26 @@ class _BasePlugin(kp.Plugin):
     def on_execute(self, item, action):
         kpu.execute_default_action(self, item, action)
 
+    def on_activated(self):
+        self._commit_if_dirty()
+
     def _read_config(self):
         raise NotImplementedError
 
+    def _set_file_catalog(self, catalog, scan=None):
+        # commit a catalog of files, minus the ones cataloged by another plugin
+        # of this package already, and return the number of items committed;
+        # scan is the session of _scan_cache the catalog has been built with
+        _scan_cache.retain(self, scan)
+        self._catalog = catalog
+        return _catalog_registry.commit(self, catalog)
+
+    def _commit_if_dirty(self):
+        # commit the catalog again if the files cataloged by the plugins of a
+        # lower rank have changed since the last commit
+        if _catalog_registry.dirty(self):
+            _catalog_registry.commit(self, self._catalog)
+
     def _log_catalog_duration(self, start_time, items_count):
         elapsed = time.perf_counter() - start_time
         self.info("Cataloged {} item{} in {:.1f} seconds".format(
@@ -65,7 +391,8 @@ class _BasePlugin(kp.Plugin):
 
         return (pathext_str, pathext)
 
-    def _catalog_knownfolder(self, kf_guid, kf_label, kf_desc, recursive_scan):
+    def _catalog_knownfolder(self, scan, kf_guid, kf_label, kf_desc,
+                             recursive_scan):
         try:
             kf_path = kpu.shell_known_folder_path(kf_guid)
         except OSError:
@@ -77,9 +404,8 @@ class _BasePlugin(kp.Plugin):
 
         max_scan_level = -1 if recursive_scan else 0
         try:
-            files = kpu.scan_directory(
-                kf_path, ('*'), flags=kpu.ScanFlags.FILES,
-                max_level=max_scan_level)
+            files, _ = scan.scan_directory(
+                kf_path, ('*'), kpu.ScanFlags.FILES, max_scan_level)
         except IOError:
             return []
 
@@ -112,6 +438,8 @@ class _BasePlugin(kp.Plugin):
 class StartMenu(_BasePlugin):
     """Scan files in user's Start Menu"""
 
+    CATALOG_RANK = 0
+
     DEFAULT_SCAN_START_MENU = True
 
     scan_start_menu = DEFAULT_SCAN_START_MENU
@@ -121,7 +449,7 @@ class StartMenu(_BasePlugin):
 
     def on_catalog(self):
         if not self.scan_start_menu:
-            self.set_catalog([])
+            self._set_file_catalog([])
             return
 
         start = time.perf_counter()
@@ -132,15 +460,16 @@ class StartMenu(_BasePlugin):
             (kpwt.FOLDERID.StartMenu, True),
             (kpwt.FOLDERID.CommonStartMenu, True))
 
+        scan = _scan_cache.session()
         catalog = []
         for kf in known_folders:
             catalog.extend(self._catalog_knownfolder(
-                kf[0].value, kf[0].name, "Start Menu", kf[1]))
+                scan, kf[0].value, kf[0].name, "Start Menu", kf[1]))
             if self.should_terminate():
                 return
 
-        self.set_catalog(catalog)
-        self._log_catalog_duration(start, len(catalog))
+        count = self._set_file_catalog(catalog, scan)
+        self._log_catalog_duration(start, count)
 
     def on_events(self, flags):
         must_catalog = False
@@ -154,6 +483,8 @@ class StartMenu(_BasePlugin):
 
         if must_catalog:
             self.on_catalog()
+        else:
+            self._commit_if_dirty()
 
     def _read_config(self):
         new_scan_start_menu = self.load_settings().get_bool(
@@ -168,6 +499,8 @@ class StartMenu(_BasePlugin):
 class Desktop(_BasePlugin):
     """Scan files in user's Desktop"""
 
+    CATALOG_RANK = 1
+
     DEFAULT_SCAN_DESKTOP = True
 
     scan_desktop = DEFAULT_SCAN_DESKTOP
@@ -177,7 +510,7 @@ class Desktop(_BasePlugin):
 
     def on_catalog(self):
         if not self.scan_desktop:
-            self.set_catalog([])
+            self._set_file_catalog([])
             return
 
         start = time.perf_counter()
@@ -186,15 +519,16 @@ class Desktop(_BasePlugin):
             (kpwt.FOLDERID.PublicDesktop, False),
             (kpwt.FOLDERID.Desktop, False))
 
+        scan = _scan_cache.session()
         catalog = []
         for kf in known_folders:
             catalog.extend(self._catalog_knownfolder(
-                kf[0].value, kf[0].name, "Desktop", kf[1]))
+                scan, kf[0].value, kf[0].name, "Desktop", kf[1]))
             if self.should_terminate():
                 return
 
-        self.set_catalog(catalog)
-        self._log_catalog_duration(start, len(catalog))
+        count = self._set_file_catalog(catalog, scan)
+        self._log_catalog_duration(start, count)
 
     def on_events(self, flags):
         must_catalog = False
@@ -208,6 +542,8 @@ class Desktop(_BasePlugin):
 
         if must_catalog:
             self.on_catalog()
+        else:
+            self._commit_if_dirty()
 
     def _read_config(self):
         new_scan_desktop = self.load_settings().get_bool(
@@ -222,9 +558,13 @@ class Desktop(_BasePlugin):
 class EnvPath(_BasePlugin):
     """Scan executables in current PATH"""
 
+    CATALOG_RANK = 3
+
     DEFAULT_SCAN_ENV_PATH = True
+    DEFAULT_SCAN_ENV_PATH_WORKERS = 4
 
     scan_env_path = DEFAULT_SCAN_ENV_PATH
+    scan_env_path_workers = DEFAULT_SCAN_ENV_PATH_WORKERS
 
     pathext_str = ""
     pathext = []
@@ -236,26 +576,43 @@ class EnvPath(_BasePlugin):
 
     def on_catalog(self):
         if not self.scan_env_path:
-            self.set_catalog([])
+            self._set_file_catalog([])
             return
 
         start = time.perf_counter()
         self.path_str, self.path = self._read_env_path()
         self.pathext_str, self.pathext = self._read_env_pathext()
 
+        # scan every directory once, concurrently since some of them may be
+        # slow to respond (e.g. network drives)
+        path_dirs = {}
+        for path_dir in self.path:
+            path_dirs.setdefault(os.path.normcase(path_dir), path_dir)
+        scan = _scan_cache.session()
+        results = {}
+        workers = max(1, min(self.scan_env_path_workers, len(path_dirs)))
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix="EnvPath") as executor:
+            futures = {
+                key: executor.submit(self._scan_path_dir, scan, path_dir)
+                for key, path_dir in path_dirs.items()}
+            for key, future in futures.items():
+                if self.should_terminate():
+                    for pending_future in futures.values():
+                        pending_future.cancel()
+                    return
+                results[key] = future.result()
+
+        if self.should_terminate():
+            return
+
         catalog = []
         for path_dir in self.path:
-            try:
-                entries = kpu.scan_directory(
-                    path_dir, self.pathext, kpu.ScanFlags.FILES,
-                    max_level=0)
-            except OSError as exc:
-                #self.dbg("Exception raised while scanning PATH:", exc)
+            entries, _ = results[os.path.normcase(path_dir)]
+            if entries is None:
                 continue
 
-            if self.should_terminate():
-                return
-
             for entry in entries:
                 entry_path = os.path.normpath(os.path.join(path_dir, entry))
                 catalog.append(self.create_item(
@@ -266,8 +623,15 @@ class EnvPath(_BasePlugin):
                     args_hint=kp.ItemArgsHint.ACCEPTED,
                     hit_hint=kp.ItemHitHint.KEEPALL))
 
-        self.set_catalog(catalog)
-        self._log_catalog_duration(start, len(catalog))
+        count = self._set_file_catalog(catalog, scan)
+        self._log_catalog_duration(start, count)
+
+        unchanged = sum(1 for _, cached in results.values() if cached)
+        if unchanged:
+            rescanned = sum(1 for entries, cached in results.values()
+                            if entries is not None and not cached)
+            self.info("{} PATH director{} rescanned, {} unchanged".format(
+                      rescanned, "ies" if rescanned != 1 else "y", unchanged))
 
     def on_events(self, flags):
         must_catalog = False
@@ -284,20 +648,43 @@ class EnvPath(_BasePlugin):
 
         if must_catalog:
             self.on_catalog()
+        else:
+            self._commit_if_dirty()
 
     def _read_config(self):
-        new_scan_env_path = self.load_settings().get_bool(
+        settings = self.load_settings()
+        new_scan_env_path = settings.get_bool(
             "scan_env_path",
             self.CONFIG_SECTION_MAIN,
             self.DEFAULT_SCAN_ENV_PATH)
         config_changed = new_scan_env_path != self.scan_env_path
         self.scan_env_path = new_scan_env_path
+        self.scan_env_path_workers = settings.get_int(
+            "scan_env_path_workers",
+            self.CONFIG_SECTION_MAIN,
+            self.DEFAULT_SCAN_ENV_PATH_WORKERS,
+            min=1, max=16)
         return config_changed
 
+    def _scan_path_dir(self, scan, path_dir):
+        # Return the names of the executables of *path_dir*, or None if it
+        # cannot be read, and whether they come from the cache. The result of
+        # the last scan is reused as long as the modification time of the
+        # directory and PATHEXT have not changed.
+        # Called concurrently for different directories.
+        try:
+            return scan.scan_directory(
+                path_dir, self.pathext, kpu.ScanFlags.FILES, 0)
+        except OSError as exc:
+            #self.dbg("Exception raised while scanning PATH:", exc)
+            return None, False
+
 
 class ExtraPaths(_BasePlugin):
     """Scan files pointed at by the extra_paths setting"""
 
+    CATALOG_RANK = 2
+
     pathext_str = ""
     pathext = []
     extra_paths = []
@@ -309,6 +696,7 @@ class ExtraPaths(_BasePlugin):
         start = time.perf_counter()
         self.pathext_str, self.pathext = self._read_env_pathext()
 
+        scan = _scan_cache.session()
         catalog = []
         for user_extra_path in self.extra_paths:
             user_extra_path = user_extra_path.replace("/", os.sep)
@@ -332,17 +720,18 @@ class ExtraPaths(_BasePlugin):
             if has_trailing_sep:
                 user_extra_path += os.sep
 
-            recursive_glob = "**" in user_extra_path
-            for globbed_path in glob.iglob(user_extra_path, recursive=recursive_glob):
+            # the directories listed while expanding the pattern are the ones
+            # scanned for executables, and the ones EnvPath scans too, so
+            # every directory is read once
+            for globbed_path in scan.iglob(user_extra_path):
                 if self.should_terminate():
                     return
 
                 files = []
                 if os.path.isdir(globbed_path):
                     try:
-                        files = kpu.scan_directory(
-                            globbed_path, self.pathext, kpu.ScanFlags.FILES,
-                            max_level=0)
+                        files, _ = scan.scan_directory(
+                            globbed_path, self.pathext, kpu.ScanFlags.FILES, 0)
                     except IOError as exc:
                         self.warn(exc)
                         continue
@@ -366,10 +755,10 @@ class ExtraPaths(_BasePlugin):
                     if len(catalog) % 100 == 0 and self.should_terminate():
                         return
 
-        self.set_catalog(catalog)
+        count = self._set_file_catalog(catalog, scan)
 
         if len(self.extra_paths):
-            self._log_catalog_duration(start, len(catalog))
+            self._log_catalog_duration(start, count)
 
     def on_events(self, flags):
         must_catalog = False
@@ -385,6 +774,8 @@ class ExtraPaths(_BasePlugin):
 
         if must_catalog:
             self.on_catalog()
+        else:
+            self._commit_if_dirty()
 
     def _read_config(self):
         new_extra_paths = self.load_settings().get_multiline(
@@ -408,6 +799,9 @@ class CustomCmds(_BasePlugin):
 
     def __init__(self):
         super().__init__()
+        # arg0 -> resolved path, valid as long as PATH and PATHEXT do not change
+        self._resolved_exes = {}
+        self._resolved_exes_env = self._read_env_resolve()
 
     def on_catalog(self):
         catalog = []
@@ -437,7 +831,7 @@ class CustomCmds(_BasePlugin):
 
         custcmd = self.custom_cmds[cmd_name]
 
-        cmd_lines = self._customcmd_apply_args(custcmd['cmds'][:], item.raw_args())
+        cmd_lines = self._customcmd_apply_args(custcmd, item.raw_args())
         for cmdline in cmd_lines:
             try:
                 args = kpu.cmdline_split(cmdline)
@@ -453,6 +847,16 @@ class CustomCmds(_BasePlugin):
             self._read_config()
             self.on_catalog()
 
+        if flags & kp.Events.ENV:
+            env = self._read_env_resolve()
+            if env != self._resolved_exes_env:
+                self._resolved_exes.clear()
+                self._resolved_exes_env = env
+
+    def _read_env_resolve(self):
+        # the environment shell_resolve_exe_path() depends on
+        return (os.getenv("PATH", ""), os.getenv("PATHEXT", ""))
+
     def _read_config(self):
         # free loaded icons
         for cmd_name, custcmd in self.custom_cmds.items():
@@ -525,9 +929,11 @@ class CustomCmds(_BasePlugin):
             cmd_elevated = settings.get_bool(
                 "elevated", section=section, fallback=False)
 
-            cmd_has_placeholders = any(map(
-                lambda s: self.REGEX_PLACEHOLDER.search(s) is not None,
-                cmd_lines))
+            cmd_templates = [
+                self._customcmd_compile(cmdline) for cmdline in cmd_lines]
+            cmd_has_placeholders = any(
+                not isinstance(segment, str)
+                for segments, _ in cmd_templates for segment in segments)
             if cmd_has_placeholders:
                 cmd_args_hint = kp.ItemArgsHint.ACCEPTED
             else:
@@ -536,6 +942,7 @@ class CustomCmds(_BasePlugin):
             self.custom_cmds[cmd_label.lower()] = {
                 'label': cmd_label,
                 'cmds': cmd_lines,
+                'templates': cmd_templates,
                 'item_label': cmd_item_label,
                 'args_hint': cmd_args_hint,
                 'hit_hint': cmd_hit_hint,
@@ -560,7 +967,50 @@ class CustomCmds(_BasePlugin):
         #            pass
         return None
 
-    def _customcmd_apply_args(self, cmd_lines, args_str):
+    def _customcmd_compile(self, cmdline):
+        # Split *cmdline* into a list of segments, each one being either a
+        # literal string or a (placeholder, force_quote) tuple, where
+        # placeholder is "*", "q*", or the int index of an argument.
+        # Return a (segments, arg0) tuple, arg0 being None if cmdline could not
+        # be parsed.
+        try:
+            arg0 = kpu.cmdline_split(cmdline)[0]
+        except:
+            traceback.print_exc()
+            arg0 = None
+
+        segments = []
+        start_pos = 0
+        for rem in self.REGEX_PLACEHOLDER.finditer(cmdline):
+            if rem.start() > start_pos:
+                segments.append(cmdline[start_pos:rem.start()])
+            start_pos = rem.end()
+
+            placeholder = rem.group(1)
+            if placeholder in ("*", "args"):
+                segments.append(("*", False))
+            elif placeholder in ("q*", "qargs"):
+                segments.append(("q*", True))
+            elif placeholder[0] == "q":
+                segments.append((int(placeholder[1:]), True))
+            else:
+                segments.append((int(placeholder), False))
+        if start_pos < len(cmdline):
+            segments.append(cmdline[start_pos:])
+
+        return (segments, arg0)
+
+    def _customcmd_resolve_exe(self, arg0):
+        resolved_arg0 = self._resolved_exes.get(arg0)
+        if resolved_arg0 is None:
+            resolved_arg0 = kpu.shell_resolve_exe_path(arg0)
+            if resolved_arg0 is None:
+                return arg0
+            self._resolved_exes[arg0] = resolved_arg0
+        return resolved_arg0
+
+    def _customcmd_apply_args(self, custcmd, args_str):
+        cmd_lines = custcmd['cmds'][:]
         try:
             args = kpu.cmdline_split(args_str)
         except:
@@ -568,53 +1018,36 @@ class CustomCmds(_BasePlugin):
             return cmd_lines
 
         final_cmd_lines = []
-        for cmdline in cmd_lines:
+        for segments, arg0 in custcmd['templates']:
+            if arg0 is None:
+                return cmd_lines
             try:
-                arg0 = kpu.cmdline_split(cmdline)[0]
-                resolved_arg0 = kpu.shell_resolve_exe_path(arg0)
-                if resolved_arg0 is not None:
-                    arg0 = resolved_arg0
+                resolved_arg0 = self._customcmd_resolve_exe(arg0)
             except:
                 traceback.print_exc()
                 return cmd_lines
 
-            start_pos = 0
-            while True:
-                rem = self.REGEX_PLACEHOLDER.search(cmdline, start_pos)
-                if not rem:
-                    break
+            parts = []
+            for segment in segments:
+                if isinstance(segment, str):
+                    parts.append(segment)
+                    continue
 
-                placeholder = rem.group(1)
-                if placeholder in ("*", "args"):
-                    args_str = args_str.strip()
-                    cmdline = cmdline[0:rem.start()] + args_str + cmdline[rem.end():]
-                    start_pos = rem.start() + len(args_str)
-                elif placeholder in ("q*", "qargs"):
-                    if not len(args):
-                        cmdline = cmdline[0:rem.start()] + cmdline[rem.end():]
-                        start_pos = rem.start()
-                    else:
-                        quoted_args = kpu.cmdline_quote(args, force_quote=True)
-                        cmdline = cmdline[0:rem.start()] + quoted_args + cmdline[rem.end():]
-                        start_pos = rem.start() + len(quoted_args)
+                placeholder, force_quote = segment
+                if placeholder == "*":
+                    parts.append(args_str.strip())
+                elif placeholder == "q*":
+                    if len(args):
+                        parts.append(kpu.cmdline_quote(args, force_quote=True))
+                elif placeholder == 0:
+                    parts.append(kpu.cmdline_quote(
+                        resolved_arg0, force_quote=force_quote))
                 else:
-                    force_quote = False
-                    if placeholder[0] == "q":
-                        force_quote = True
-                        placeholder = placeholder[1:]
-
-                    arg_idx = int(placeholder)
-                    if arg_idx == 0:
-                        quoted_arg = kpu.cmdline_quote(arg0, force_quote=force_quote)
-                    else:
-                        arg_idx = arg_idx - 1
-                        quoted_arg = kpu.cmdline_quote(
-                            args[arg_idx] if arg_idx < len(args) else "",
-                            force_quote=force_quote)
-
-                    cmdline = cmdline[0:rem.start()] + quoted_arg + cmdline[rem.end():]
-                    start_pos = rem.start() + len(quoted_arg)
+                    arg_idx = placeholder - 1
+                    parts.append(kpu.cmdline_quote(
+                        args[arg_idx] if arg_idx < len(args) else "",
+                        force_quote=force_quote))
 
-            final_cmd_lines.append(cmdline)
+            final_cmd_lines.append("".join(parts))
 
         return final_cmd_lines
@@ -5,7 +5,10 @@ import keypirinha_util as kpu
 import keypirinha_wintypes as kpwt
 import io
 import ast
+import collections
+import itertools
 import tokenize
+import operator
 import math
 import random
 import traceback
@@ -16,6 +19,17 @@ import keyword
 from .lib.number import Number
 from .lib import simpleeval
 
+def _number_literal(nstr):
+    # the value of a NUMBER token, same as eval(nstr)
+    try:
+        return int(nstr, 0)
+    except ValueError:
+        pass
+    try:
+        return float(nstr)
+    except ValueError:
+        return complex(nstr)
+
 def _safe_abs(x):
     return Number(x).__abs__()
 
@@ -107,6 +121,16 @@ def _safe_math_gcd(a, b):
 def _safe_math_sqrt(x):
     return Number(x).sqrt()
 
+def _estimate_factorial_bits(x):
+    # approximate bit length of x! (Stirling), for the evaluation budget
+    try:
+        n = Number(x).__float__()
+    except:
+        return None
+    if not n >= 2 or n == math.inf:
+        return None
+    return int(n * (math.log2(n) - math.log2(math.e)))
+
 class _safe_mathfunc_args2float():
     __slots__ = ('_func')
 
@@ -225,14 +249,21 @@ class Calc(kp.Plugin):
     DEFAULT_ALWAYS_EVALUATE = True
     DEFAULT_ROUNDING_PRECISION = 5
     DEFAULT_BASE_CONVERSION = True
+    DEFAULT_MAX_RESULTS = 4
     DEFAULT_CURRENCY_MODE = "float"
     DEFAULT_CURRENCY_FORMAT = "system"
     DEFAULT_CURRENCY_DECIMALSEP = "."
     DEFAULT_CURRENCY_THOUSANDSEP = ","
     DEFAULT_CURRENCY_PLACES = 2
+    DEFAULT_MAX_OPERATIONS = 10000
+    DEFAULT_MAX_INT_BITS = 100000
+    DEFAULT_EVAL_TIMEOUT = 0.5
 
     ANSWER_VARIABLE = 'ans'
 
+    # maximum number of parsed expressions to keep in cache
+    EXPR_CACHE_SIZE = 256
+
     MATH_OPERATORS = simpleeval.DEFAULT_OPERATORS
 
     MATH_CONSTANTS = {
@@ -306,39 +337,43 @@ class Calc(kp.Plugin):
     }
 
     TOKENSMAP_NUMBER_SUFFIXES = {
+        # (operator, factor) tuples applied to the value of the number that
+        # precedes the suffix. Factors are ints so that the result is the same
+        # int, float or complex value Python would give.
+
         # https://en.wikipedia.org/wiki/Metric_prefix
         # https://en.wikipedia.org/wiki/Hecto-
-        'y':  lambda n: n / 1000 ** 8, # yocto
-        'z':  lambda n: n / 1000 ** 7, # zepto
-        'a':  lambda n: n / 1000 ** 6, # atto
-        'f':  lambda n: n / 1000 ** 5, # femto
-        'p':  lambda n: n / 1000 ** 4, # pico
-        'n':  lambda n: n / 1000 ** 3, # nano
-        'u':  lambda n: n / 1000 ** 2, # micro
-        'm':  lambda n: n / 1000,      # milli
-        'c':  lambda n: n / 100,       # centi
-        'd':  lambda n: n / 10,        # deci
-        'da': lambda n: n * 10,        # deca
-        'h':  lambda n: n * 100,       # hecto
-        'k':  lambda n: n * 1000,      # Kilo
-        'M':  lambda n: n * 1000 ** 2, # Mega
-        'G':  lambda n: n * 1000 ** 3, # Giga
-        'T':  lambda n: n * 1000 ** 4, # Tera
-        'P':  lambda n: n * 1000 ** 5, # Peta
-        'E':  lambda n: n * 1000 ** 6, # Exa
-        'Z':  lambda n: n * 1000 ** 7, # Zetta
-        'Y':  lambda n: n * 1000 ** 8, # Yotta
+        'y':  (operator.truediv, 1000 ** 8), # yocto
+        'z':  (operator.truediv, 1000 ** 7), # zepto
+        'a':  (operator.truediv, 1000 ** 6), # atto
+        'f':  (operator.truediv, 1000 ** 5), # femto
+        'p':  (operator.truediv, 1000 ** 4), # pico
+        'n':  (operator.truediv, 1000 ** 3), # nano
+        'u':  (operator.truediv, 1000 ** 2), # micro
+        'm':  (operator.truediv, 1000),      # milli
+        'c':  (operator.truediv, 100),       # centi
+        'd':  (operator.truediv, 10),        # deci
+        'da': (operator.mul, 10),            # deca
+        'h':  (operator.mul, 100),           # hecto
+        'k':  (operator.mul, 1000),          # Kilo
+        'M':  (operator.mul, 1000 ** 2),     # Mega
+        'G':  (operator.mul, 1000 ** 3),     # Giga
+        'T':  (operator.mul, 1000 ** 4),     # Tera
+        'P':  (operator.mul, 1000 ** 5),     # Peta
+        'E':  (operator.mul, 1000 ** 6),     # Exa
+        'Z':  (operator.mul, 1000 ** 7),     # Zetta
+        'Y':  (operator.mul, 1000 ** 8),     # Yotta
 
         # https://en.wikipedia.org/wiki/Orders_of_magnitude_(data)
         # https://en.wikipedia.org/wiki/Kibibyte
-        'Ki': lambda n: n * 1024,      # Kibi
-        'Mi': lambda n: n * 1024 ** 2, # Mebi
-        'Gi': lambda n: n * 1024 ** 3, # Gibi
-        'Ti': lambda n: n * 1024 ** 4, # Tebi
-        'Pi': lambda n: n * 1024 ** 5, # Pebi
-        'Ei': lambda n: n * 1024 ** 6, # Exbi
-        'Zi': lambda n: n * 1024 ** 7, # Zebi
-        'Yi': lambda n: n * 1024 ** 8, # Yobi
+        'Ki': (operator.mul, 1024),          # Kibi
+        'Mi': (operator.mul, 1024 ** 2),     # Mebi
+        'Gi': (operator.mul, 1024 ** 3),     # Gibi
+        'Ti': (operator.mul, 1024 ** 4),     # Tebi
+        'Pi': (operator.mul, 1024 ** 5),     # Pebi
+        'Ei': (operator.mul, 1024 ** 6),     # Exbi
+        'Zi': (operator.mul, 1024 ** 7),     # Zebi
+        'Yi': (operator.mul, 1024 ** 8),     # Yobi
     }
 
     always_evaluate = DEFAULT_ALWAYS_EVALUATE
@@ -348,6 +383,7 @@ class Calc(kp.Plugin):
     transmap_output = ""
     rounding_precision = DEFAULT_ROUNDING_PRECISION
     base_conversion = DEFAULT_BASE_CONVERSION
+    max_results = DEFAULT_MAX_RESULTS
     currency_enabled = True
     currency_float_only = True
     currency_from_system = True
@@ -357,6 +393,8 @@ class Calc(kp.Plugin):
 
     ans = 0
 
+    _GetCurrencyFormatEx = None
+
     def __init__(self):
         super().__init__()
 
@@ -378,6 +416,27 @@ class Calc(kp.Plugin):
         if ast.FloorDiv not in self.MATH_OPERATORS: # floordiv ('//')
             self.MATH_OPERATORS[ast.FloorDiv] = simpleeval.op.floordiv
 
+        # (input, decimal separator) -> (retokenized source, compiled
+        # expression), in least recently used order
+        self._expr_cache = collections.OrderedDict()
+
+        # limits of an evaluation, updated by _read_config()
+        self._eval_budget = simpleeval.EvalBudget(
+            max_operations=self.DEFAULT_MAX_OPERATIONS,
+            max_int_bits=self.DEFAULT_MAX_INT_BITS,
+            timeout=self.DEFAULT_EVAL_TIMEOUT)
+        self._eval_budget.estimators[self.MATH_FUNCTIONS['factor']] = \
+            _estimate_factorial_bits
+
+        # the evaluator is stateless apart from the expression it reports in
+        # errors, and its names dict is updated in place by _eval(), so the
+        # expressions it compiles can be cached
+        self._simple_eval = simpleeval.SimpleEval(
+            operators=self.MATH_OPERATORS,
+            functions=self.MATH_FUNCTIONS,
+            names=self.MATH_CONSTANTS,
+            budget=self._eval_budget)
+
     def on_start(self):
         self.var_handler = CalcVarHandler(self, self.MATH_CONSTANTS)
         self._read_config()
@@ -447,10 +506,10 @@ class Calc(kp.Plugin):
 
         suggestions = []
         try:
+            # variants are computed lazily, the ones over max_results are not
+            # computed at all
             results = self._eval(expression)
-            if not isinstance(results, (tuple, list)):
-                results = (results,)
-            for res in results:
+            for res in itertools.islice(results, self.max_results):
                 res = str(res)
                 short_desc="Press Enter to copy the result"
                 if res.startswith("0b"):
@@ -465,10 +524,13 @@ class Calc(kp.Plugin):
                     args_hint=kp.ItemArgsHint.FORBIDDEN,
                     hit_hint=kp.ItemHitHint.IGNORE))
         except Exception as exc:
-            if suffix or not eval_requested or self.var_handler.var_to_save == self.ANSWER_VARIABLE:
+            if not isinstance(exc, simpleeval.BudgetExceeded) and (
+                    suffix or not eval_requested or self.var_handler.var_to_save == self.ANSWER_VARIABLE):
                 # stay quiet if evaluation hasn't been explicitly requested or
                 # if suffix format to avoid getting exceptions of things like:
                 # https://www.youtube.com/watch?v=abcdef
+                # An aborted evaluation is always reported though, the input
+                # was obviously meant to be evaluated.
                 return
 
             suggestions.append(self.create_error_item(
@@ -481,13 +543,16 @@ class Calc(kp.Plugin):
         if item and item.category() == kp.ItemCategory.EXPRESSION:
             kpu.set_clipboard(item.target())
             self.var_handler.save_if_var(self.ans)
+            self._clear_expr_cache()
         elif item and (item.category() == self.ITEMCAT_VAR):
             if action and action.name() == "copy":
                 kpu.set_clipboard(item.target())
             elif action and action.name() == "delete":
                 self.var_handler.delete_var(item.data_bag(), self.MATH_CONSTANTS)
+                self._clear_expr_cache()
             elif action and action.name() == "delete_all":
                 self.var_handler.delete_all_vars(self.MATH_CONSTANTS)
+                self._clear_expr_cache()
 
     def on_events(self, flags):
         if flags & kp.Events.PACKCONFIG:
@@ -496,6 +561,7 @@ class Calc(kp.Plugin):
     def _read_config(self):
         settings = self.load_settings()
         self.var_handler.load_vars()
+        self._clear_expr_cache()
 
         # [main] always_evaluate
         self.always_evaluate = settings.get_bool(
@@ -557,6 +623,11 @@ class Calc(kp.Plugin):
         self.base_conversion = settings.get_bool(
             "base_conversion", "main", self.DEFAULT_BASE_CONVERSION)
 
+        # [main] max_results
+        self.max_results = settings.get_int(
+            "max_results", "main",
+            fallback=self.DEFAULT_MAX_RESULTS, min=1, max=100)
+
         # [main] rounding_precision
         if not settings.has("rounding_precision", "main"):
             self.rounding_precision = self.DEFAULT_ROUNDING_PRECISION
@@ -569,6 +640,24 @@ class Calc(kp.Plugin):
                 min=0, max=16)
             self.rounding_precision += 1
 
+        # [main] max_operations
+        self._eval_budget.max_operations = settings.get_int(
+            "max_operations", "main",
+            fallback=self.DEFAULT_MAX_OPERATIONS,
+            min=100, max=10000000)
+
+        # [main] max_int_bits
+        self._eval_budget.max_int_bits = settings.get_int(
+            "max_int_bits", "main",
+            fallback=self.DEFAULT_MAX_INT_BITS,
+            min=64, max=100000000)
+
+        # [main] eval_timeout
+        self._eval_budget.timeout = settings.get_float(
+            "eval_timeout", "main",
+            fallback=self.DEFAULT_EVAL_TIMEOUT,
+            min=0.05, max=30)
+
         # [currency] mode
         cfgval = settings.get_enum(
             "mode", "currency",
@@ -622,10 +711,9 @@ class Calc(kp.Plugin):
         # The powerful "ast" module won't help neither here because even if it
         # manages to parse it properly the opportunity we'll have then to
         # replace tokens will be too late in the lexer-parser-compiler chain.
-        expr = expr.translate(self.transmap_input)
-
-        # Interpret Calc-specific suffixes
-        expr = self._retokenize(expr)
+        # This, as well as the interpretation of Calc-specific suffixes, is
+        # done by _parse().
+        expr, compiled_expr = self._parse(expr)
 
         # Prepare the 'names' dictionary
         own_names = self.MATH_CONSTANTS
@@ -633,16 +721,17 @@ class Calc(kp.Plugin):
         self.var_handler.update_calc_vars(own_names)
 
         # Evaluate the expression
-        # We bypass the SimpleEval.eval() method only for the sake of having a
-        # "nice" source *filename* value.
-        se = simpleeval.SimpleEval(
-            operators=self.MATH_OPERATORS,
-            functions=self.MATH_FUNCTIONS,
-            names=own_names)
-        se.expr = expr # done by SimpleEval.eval()
-        self.ans = se._eval(ast.parse(expr, filename="expr").body[0].value)
+        # We bypass the SimpleEval.eval() method for the sake of having a
+        # "nice" source *filename* value, and to evaluate the compiled
+        # expression.
+        self._simple_eval.expr = expr # done by SimpleEval.eval()
+        self._eval_budget.start()
+        self.ans = compiled_expr()
 
         # format output according to result's type
+        # The result is converted eagerly since on_execute() relies on
+        # self.ans, while the variants are generated on demand by the
+        # returned iterable, most relevant first.
         if isinstance(self.ans, bytes):
             self.ans = self.ans.decode("utf-8")
 
@@ -650,160 +739,211 @@ class Calc(kp.Plugin):
             try:
                 if self.ans.lower().startswith("0b"):
                     self.ans = int(self.ans, base=2)
-                    if self.base_conversion:
-                        return (bin(self.ans), self.ans, hex(self.ans), oct(self.ans)) + self._numberfmt(self.ans) + self._currencyfmt(self.ans)
-                    else:
-                        return (bin(self.ans), ) + self._numberfmt(self.ans) + self._currencyfmt(self.ans)
+                    return self._int_variants(self.ans, bin)
                 elif self.ans.lower().startswith("0o"):
                     self.ans = int(self.ans, base=8)
-                    if self.base_conversion:
-                        return (oct(self.ans), self.ans, hex(self.ans), bin(self.ans)) + self._numberfmt(self.ans) + self._currencyfmt(self.ans)
-                    else:
-                        return (oct(self.ans), ) + self._numberfmt(self.ans) + self._currencyfmt(self.ans)
+                    return self._int_variants(self.ans, oct)
                 elif self.ans.lower().startswith("0x"):
                     self.ans = int(self.ans, base=16)
-                    if self.base_conversion:
-                        return (hex(self.ans), self.ans, bin(self.ans), oct(self.ans)) + self._numberfmt(self.ans) + self._currencyfmt(self.ans)
-                    else:
-                        return (hex(self.ans), ) + self._numberfmt(self.ans) + self._currencyfmt(self.ans)
+                    return self._int_variants(self.ans, hex)
                 else:
                     self.ans = int(self.ans)
             except ValueError:
-                return self.ans
+                return (self.ans, )
 
         if isinstance(self.ans, bool):
             self.ans = int(self.ans)
-            return str(self.ans)
+            return (str(self.ans), )
         elif isinstance(self.ans, int):
-            if self.base_conversion:
-                return (self.ans, hex(self.ans), bin(self.ans), oct(self.ans)) + self._numberfmt(self.ans) + self._currencyfmt(self.ans)
-            else:
-                return (self.ans, ) + self._numberfmt(self.ans) + self._currencyfmt(self.ans)
+            return self._int_variants(self.ans)
         elif isinstance(self.ans, float):
             self.ans = Number(self.ans)
         elif isinstance(self.ans, complex):
-            return str(self.ans)
+            return (str(self.ans), )
 
         if isinstance(self.ans, Number):
             if not self.ans.is_finite(): # nan or infinity
-                return str(self.ans)
+                return (str(self.ans), )
             else:
-                def do_trans(val):
-                    val = str(val).translate(self.transmap_output).lower()
-                    # Strip right-most zeroes except for scientifically notated values.
-                    if self.decimal_separator in val and ('e' not in val and 'E' not in val):
-                        val = val.rstrip("0").rstrip(self.decimal_separator)
-                        if not len(val):
-                            val = "0"
-                    return val
-                results = { # note: this is a set!
-                    do_trans(self.ans.normalize()),
-                    do_trans(self.ans),
-                    do_trans(self.ans.to_eng_string())}
-
-                if self.rounding_precision is not None:
-                    q = Number(10) ** -self.rounding_precision
-                    v = do_trans(self.ans.quantize(q))
-                    results.add(v)
-                results = list(results)
-                results.sort(key=len)
-
-                if self.base_conversion:
-                    try:
-                        intval = self.ans.safe_int()
-                        for v in (str(intval), hex(intval), bin(intval), oct(intval)):
-                            if v not in results:
-                                results.append(v)
-                    except:
-                        pass
-
-                for v in self._numberfmt(self.ans):
-                    results.append(v)
-                results += list(self._currencyfmt(self.ans))
-                return results
+                return self._number_variants(self.ans)
 
         # duh?!
-        return str(self.ans).translate(self.transmap_output)
+        return (str(self.ans).translate(self.transmap_output), )
+
+    def _int_variants(self, value, input_base=None):
+        # input_base is the bin, oct or hex function if the result was given
+        # in that base, in which case it comes first
+        if input_base is not None:
+            yield input_base(value)
+        else:
+            yield value
+        if self.base_conversion:
+            if input_base is not None:
+                yield value
+            for to_base in (hex, bin, oct):
+                if to_base is not input_base:
+                    yield to_base(value)
+        yield from self._numberfmt(value)
+        yield from self._currencyfmt(value)
+
+    def _number_variants(self, value):
+        def do_trans(val):
+            val = str(val).translate(self.transmap_output).lower()
+            # Strip right-most zeroes except for scientifically notated values.
+            if self.decimal_separator in val and ('e' not in val and 'E' not in val):
+                val = val.rstrip("0").rstrip(self.decimal_separator)
+                if not len(val):
+                    val = "0"
+            return val
+
+        # the cheap variants are computed together since they are sorted
+        results = { # note: this is a set!
+            do_trans(value.normalize()),
+            do_trans(value),
+            do_trans(value.to_eng_string())}
+
+        if self.rounding_precision is not None:
+            q = Number(10) ** -self.rounding_precision
+            v = do_trans(value.quantize(q))
+            results.add(v)
+        results = list(results)
+        results.sort(key=len)
+        yield from results
+
+        if self.base_conversion:
+            try:
+                intval = value.safe_int()
+                intval_str = str(intval)
+            except:
+                intval = None
+            if intval is not None:
+                seen = set(results)
+                for to_base in (str, hex, bin, oct):
+                    v = intval_str if to_base is str else to_base(intval)
+                    if v not in seen:
+                        seen.add(v)
+                        yield v
+
+        yield from self._numberfmt(value)
+        yield from self._currencyfmt(value)
+
+    def _parse(self, user_expr):
+        # Return the retokenized source of user_expr and its compiled version
+        # (see SimpleEval.compile()). The same expressions tend to be
+        # evaluated over and over while the user is typing, so the result is
+        # cached.
+        cache = self._expr_cache
+        key = (user_expr, self.decimal_separator)
+        entry = cache.get(key)
+        if entry is not None:
+            cache.move_to_end(key)
+            return entry
+
+        expr = user_expr.translate(self.transmap_input)
+        expr = self._retokenize(expr)
+        node = ast.parse(expr, filename="expr").body[0].value
+        entry = (expr, self._simple_eval.compile(node))
+
+        cache[key] = entry
+        if len(cache) > self.EXPR_CACHE_SIZE:
+            cache.popitem(last=False)
+        return entry
+
+    def _clear_expr_cache(self):
+        # a new dict is assigned instead of clearing the current one, in case
+        # _parse() is using it from another thread
+        self._expr_cache = collections.OrderedDict()
 
     def _retokenize(self, expr):
-        def _tokenize_number(dest, nstr, force_decimal):
-            # convert floats to Number only if nstr is a float or if we've
-            # had a float already in the expression (Python really rocks)
-            if force_decimal or "." in nstr:
-                dest.extend([
+        # Numbers are converted to Number objects if the expression contains
+        # a float literal or a division of a number literal (Python really
+        # rocks), or once a suffixed number gives a float.
+        # The former case applies to the whole expression, so the NUMBER
+        # tokens emitted before it is detected are converted afterwards. Their
+        # indexes in trans_tokens are kept in int_tokens.
+        trans_tokens = []
+        int_tokens = []
+        has_decimal = False
+        all_decimal = False
+        num_str = None
+        prev_type = None
+
+        def _tokenize_number(nstr):
+            nonlocal has_decimal
+            if has_decimal or "." in nstr:
+                trans_tokens.extend((
                     (tokenize.NAME, "Number"),
                     (tokenize.NAME, "("),
                     (tokenize.STRING, repr(nstr)),
-                    (tokenize.NAME, ")")])
-                force_decimal = True
+                    (tokenize.NAME, ")")))
+                has_decimal = True
             else:
-                dest.append((tokenize.NUMBER, nstr))
-            return force_decimal
-
-        trans_tokens = []
-        num_tok = None
-        has_decimal = False
+                int_tokens.append(len(trans_tokens))
+                trans_tokens.append((tokenize.NUMBER, nstr))
 
-        # first pass
-        tokens = tokenize.tokenize(io.BytesIO(expr.encode('utf-8')).readline)
-        prev_tok = None
-        for tokinfo in tokens:
-            if tokinfo.type == tokenize.NUMBER:
-                if "." in tokinfo.string:
-                    has_decimal = True
-                    break
-            elif tokinfo.exact_type == tokenize.SLASH:
-                if prev_tok is not None and prev_tok.type == tokenize.NUMBER:
-                    has_decimal = True
-                    break
-            prev_tok = tokinfo
-
-        # second pass
-        tokens = tokenize.tokenize(io.BytesIO(expr.encode('utf-8')).readline)
+        tokens = tokenize.generate_tokens(io.StringIO(expr).readline)
         for tokinfo in tokens:
-            push_generic_token = False
-
-            if tokinfo.type == tokenize.NUMBER:
-                if num_tok is not None: # weird?!
-                    has_decimal = _tokenize_number(trans_tokens, num_tok.string, has_decimal)
-                    num_tok = None
-                num_tok = tokinfo
-            elif tokinfo.type == tokenize.OP:
+            tok_type = tokinfo.type
+            tok_string = tokinfo.string
+
+            if not all_decimal and (
+                    (tok_type == tokenize.NUMBER and "." in tok_string) or
+                    (tokinfo.exact_type == tokenize.SLASH and
+                        prev_type == tokenize.NUMBER)):
+                all_decimal = True
+                has_decimal = True
+            prev_type = tok_type
+
+            if tok_type == tokenize.NUMBER:
+                if num_str is not None: # weird?!
+                    _tokenize_number(num_str)
+                num_str = tok_string
+                continue
+
+            if tok_type == tokenize.OP:
                 if tokinfo.exact_type in self.TOKENSMAP_OPERATORS:
-                    if num_tok is not None:
-                        has_decimal = _tokenize_number(trans_tokens, num_tok.string, has_decimal)
-                        num_tok = None
+                    if num_str is not None:
+                        _tokenize_number(num_str)
+                        num_str = None
                     trans_tokens.append((
-                        tokinfo.type,
+                        tok_type,
                         self.TOKENSMAP_OPERATORS[tokinfo.exact_type]))
-                else:
-                    push_generic_token = True
-            elif tokinfo.type == tokenize.NAME:
-                if num_tok is not None and tokinfo.string in self.TOKENSMAP_NUMBER_SUFFIXES:
-                    has_decimal = _tokenize_number(
-                        trans_tokens,
-                        str(self.TOKENSMAP_NUMBER_SUFFIXES[tokinfo.string](eval(num_tok.string))),
-                        has_decimal)
-                    num_tok = None
-                elif tokinfo.string.lower() in self.TOKENSMAP_NAME_OPERATORS:
-                    if num_tok is not None:
-                        has_decimal = _tokenize_number(trans_tokens, num_tok.string, has_decimal)
-                        num_tok = None
-                    trans_tokens.append((
-                        tokenize.OP,
-                        self.TOKENSMAP_NAME_OPERATORS[tokinfo.string.lower()]))
-                else:
-                    push_generic_token = True
-            else:
-                push_generic_token = True
-
-            if push_generic_token:
-                if num_tok is not None:
-                    has_decimal = _tokenize_number(trans_tokens, num_tok.string, has_decimal)
-                    num_tok = None
-                trans_tokens.append((tokinfo.type, tokinfo.string))
+                    continue
+            elif tok_type == tokenize.NAME:
+                if num_str is not None and tok_string in self.TOKENSMAP_NUMBER_SUFFIXES:
+                    suffix_op, factor = self.TOKENSMAP_NUMBER_SUFFIXES[tok_string]
+                    _tokenize_number(str(suffix_op(_number_literal(num_str), factor)))
+                    num_str = None
+                    continue
+                name_op = self.TOKENSMAP_NAME_OPERATORS.get(tok_string.lower())
+                if name_op is not None:
+                    if num_str is not None:
+                        _tokenize_number(num_str)
+                        num_str = None
+                    trans_tokens.append((tokenize.OP, name_op))
+                    continue
+
+            # generic token
+            if num_str is not None:
+                _tokenize_number(num_str)
+                num_str = None
+            trans_tokens.append((tok_type, tok_string))
+
+        if all_decimal and int_tokens:
+            converted_tokens = []
+            start = 0
+            for idx in int_tokens:
+                converted_tokens.extend(trans_tokens[start:idx])
+                converted_tokens.extend((
+                    (tokenize.NAME, "Number"),
+                    (tokenize.NAME, "("),
+                    (tokenize.STRING, repr(trans_tokens[idx][1])),
+                    (tokenize.NAME, ")")))
+                start = idx + 1
+            converted_tokens.extend(trans_tokens[start:])
+            trans_tokens = converted_tokens
 
-        return tokenize.untokenize(trans_tokens).decode('utf-8')
+        return tokenize.untokenize(trans_tokens)
 
     def _numberfmt(self, value):
         if not isinstance(value, (int, float, Number)):
@@ -833,9 +973,13 @@ class Calc(kp.Plugin):
             value_to_api = str(float(value))
             try:
                 # use the GetCurrencyFormatEx windows api to format the value
-                GetCurrencyFormatEx = kpwt.declare_func(
-                    kpwt.kernel32, "GetCurrencyFormatEx", ret=kpwt.ct.c_int,
-                    args=[kpwt.LPCWSTR, kpwt.DWORD, kpwt.LPCWSTR, kpwt.LPVOID, kpwt.PWSTR, kpwt.ct.c_int])
+                # (declared once)
+                GetCurrencyFormatEx = self._GetCurrencyFormatEx
+                if GetCurrencyFormatEx is None:
+                    GetCurrencyFormatEx = kpwt.declare_func(
+                        kpwt.kernel32, "GetCurrencyFormatEx", ret=kpwt.ct.c_int,
+                        args=[kpwt.LPCWSTR, kpwt.DWORD, kpwt.LPCWSTR, kpwt.LPVOID, kpwt.PWSTR, kpwt.ct.c_int])
+                    self._GetCurrencyFormatEx = GetCurrencyFormatEx
                 buf = kpwt.ct.create_unicode_buffer(128)
                 res = GetCurrencyFormatEx(
                     None, 0, value_to_api, None, buf, len(buf))
@@ -77,10 +77,34 @@ well:
 >>> simple_eval("40 + two", names={"two": 2})
 42
 
+-----------
+
+An expression that is evaluated several times can be compiled once, the
+returned callable evaluates it with the current names of the evaluator:
+
+>>> s = SimpleEval(names={"x": 1})
+>>> f = s.compile(ast.parse("x + 1").body[0].value)
+>>> f()
+2
+>>> s.names["x"] = 41
+>>> f()
+42
+
+An EvalBudget can be given to the evaluator to limit the number of
+operations, the size of the integers and the duration of an evaluation:
+
+>>> s = SimpleEval(budget=EvalBudget(max_int_bits=1000))
+>>> s.eval("1 << 2000")
+Traceback (most recent call last):
+  ...
+BudgetExceeded: Evaluation aborted: integer of 2001 bits, more than the ...
+
 '''
 
 import ast
+import math
 import sys
+import time
 import operator as op
 from random import random
 
@@ -141,6 +165,10 @@ class StringTooLong(InvalidExpression):
     ''' That string is **way** too long, baby. '''
     pass
 
+class BudgetExceeded(InvalidExpression):
+    ''' The evaluation went over one of the limits of its EvalBudget. '''
+    pass
+
 ########################################
 # Default simple functions to include:
 
@@ -165,6 +193,45 @@ def safe_mult(a, b): # pylint: disable=invalid-name
 
     return a * b
 
+def _as_int(value):
+    ''' value as an int if it is one or if it has a safe_int() method that
+        succeeds, None otherwise '''
+    if isinstance(value, int):
+        return value
+    safe_int = getattr(value, "safe_int", None)
+    if safe_int is not None:
+        try:
+            return safe_int()
+        except Exception: # pylint: disable=broad-except
+            pass
+    return None
+
+def estimate_power_bits(a, b, *args): # pylint: disable=invalid-name
+    ''' approximate bit length of int a ** b '''
+    if (isinstance(a, int) and isinstance(b, int) and
+            b > 0 and abs(a) > 1 and not args):
+        return int(b * math.log2(abs(a)))
+    return None
+
+def estimate_mult_bits(a, b): # pylint: disable=invalid-name
+    ''' approximate bit length of int a * b '''
+    if isinstance(a, int) and isinstance(b, int):
+        return a.bit_length() + b.bit_length()
+    return None
+
+def estimate_lshift_bits(a, b): # pylint: disable=invalid-name
+    ''' approximate bit length of a << b '''
+    a, b = _as_int(a), _as_int(b)
+    if a is None or b is None or b < 0 or not a:
+        return None
+    return a.bit_length() + b
+
+def _raiser(exc_type, *args):
+    ''' return a function that raises a new exc_type(*args) exception '''
+    def _raise():
+        raise exc_type(*args)
+    return _raise
+
 def safe_add(a, b): # pylint: disable=invalid-name
     ''' string length limit again '''
     if isinstance(a, str) and isinstance(b, str):
@@ -188,6 +255,76 @@ DEFAULT_FUNCTIONS = {"rand": random, "randint": random_int,
 
 DEFAULT_NAMES = {"True": True, "False": False}
 
+########################################
+# Evaluation limits:
+
+class EvalBudget(object):
+    ''' The limits of an evaluation: the maximum number of operators and
+        function calls, the maximum bit length of integer results, and the
+        maximum duration in seconds. A limit set to None is disabled.
+
+        The duration is checked between operations, so a single costly
+        operation cannot be interrupted. To refuse those before they start,
+        *estimators* maps operator and function objects to a function that
+        takes the same arguments and returns the approximate bit length of
+        the integer result, or None if it does not apply. '''
+
+    def __init__(self, max_operations=None, max_int_bits=None, timeout=None):
+        self.max_operations = max_operations
+        self.max_int_bits = max_int_bits
+        self.timeout = timeout
+        self.estimators = {
+            safe_power: estimate_power_bits,
+            op.pow: estimate_power_bits,
+            safe_mult: estimate_mult_bits,
+            op.mul: estimate_mult_bits,
+            op.lshift: estimate_lshift_bits}
+        self.operations = 0
+        self.deadline = None
+
+    def start(self):
+        ''' Reset the budget, to be called before each evaluation. '''
+        self.operations = 0
+        self.deadline = None
+        if self.timeout is not None:
+            self.deadline = time.monotonic() + self.timeout
+
+    def spend(self):
+        ''' Account for one operation. '''
+        self.operations += 1
+        if (self.max_operations is not None and
+                self.operations > self.max_operations):
+            raise BudgetExceeded("Evaluation aborted: more than {0} "
+                                 "operations".format(self.max_operations))
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise BudgetExceeded("Evaluation aborted: took more than {0} "
+                                 "seconds".format(self.timeout))
+
+    def check_bits(self, bits):
+        ''' Make sure an integer of *bits* bits is allowed. '''
+        if (bits is not None and self.max_int_bits is not None and
+                bits > self.max_int_bits):
+            raise BudgetExceeded("Evaluation aborted: integer of {0} bits, "
+                                 "more than the maximum of {1}".format(
+                                 bits, self.max_int_bits))
+
+    def wrap(self, func):
+        ''' Return func wrapped so that each call spends the budget. '''
+        try:
+            estimator = self.estimators.get(func)
+        except TypeError: # unhashable
+            estimator = None
+
+        def _call(*args):
+            self.spend()
+            if estimator is not None:
+                self.check_bits(estimator(*args))
+            result = func(*args)
+            if isinstance(result, int):
+                self.check_bits(result.bit_length())
+            return result
+        return _call
+
 ########################################
 # And the actual evaluator:
 
@@ -199,10 +336,12 @@ class SimpleEval(object): # pylint: disable=too-few-public-methods
         '''
     expr = ""
 
-    def __init__(self, operators=None, functions=None, names=None):
+    def __init__(self, operators=None, functions=None, names=None,
+                 budget=None):
         '''
             Create the evaluator instance.  Set up valid operators (+,-, etc)
-            functions (add, random, get_val, whatever) and names. '''
+            functions (add, random, get_val, whatever) and names, and the
+            optional EvalBudget that limits evaluations. '''
 
         if not operators:
             operators = DEFAULT_OPERATORS
@@ -214,6 +353,7 @@ class SimpleEval(object): # pylint: disable=too-few-public-methods
         self.operators = operators
         self.functions = functions
         self.names = names
+        self.budget = budget
 
     def eval(self, expr):
         ''' evaluate an expresssion, using the operators, functions and
@@ -224,121 +364,192 @@ class SimpleEval(object): # pylint: disable=too-few-public-methods
         self.expr = expr
 
         # and evaluate:
+        if self.budget is not None:
+            self.budget.start()
         return self._eval(ast.parse(expr).body[0].value)
 
-    # pylint: disable=too-many-return-statements, too-many-branches
     def _eval(self, node):
-        ''' The internal eval function used on each node in the parsed tree. '''
+        ''' Evaluate a node of the parsed tree. '''
+        return self.compile(node)()
+
+    # pylint: disable=too-many-return-statements, too-many-branches
+    # pylint: disable=too-many-locals, too-many-statements
+    def compile(self, node):
+        ''' Turn a node of the parsed tree into a function that takes no
+            argument and returns the value of the node.
+            Operators and functions are looked up once, at compile time, while
+            names are looked up every time the function is called. With a
+            budget, every call of an operator or a function spends it, and
+            budget.start() must be called before each evaluation. Errors are
+            raised when the faulty node is evaluated, not by compile(), so that
+            they come in the same order as if the tree was walked. '''
 
         # literals:
 
         if isinstance(node, ast.Num): # <number>
-            return node.n
+            value = node.n
+            return lambda: value
         elif isinstance(node, ast.Str): # <string>
             if len(node.s) > MAX_STRING_LENGTH:
-                raise StringTooLong("String Literal in statement is too long!"
-                                    " ({0}, when {1} is max)".format(
-                                    len(node.s), MAX_STRING_LENGTH))
-            return node.s
+                return _raiser(StringTooLong,
+                               "String Literal in statement is too long!"
+                               " ({0}, when {1} is max)".format(
+                               len(node.s), MAX_STRING_LENGTH))
+            value = node.s
+            return lambda: value
 
         # python 3 compatibility:
 
         elif (hasattr(ast, 'NameConstant') and
                 isinstance(node, ast.NameConstant)): # <bool>
-            return node.value
+            value = node.value
+            return lambda: value
 
         # operators, functions, etc:
 
         elif isinstance(node, ast.UnaryOp): # - and + etc.
-            return self.operators[type(node.op)](self._eval(node.operand))
+            try:
+                op_func = self._bind(self.operators[type(node.op)])
+            except KeyError:
+                return _raiser(KeyError, type(node.op))
+            operand = self.compile(node.operand)
+            return lambda: op_func(operand())
         elif isinstance(node, ast.BinOp): # <left> <operator> <right>
-            return self.operators[type(node.op)](self._eval(node.left),
-                                       self._eval(node.right))
+            try:
+                op_func = self._bind(self.operators[type(node.op)])
+            except KeyError:
+                return _raiser(KeyError, type(node.op))
+            left = self.compile(node.left)
+            right = self.compile(node.right)
+            return lambda: op_func(left(), right())
         elif isinstance(node, ast.BoolOp): # and & or...
+            values = [self.compile(v) for v in node.values]
             if isinstance(node.op, ast.And):
-                for v in node.values:
-                    vout = self._eval(v)
-                    if not vout:
-                        return False
-                return vout
+                def _and():
+                    for v in values:
+                        vout = v()
+                        if not vout:
+                            return False
+                    return vout
+                return _and
             elif isinstance(node.op, ast.Or):
-                for v in node.values:
-                    n = self._eval(v)
-                    if n:
-                        return n
-                return False
+                def _or():
+                    for v in values:
+                        n = v()
+                        if n:
+                            return n
+                    return False
+                return _or
+            return lambda: None
         elif isinstance(node, ast.Compare): # 1 < 2, a == b...
-            return self.operators[type(node.ops[0])](self._eval(node.left),
-                                                     self._eval(node.comparators[0]))
+            try:
+                op_func = self._bind(self.operators[type(node.ops[0])])
+            except KeyError:
+                return _raiser(KeyError, type(node.ops[0]))
+            left = self.compile(node.left)
+            right = self.compile(node.comparators[0])
+            return lambda: op_func(left(), right())
         elif isinstance(node, ast.IfExp): # x if y else z
-            return self._eval(node.body) if self._eval(node.test) \
-                                         else self._eval(node.orelse)
+            test = self.compile(node.test)
+            body = self.compile(node.body)
+            orelse = self.compile(node.orelse)
+            return lambda: body() if test() else orelse()
         elif isinstance(node, ast.Call): # function...
+            if not isinstance(node.func, ast.Name):
+                def _bad_call():
+                    return node.func.id # raises AttributeError
+                return _bad_call
+            func_name = node.func.id
+            args = [self.compile(a) for a in node.args]
             try:
-                return self.functions[node.func.id](*(self._eval(a)
-                                                      for a in node.args))
+                func = self._bind(self.functions[func_name])
             except KeyError:
-                raise FunctionNotDefined(node.func.id, self.expr)
+                def _undefined_function():
+                    raise FunctionNotDefined(func_name, self.expr)
+                return _undefined_function
+            def _call():
+                try:
+                    return func(*(a() for a in args))
+                except KeyError:
+                    raise FunctionNotDefined(func_name, self.expr)
+            return _call
 
         # variables/names:
 
         elif isinstance(node, ast.Name): # a, b, c...
-            try:
-                #This happens at least for slicing
-                #This is a safe thing to do because it is impossible
-                #that there is a true exression assigning to none
-                #(the compiler rejects it, so you can't even pass that to ast.parse)
-                if node.id == "None":
-                    return None
-                elif isinstance(self.names, dict):
-                    return self.names[node.id]
-                elif callable(self.names):
-                    return self.names(node)
-                else:
-                    raise InvalidExpression('Trying to use name (variable) "{0}"'
-                                            ' when no "names" defined for'
-                                            ' evaluator'.format(node.id))
-
-            except KeyError:
-                raise NameNotDefined(node.id, self.expr)
+            name = node.id
+            def _name():
+                try:
+                    #This happens at least for slicing
+                    #This is a safe thing to do because it is impossible
+                    #that there is a true exression assigning to none
+                    #(the compiler rejects it, so you can't even pass that to ast.parse)
+                    if name == "None":
+                        return None
+                    elif isinstance(self.names, dict):
+                        return self.names[name]
+                    elif callable(self.names):
+                        return self.names(node)
+                    else:
+                        raise InvalidExpression('Trying to use name (variable) "{0}"'
+                                                ' when no "names" defined for'
+                                                ' evaluator'.format(name))
+
+                except KeyError:
+                    raise NameNotDefined(name, self.expr)
+            return _name
 
         elif isinstance(node, ast.Subscript): # b[1]
-            return self._eval(node.value)[self._eval(node.slice)]
+            value = self.compile(node.value)
+            index = self.compile(node.slice)
+            return lambda: value()[index()]
 
         elif isinstance(node, ast.Attribute): # a.b.c
 
-            if node.attr.startswith('__') or node.attr.startswith('func_'):
-                raise FeatureNotAvailable("Sorry, access to __attributes or "
-                    "func_ attributes is not available. ({0})".format(node.attr))
-
-            try:
-                return self._eval(node.value)[node.attr]
-            except (KeyError, TypeError):
-                pass
-
-            # Maybe the base object is an actual object, not just a dict
-            try:
-                return getattr(self._eval(node.value), node.attr)
-            except (AttributeError, TypeError):
-                pass
-
-            # If it is neither, raise an exception
-            raise AttributeDoesNotExist(node.attr, self.expr)
+            attr = node.attr
+            if attr.startswith('__') or attr.startswith('func_'):
+                return _raiser(FeatureNotAvailable,
+                               "Sorry, access to __attributes or "
+                               "func_ attributes is not available. ({0})".format(attr))
+
+            value = self.compile(node.value)
+            def _attribute():
+                try:
+                    return value()[attr]
+                except (KeyError, TypeError):
+                    pass
+
+                # Maybe the base object is an actual object, not just a dict
+                try:
+                    return getattr(value(), attr)
+                except (AttributeError, TypeError):
+                    pass
+
+                # If it is neither, raise an exception
+                raise AttributeDoesNotExist(attr, self.expr)
+            return _attribute
 
         elif isinstance(node, ast.Index):
-            return self._eval(node.value)
+            return self.compile(node.value)
         elif isinstance(node, ast.Slice):
-            lower = upper = step = None
+            lower = upper = step = lambda: None
             if node.lower is not None:
-                lower = self._eval(node.lower)
+                lower = self.compile(node.lower)
             if node.upper is not None:
-                upper = self._eval(node.upper)
+                upper = self.compile(node.upper)
             if node.step is not None:
-                step = self._eval(node.step)
-            return slice(lower, upper, step)
+                step = self.compile(node.step)
+            return lambda: slice(lower(), upper(), step())
         else:
-            raise FeatureNotAvailable("Sorry, {0} is not available in this "
-                                      "evaluator".format(type(node).__name__ ))
+            return _raiser(FeatureNotAvailable,
+                           "Sorry, {0} is not available in this "
+                           "evaluator".format(type(node).__name__ ))
+
+    def _bind(self, func):
+        ''' func as it must be called by compiled expressions '''
+        if self.budget is None:
+            return func
+        return self.budget.wrap(func)
 
 def simple_eval(expr, operators=None, functions=None, names=None):
     ''' Simply evaluate an expresssion '''
@@ -6,11 +6,23 @@ import keypirinha_util as kpu
 import globex
 import filefilter
 
+from .lib import dirwalk
+from .lib import dirwatch
+from .lib import filterengine
+from .lib import fsaccess
+from .lib import scancache
 from collections import namedtuple, OrderedDict
+import concurrent.futures
+import functools
+import hashlib
+import heapq
+import json
+import threading
 import time
 import os
 import re
 import traceback
+import weakref
 
 TEMPLATE_TAG_SEP = ("{", "}")
 TEMPLATE_TAG_REGEX = re.compile(
@@ -35,201 +47,284 @@ TEMPLATE_TAG_REGEX = re.compile(
     r")")
 
 ScanProfile = namedtuple("ScanProfile", (
-    "label", "paths", "max_depth",
+    "label", "paths", "max_depth", "weight", "quota", "priority",
     "include_hidden", "include_dirs", "include_files",
-    "filters", "filters_default",
+    "filters", "filters_default", "filter_engine",
     "trim_extensions",
     "file_item_label", "file_item_desc",
     "dir_item_label", "dir_item_desc",
-    "callback", "open_with"))
+    "callback", "open_with", "watch"))
+
+def _tag_name(entry, profile, plugin):
+    return entry.name
+
+def _tag_clean_name(entry, profile, plugin):
+    # note: trim_extensions is already normalized
+    norm_name = os.path.normcase(entry.name)
+    for ext in profile.trim_extensions:
+        if norm_name.endswith(ext):
+            return entry.name[0:-len(ext)]
+    return entry.name
+
+def _tag_title(entry, profile, plugin):
+    title, ext = os.path.splitext(entry.name)
+    while ext:
+        title, ext = os.path.splitext(title)
+    return title
+
+def _tag_titlex(entry, profile, plugin):
+    return os.path.splitext(entry.name)[0]
+
+def _tag_ext(entry, profile, plugin):
+    return os.path.splitext(entry.name)[1]
+
+def _tag_exts(entry, profile, plugin):
+    exts = ""
+    title, ext = os.path.splitext(entry.name)
+    while 1:
+        if not ext:
+            break
+        exts += ext
+        title, ext = os.path.splitext(title)
+    return exts
+
+def _tag_drive(entry, profile, plugin):
+    drive = os.path.splitdrive(entry.path)[0]
+    if drive:
+        drive += os.sep # splitdrive() returns "C:", we want "C:\"
+    return drive
+
+def _dir_node(entry):
+    # the entries of the walker share the node of their directory, the ones
+    # of a user callback may come from elsewhere
+    try:
+        node = entry.dir_node
+    except AttributeError:
+        node = None
+    if node is None:
+        node = dirwalk.DirNode(os.path.dirname(entry.path))
+    return node
+
+def _tag_dir(entry, profile, plugin):
+    return _dir_node(entry).path
+
+def _tag_dir1(entry, profile, plugin):
+    return _dir_node(entry).name
+
+def _tag_dir2(entry, profile, plugin):
+    return _dir_node(entry).parent.name
+
+def _tag_dir3(entry, profile, plugin):
+    return _dir_node(entry).parent.parent.name
+
+def _tag_2dirs(entry, profile, plugin):
+    return _dir_node(entry).two_dirs
+
+def _tag_3dirs(entry, profile, plugin):
+    return _dir_node(entry).three_dirs
+
+# tag name -> getter(entry, profile, plugin)
+TEMPLATE_TAGS = {
+    "package": lambda entry, profile, plugin: plugin.package_full_name(),
+    "profile": lambda entry, profile, plugin: profile.label,
+    "name": _tag_name,
+    "clean_name": _tag_clean_name,
+    "title": _tag_title,
+    "titlex": _tag_titlex,
+    "ext": _tag_ext,
+    "exts": _tag_exts,
+    "drive": _tag_drive,
+    "dir": _tag_dir,
+    "dir1": _tag_dir1,
+    "dir2": _tag_dir2,
+    "dir3": _tag_dir3,
+    "2dirs": _tag_2dirs,
+    "3dirs": _tag_3dirs}
+
+class ItemTemplate(str):
+    """
+    A label/description template, parsed once into a sequence of literal
+    segments and tag getters so that rendering it for a given entry is a plain
+    join.
+
+    It is a :py:class:`str` so it can be used wherever the original template
+    string is expected. *constants* is an optional dict of tag values known at
+    parsing time (i.e. ``package`` and ``profile``), which are merged into the
+    literal segments.
+    """
+    # how many templates get() keeps, the least recently used go first
+    CACHE_SIZE = 256
+
+    def __new__(cls, template, constants=None):
+        self = super().__new__(cls, template)
+
+        segments = []
+        copy_start = 0
+        for rem in TEMPLATE_TAG_REGEX.finditer(template):
+            if rem.group("escaped_literal_tag"):
+                # insert {{name}} form as {name}
+                value = rem.group("literal_tag")
+            else:
+                tag_name = rem.group("tag_name")
+                if constants and tag_name in constants:
+                    value = constants[tag_name]
+                else:
+                    value = TEMPLATE_TAGS.get(tag_name, None)
+                if value is None:
+                    continue # unknown tag, keep it as-is
+
+            # copy the preceding content before inserting tag's value
+            if copy_start < rem.start():
+                segments.append(template[copy_start:rem.start()])
+            copy_start = rem.end()
+            segments.append(value)
+
+        if copy_start < len(template):
+            segments.append(template[copy_start:])
+
+        # merge consecutive literals
+        self._segments = []
+        for seg in segments:
+            if (isinstance(seg, str) and self._segments and
+                    isinstance(self._segments[-1], str)):
+                self._segments[-1] += seg
+            else:
+                self._segments.append(seg)
+        self._segments = tuple(self._segments)
 
-class LazyItemLabelFormatter:
-    def __init__(self, entry, profile, plugin):
-        self._entry = entry
-        self._profile = profile
-        self._plugin = plugin
+        return self
+
+    @classmethod
+    def get(cls, template):
+        """Return the cached :py:class:`ItemTemplate` of *template*"""
+        if isinstance(template, cls):
+            return template
+        return cls._parse_cached(template)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=CACHE_SIZE)
+    def _parse_cached(template):
+        return ItemTemplate(template)
 
     @classmethod
     def list_invalid_tags(cls, template):
         invalid_tags = []
         for rem in TEMPLATE_TAG_REGEX.finditer(template):
-            pos = rem.start()
             if rem.group("escaped_literal_tag"):
                 continue # skip {{name}} form
-            if not cls.has_tag(rem.group("tag_name")):
+            if rem.group("tag_name") not in TEMPLATE_TAGS:
                 invalid_tags.append(rem.group("tag"))
         return invalid_tags
 
-    def format(self, template, fallback=""):
-        label = ""
-        if template:
-            copy_start = 0
-            for rem in TEMPLATE_TAG_REGEX.finditer(template):
-                idx = rem.start()
-
-                # get tag's value
-                if rem.group("escaped_literal_tag"):
-                    # insert {{name}} form as {name}
-                    value = rem.group("literal_tag")
-                else:
-                    attr = rem.group("tag_name")
-                    try:
-                        value = self.get_tag_value(attr)
-                    except AttributeError:
-                        self._plugin.warn(
-                            "Invalid tag {}{}{} found in profile {}.".format(
-                            TEMPLATE_TAG_SEP[0], rem.group("tag"),
-                            TEMPLATE_TAG_SEP[1],
-                            self._profile.label))
-                        continue
+    def render(self, entry, profile, plugin, fallback=""):
+        label = "".join([
+            seg if seg.__class__ is str else seg(entry, profile, plugin)
+            for seg in self._segments]).strip()
+        return label if label else fallback
 
-                # copy the preceding content before inserting tag's value
-                if copy_start < idx:
-                    label += template[copy_start:idx]
-                copy_start = rem.end()
+class LazyItemLabelFormatter:
+    """
+    Compatibility interface to :py:class:`ItemTemplate` for the user callbacks
+    """
+    __slots__ = ("_entry", "_profile", "_plugin")
 
-                label += value
+    def __init__(self, entry, profile, plugin):
+        self._entry = entry
+        self._profile = profile
+        self._plugin = plugin
 
-            if copy_start < len(template):
-                label += template[copy_start:]
-            label = label.strip()
+    @classmethod
+    def list_invalid_tags(cls, template):
+        return ItemTemplate.list_invalid_tags(template)
 
-        return label if label else fallback
+    def format(self, template, fallback=""):
+        if not template:
+            return fallback
+        return ItemTemplate.get(template).render(
+            self._entry, self._profile, self._plugin, fallback)
 
     @classmethod
     def has_tag(cls, tag_name):
-        return hasattr(cls, "_make_" + tag_name)
+        return tag_name in TEMPLATE_TAGS
 
     def get_tag_value(self, tag_name):
-        if not self.has_tag(tag_name):
-            raise AttributeError(tag_name)
-
-        # try to get the cached version first
         try:
-            return getattr(self, tag_name)
-        except AttributeError:
-            pass
-
-        # otherwise, lazy-init then cache it
-        try:
-            meth = getattr(self, "_make_" + tag_name)
-        except AttributeError:
+            getter = TEMPLATE_TAGS[tag_name]
+        except KeyError:
             raise AttributeError(tag_name)
-        value = meth()
-        setattr(self, tag_name, value)
-
-        return value
-
-    def _make_package(self):
-        return self._plugin.package_full_name()
-
-    def _make_profile(self):
-        return self._profile.label
-
-    def _make_name(self):
-        return self._entry.name
-
-    def _make_clean_name(self):
-        # note: trim_extensions is already normalized
-        norm_name = os.path.normcase(self._entry.name)
-        for ext in self._profile.trim_extensions:
-            if norm_name.endswith(ext):
-                return self._entry.name[0:-len(ext)]
-        return self._entry.name
+        return getter(self._entry, self._profile, self._plugin)
+
+def default_scan_callback(entry, profile, plugin, metrics=None):
+    items = default_batch_scan_callback((entry, ), profile, plugin, metrics)
+    return items[0] if items else None
+
+def default_batch_scan_callback(entries, profile, plugin, metrics=None):
+    # The batch version of default_scan_callback(), called once per scanned
+    # directory with the list of its matching *entries*.
+    # *metrics* is an optional dict of rejection counters to update
+    include_hidden = profile.include_hidden
+    include_dirs = profile.include_dirs
+    include_files = profile.include_files
+    decide = profile.filter_engine.decide
+    open_with_tmpl = profile.open_with
+    create_item = plugin.create_item
+    rejected_hidden = rejected_dirs = rejected_files = rejected_filters = 0
+
+    items = []
+    for entry in entries:
+        if not include_hidden and entry.is_hidden():
+            rejected_hidden += 1
+            continue
+        is_dir = entry.is_dir()
+        if not include_dirs and is_dir:
+            rejected_dirs += 1
+            continue
+        if not include_files and not is_dir:
+            rejected_files += 1
+            continue
+
+        if not decide(entry):
+            rejected_filters += 1
+            continue
+
+        if is_dir:
+            item_label_tmpl = profile.dir_item_label
+            item_desc_tmpl = profile.dir_item_desc
+        else:
+            item_label_tmpl = profile.file_item_label
+            item_desc_tmpl = profile.file_item_desc
 
-    def _make_title(self):
-        title, ext = os.path.splitext(self._entry.name)
-        while ext:
-            title, ext = os.path.splitext(title)
-        return title
+        if open_with_tmpl:
+            open_with = open_with_tmpl.replace('{}', entry.path)
+        else:
+            open_with = None
 
-    def _make_titlex(self):
-        return os.path.splitext(self._entry.name)[0]
+        # templates are ItemTemplate objects, see FilesCatalog._read_config()
+        item_label = item_label_tmpl.render(entry, profile, plugin,
+                                            fallback=entry.name)
+        if item_desc_tmpl:
+            item_desc = item_desc_tmpl.render(entry, profile, plugin)
+        else:
+            item_desc = ""
 
-    def _make_ext(self):
-        return os.path.splitext(self._entry.name)[1]
+        items.append(create_item(
+            category=kp.ItemCategory.FILE,
+            label=item_label,
+            short_desc=item_desc, # path is displayed on GUI if desc is empty
+            target=entry.path,
+            args_hint=kp.ItemArgsHint.ACCEPTED,
+            hit_hint=kp.ItemHitHint.KEEPALL,
+            data_bag=open_with))
 
-    def _make_exts(self):
-        exts = ""
-        title, ext = os.path.splitext(self._entry.name)
-        while 1:
-            if not ext:
-                break
-            exts += ext
-            title, ext = os.path.splitext(title)
-        return exts
-
-    def _make_drive(self):
-        drive = os.path.splitdrive(self._entry.path)[0]
-        if drive:
-            drive += os.sep # splitdrive() returns "C:", we want "C:\"
-        return drive
-
-    def _make_dir(self):
-        return os.path.dirname(self._entry.path)
-
-    def _make_dir1(self):
-        dirname = os.path.dirname(self._entry.path)
-        return os.path.basename(dirname)
-
-    def _make_dir2(self):
-        dirname = os.path.dirname(self._entry.path)
-        dirname = os.path.dirname(dirname)
-        return os.path.basename(dirname)
-
-    def _make_dir3(self):
-        dirname = os.path.dirname(self._entry.path)
-        dirname = os.path.dirname(dirname)
-        dirname = os.path.dirname(dirname)
-        return os.path.basename(dirname)
-
-    def _make_2dirs(self):
-        return os.path.join(self._make_dir2(), self._make_dir1())
-
-    def _make_3dirs(self):
-        return os.path.join(self._make_dir3(), self._make_dir2(),
-                            self._make_dir1())
-
-def default_scan_callback(entry, profile, plugin):
-    if not profile.include_hidden and entry.is_hidden():
-        return None
-    if not profile.include_dirs and entry.is_dir():
-        return None
-    if not profile.include_files and not entry.is_dir():
-        return None
+    if metrics is not None:
+        metrics['rejected_hidden'] += rejected_hidden
+        metrics['rejected_dirs'] += rejected_dirs
+        metrics['rejected_files'] += rejected_files
+        metrics['rejected_filters'] += rejected_filters
 
-    include = profile.filters_default
-    for filter in profile.filters:
-        if filter.match(entry):
-            include = filter.inclusive
-            break
-    if not include:
-        return None
+    return items
 
-    if entry.is_dir():
-        item_label_tmpl = profile.dir_item_label
-        item_desc_tmpl = profile.dir_item_desc
-    else:
-        item_label_tmpl = profile.file_item_label
-        item_desc_tmpl = profile.file_item_desc
-
-    if profile.open_with:
-        open_with = profile.open_with.replace('{}', entry.path)
-    else:
-        open_with = None
-
-    formatter = LazyItemLabelFormatter(entry, profile, plugin)
-    item_label = formatter.format(item_label_tmpl, fallback=entry.name)
-    item_desc = formatter.format(item_desc_tmpl, fallback="")
-
-    return plugin.create_item(
-        category=kp.ItemCategory.FILE,
-        label=item_label,
-        short_desc=item_desc, # path is displayed on GUI if desc is empty
-        target=entry.path,
-        args_hint=kp.ItemArgsHint.ACCEPTED,
-        hit_hint=kp.ItemHitHint.KEEPALL,
-        data_bag=open_with)
+default_batch_scan_callback.batch = True
 
 try:
     from FilesCatalog import filescatalog_user_callbacks
@@ -240,7 +335,10 @@ try:
     filescatalog_user_callbacks._TEMPLATE_TAG_SEP = TEMPLATE_TAG_SEP
     filescatalog_user_callbacks._TEMPLATE_TAG_REGEX = TEMPLATE_TAG_REGEX
     filescatalog_user_callbacks._LazyItemLabelFormatter = LazyItemLabelFormatter
+    filescatalog_user_callbacks._ItemTemplate = ItemTemplate
     filescatalog_user_callbacks._default_scan_callback = default_scan_callback
+    filescatalog_user_callbacks._default_batch_scan_callback = \
+        default_batch_scan_callback
 
     # notify user's module that we are done
     try:
@@ -255,6 +353,520 @@ except ImportError:
     traceback.print_exc()
     filescatalog_user_callbacks = None
 
+class _TargetRegistry:
+    """
+    The normalized targets of the items catalogued so far, so that a file is
+    not catalogued twice by overlapping profiles.
+
+    A target is owned by the profile with the lowest *rank* that produced it.
+    Since profiles may be scanned concurrently, a profile may lose some of its
+    items to a profile of a lower rank that produced them later on.
+    """
+    def __init__(self):
+        self._owners = {} # target -> rank of the owner
+        self._lost = {} # rank -> number of items lost to another profile
+        self._lock = threading.Lock()
+
+    def claim(self, targets, rank):
+        """
+        Claim the given *targets* on behalf of the profile of the given *rank*
+        and return a list of booleans telling which ones have been granted
+        """
+        granted = []
+        with self._lock:
+            for target in targets:
+                owner = self._owners.get(target, None)
+                if owner is None or rank < owner:
+                    self._owners[target] = rank
+                    if owner is not None:
+                        self._lost[owner] = self._lost.get(owner, 0) + 1
+                    granted.append(True)
+                else:
+                    granted.append(False)
+        return granted
+
+    def owns(self, target, rank):
+        return self._owners.get(target, None) == rank
+
+    def lost(self, rank):
+        return self._lost.get(rank, 0)
+
+class _GlobExWalker:
+    """
+    Walk a path pattern with ``globex.iglobex()``, the native walker of
+    Keypirinha, through the interface of :py:class:`dirwalk.DirWalker`.
+
+    This is the walker of the scans that do not need what
+    :py:class:`dirwalk.DirWalker` offers on top of it (see
+    :py:meth:`_ProfileScan._start`). It records nothing, does not prune any
+    directory and cannot be resumed. The entries are processed by batches of
+    consecutive entries located in the same directory, in the order of
+    ``iglobex()``, which is not breadth-first. Like the ones of
+    :py:class:`dirwalk.DirWalker`, they are wrapped into
+    :py:class:`dirwalk.WalkEntry` objects that share the
+    :py:class:`dirwalk.DirNode` of their directory.
+    """
+    def __init__(self, pattern, max_depth=-1, include_hidden=False,
+                 should_terminate=None):
+        self.pattern = pattern
+        self.base = dirwalk.split_pattern(pattern)[0]
+        self.max_depth = max_depth
+        self.include_hidden = include_hidden
+        self.should_terminate = should_terminate
+        self.resume_cursor = None
+        self.cancelled = False
+        self.records = {}
+        self.skipped_dirs = 0
+        self.scanned_dirs = 0
+        self.pruned_dirs = 0
+        self.hidden_entries = 0
+        self.yielded_entries = 0
+        self.deepest_level = -1
+        self.fs_time = 0.0 # time spent in iglobex()
+        self._nodes = {} # dir path -> DirNode
+
+    def walk(self, process):
+        """Same as :py:meth:`dirwalk.DirWalker.walk`"""
+        entries = globex.iglobex(
+            self.pattern,
+            recursivity=self.max_depth,
+            include_hidden=self.include_hidden)
+        base_len = len(self.base.rstrip(os.sep))
+        batch = []
+        batch_dir = None
+        countdown = dirwalk.TERMINATION_CHECK_INTERVAL
+        while True:
+            start = time.perf_counter()
+            entry = next(entries, None)
+            self.fs_time += time.perf_counter() - start
+
+            dir_path = None if entry is None else os.path.dirname(entry.path)
+            if batch and dir_path != batch_dir:
+                rel_dir = batch_dir[base_len:].strip(os.sep)
+                depth = rel_dir.count(os.sep) + 1 if rel_dir else 0
+                node = self._nodes.get(batch_dir, None)
+                if node is None:
+                    node = dirwalk.DirNode(
+                        batch_dir, self._nodes.get(os.path.dirname(batch_dir)))
+                    self._nodes[batch_dir] = node
+                self.scanned_dirs += 1
+                self.yielded_entries += len(batch)
+                self.deepest_level = max(self.deepest_level, depth)
+                items = process([dirwalk.WalkEntry(entry, depth, node)
+                                 for entry in batch])
+                if items:
+                    yield depth, items
+                batch = []
+
+                if self.should_terminate is not None:
+                    countdown -= 1
+                    if countdown <= 0:
+                        countdown = dirwalk.TERMINATION_CHECK_INTERVAL
+                        if self.should_terminate():
+                            self.cancelled = True
+                            return
+
+            if entry is None:
+                break
+            batch_dir = dir_path
+            batch.append(entry)
+
+    def cursor(self):
+        """The walk cannot be resumed, ``None`` is always returned"""
+        return None
+
+class _SnapshotWalker:
+    """
+    Replay the *records* of a complete walk of a path pattern (see
+    :py:attr:`dirwalk.DirWalker.records`) through the interface of
+    :py:class:`dirwalk.DirWalker`, without reading the filesystem.
+
+    This is the walker of the paths of a watched profile that have not been
+    reported as changed.
+    """
+    def __init__(self, pattern, records):
+        self.pattern = pattern
+        self.base = dirwalk.split_pattern(pattern)[0]
+        self.resume_cursor = None
+        self.cancelled = False
+        self.records = records
+        self.skipped_dirs = len(records)
+        self.scanned_dirs = 0
+        self.pruned_dirs = 0
+        self.hidden_entries = 0
+        self.yielded_entries = 0
+        self.deepest_level = -1
+        self.fs_time = 0.0
+
+    def walk(self, process):
+        """Same as :py:meth:`dirwalk.DirWalker.walk`, *process* is not used"""
+        for depth, items in _snapshot_batches(self.records, self.base):
+            self.deepest_level = depth
+            yield depth, items
+
+    def cursor(self):
+        """The walk cannot be resumed, ``None`` is always returned"""
+        return None
+
+def _snapshot_batches(records, base, skipped=()):
+    # the (depth, items) batches of the given records, sorted by depth, except
+    # the ones which key is in skipped
+    base = os.path.normcase(base).rstrip(os.sep)
+    batches = []
+    for key, record in records.items():
+        if not record.items or key in skipped:
+            continue
+        rel_path = key[0][len(base):].strip(os.sep)
+        depth = rel_path.count(os.sep) + 1 if rel_path else 0
+        batches.append((depth, record.items))
+    batches.sort(key=lambda batch: batch[0])
+    return batches
+
+class _ProfileScan:
+    """
+    The scan of a profile, that can be paused as soon as it has produced a
+    given number of items, and resumed later on.
+
+    The paths of the profile are walked side by side, one depth level at a
+    time, so that the items found close to the base directory of the paths
+    come first, whatever their order of declaration.
+
+    If *items* is given, it must be the :py:attr:`produced_items` of a previous
+    complete scan of the same profile, in which case the scan is considered
+    done already and nothing is walked.
+
+    The walk is interrupted as soon as *should_terminate* returns true, in
+    which case :py:attr:`cancelled` is set. The cursors saved by
+    :py:meth:`finish` let the next scan of the profile resume from there.
+
+    A path which filesystem does not respond in time is marked as
+    :py:attr:`unavailable`, the items of its previous scan are used instead.
+
+    *should_terminate* replaces the plugin's ``should_terminate()`` if given.
+
+    If *changed_paths* is given, the last scan of the profile was complete and
+    only the paths in *changed_paths* may have changed since then. The items of
+    the other paths are taken from the snapshot of that scan, if any, without
+    reading the filesystem.
+
+    *bounded* must be true only if the scan is known not to reach the
+    *catalog_limit* nor the *quota* of the profile, in which case the order
+    the entries are found in does not matter.
+    """
+    def __init__(self, plugin, profile_name, profile, registry=None,
+                 rank=None, items=None, should_terminate=None,
+                 changed_paths=None, bounded=False):
+        self.plugin = plugin
+        self.should_terminate = should_terminate or plugin.should_terminate
+        self.profile_name = profile_name
+        self.profile = profile
+        self.registry = registry
+        self.rank = rank
+        self.items = []
+        self.produced_items = [] # items before the duplicates are removed
+        self.targets = [] # normalized target of each item if registry is set
+        self.duplicates = 0 # items rejected because of registry
+        self.done = False
+        self.cancelled = False
+        self.reused = items is not None
+        self.unavailable = set() # paths that timed out
+        self.elapsed = 0.0
+        self.changed_paths = changed_paths
+        self.bounded = bounded
+
+        self._old_snapshot = None
+        self._walkers = [] # (path, walker, stats, items count) lists
+        self._heap = None # (depth, walker index, items, batches iterator)
+        self._pending = None # (walker index, items) left by the last batch
+
+        if self.reused:
+            self.produced_items = items
+            self.items = self._claim(items) if registry is not None else items
+            self.done = True
+            self._heap = []
+
+    @property
+    def count(self):
+        """The number of items produced and not lost to another profile"""
+        if self.registry is None:
+            return len(self.items)
+        return len(self.items) - self.registry.lost(self.rank)
+
+    @property
+    def quota_reached(self):
+        return bool(self.profile.quota) and self.count >= self.profile.quota
+
+    def run(self, count):
+        """
+        Scan until the profile has produced *count* more items (capped by the
+        *quota* of the profile), until there is nothing left to scan, in which
+        case :py:attr:`done` is set, or until the scan is :py:attr:`cancelled`.
+        This method may be called concurrently for different profiles.
+        """
+        start = time.perf_counter()
+        if self.profile.quota:
+            count = min(count, self.profile.quota - self.count)
+        if self._heap is None:
+            self._start()
+
+        while count > 0 and not self.cancelled:
+            if self._pending is not None:
+                idx, items = self._pending
+                self._pending = None
+            elif self._heap:
+                _, idx, items, batches = heapq.heappop(self._heap)
+                items = self.plugin._thaw_items(items)
+                self._push(idx, batches)
+            else:
+                break
+
+            if len(items) > count:
+                self._pending = (idx, items[count:])
+                items = items[0:count]
+            if self.registry is not None:
+                self.produced_items.extend(items)
+                items = self._claim(items)
+            self.items.extend(items)
+            self._walkers[idx][3] += len(items)
+            count -= len(items)
+
+        if (not self.cancelled and self._pending is None and
+                not self._heap):
+            self.done = True
+        self.elapsed += time.perf_counter() - start
+
+    def finish(self, interrupted=False):
+        """
+        Save the snapshot of the scan and return its stats. The items lost to
+        another profile are removed from :py:attr:`items`. The scan cannot be
+        resumed afterwards.
+
+        If *interrupted* is true, the scan of the catalog has been cancelled
+        (not necessarily while this profile was being scanned). The cursors of
+        the walks are saved along with the snapshot so that the next scan of
+        the profile resumes from where this one stopped.
+        """
+        plugin = self.plugin
+        profile = self.profile
+        snapshot = {}
+        cursors = None
+        patterns_stats = OrderedDict()
+
+        if self._heap is None:
+            if interrupted:
+                # not started, leave the last snapshot untouched
+                return plugin._new_scan_stats()
+            self._start()
+
+        if interrupted and not self.reused:
+            cursors = {}
+            for path, walker, _, _ in self._walkers:
+                if path not in self.unavailable:
+                    cursor = walker.cursor()
+                    if cursor is not None:
+                        cursors[path] = cursor
+        elif not self.done:
+            plugin.warn((
+                'Stopping scan of profile "{}" due to {} reached ' +
+                '({} items).').format(
+                profile.label,
+                "quota" if self.quota_reached else "catalog_limit",
+                self.count))
+
+        if self.registry is None:
+            self.produced_items = self.items
+        if self.registry is not None and self.registry.lost(self.rank):
+            self.items = [
+                item for item, target in zip(self.items, self.targets)
+                if self.registry.owns(target, self.rank)]
+            self.duplicates += self.registry.lost(self.rank)
+        self.targets = []
+
+        if self.reused:
+            # the snapshot of the profile is still the one of the last scan
+            stats = plugin._new_scan_stats()
+            stats['items'] = len(self.items)
+            stats['duplicates'] = self.duplicates
+            stats['reused'] = True
+            return stats
+
+        for path, walker, pattern_stats, items_count in self._walkers:
+            if (self.done and not interrupted and
+                    path not in self.unavailable):
+                snapshot[path] = walker.records
+            else:
+                # records are validated against the modification time of
+                # their directory so the ones of the directories that have
+                # not been visited yet can be kept for the next scan
+                snapshot[path] = dict(self._old_snapshot.get(path, {}))
+                snapshot[path].update(walker.records)
+
+            if pattern_stats is None:
+                pattern_stats = plugin._new_scan_stats()
+            pattern_stats['items'] = items_count
+            pattern_stats['dirs_visited'] = \
+                walker.skipped_dirs + walker.scanned_dirs
+            pattern_stats['dirs_unchanged'] = walker.skipped_dirs
+            pattern_stats['dirs_rescanned'] = walker.scanned_dirs
+            pattern_stats['dirs_pruned'] = walker.pruned_dirs
+            pattern_stats['entries_yielded'] = walker.yielded_entries
+            pattern_stats['rejected_hidden'] += walker.hidden_entries
+            pattern_stats['deepest_level'] = walker.deepest_level
+            pattern_stats['fs_time'] = walker.fs_time
+            pattern_stats['timeouts'] = int(path in self.unavailable)
+            patterns_stats[path] = pattern_stats
+
+        for path, records in self._old_snapshot.items():
+            if path in profile.paths and path not in snapshot:
+                snapshot[path] = records
+        plugin._save_snapshot(self.profile_name, snapshot, cursors)
+
+        # sum up the stats of the patterns
+        stats = plugin._new_scan_stats()
+        for pattern_stats in patterns_stats.values():
+            for key, value in pattern_stats.items():
+                if key == 'deepest_level':
+                    stats[key] = max(stats[key], value)
+                else:
+                    stats[key] += value
+        stats['items'] = len(self.items)
+        stats['duplicates'] = self.duplicates
+        stats['elapsed'] = self.elapsed
+        stats['patterns'] = patterns_stats
+
+        return stats
+
+    def _start(self):
+        plugin = self.plugin
+        profile = self.profile
+        self._old_snapshot, cursors = plugin._load_snapshot(self.profile_name)
+        self._heap = []
+
+        # Let the filters stop the walk at the directories which descendants
+        # are all excluded anyway. A user callback may decide otherwise.
+        if (profile.callback is default_scan_callback and
+                profile.filter_engine.can_prune):
+            prune = profile.filter_engine.prunes
+        else:
+            prune = None
+
+        for path in profile.paths:
+            pattern = path
+            fs = plugin._filesystem(path)
+            timed_out = False
+
+            # we call splitdrive() because a UNC may have a '?' char in it
+            # like in \\?\C:\dir\file
+            has_magic = globex.has_magic(os.path.splitdrive(pattern)[1])
+
+            # if this is not a pattern, warn the user in case path is not
+            # found/readable
+            if not has_magic:
+                try:
+                    is_dir = fs.isdir(pattern)
+                    if not is_dir and not fs.exists(pattern):
+                        plugin.warn("Path not found in profile {}: {}".format(
+                                    profile.label, pattern))
+                        continue
+                except fsaccess.PathTimeoutError:
+                    is_dir = False
+                    timed_out = True
+
+                # If path points to a directory, assume only its direct
+                # content must be scanned.
+                if is_dir:
+                    pattern = os.path.join(pattern, "*")
+
+            # The native walker is faster as long as there is no snapshot to
+            # record, no network timeout to enforce and no directory to prune.
+            # It is not breadth-first either, so the shallow entries would not
+            # come first if the scan reached a limit.
+            if (self.changed_paths is not None and
+                    path not in self.changed_paths and
+                    self._old_snapshot.get(path, None)):
+                walker = _SnapshotWalker(pattern, self._old_snapshot[path])
+            elif (plugin.incremental_scan or profile.watch or
+                    fs is not plugin.fs or prune is not None or
+                    not self.bounded):
+                walker = dirwalk.DirWalker(
+                    pattern,
+                    max_depth=profile.max_depth,
+                    include_hidden=profile.include_hidden,
+                    snapshot=self._old_snapshot.get(path, None),
+                    prune=prune,
+                    should_terminate=self.should_terminate,
+                    cursor=cursors.get(path, None),
+                    fs=fs)
+            else:
+                walker = _GlobExWalker(
+                    pattern,
+                    max_depth=profile.max_depth,
+                    include_hidden=profile.include_hidden,
+                    should_terminate=self.should_terminate)
+            resume_cursor = walker.resume_cursor
+            if resume_cursor is not None:
+                if resume_cursor.queue:
+                    next_dir = resume_cursor.queue[0][0]
+                else:
+                    next_dir = "its end"
+                plugin.info((
+                    "Profile {}: resuming interrupted scan of {}, {} " +
+                    "directories reused, continuing from {}").format(
+                    profile.label, path, len(resume_cursor.visited),
+                    next_dir))
+            elif path in cursors:
+                plugin.info((
+                    "Profile {}: interrupted scan of {} cannot be resumed, " +
+                    "starting over").format(profile.label, path))
+            pattern_stats = plugin._new_scan_stats() if plugin.metrics else None
+            process = functools.partial(
+                plugin._scan_entries, profile=profile, stats=pattern_stats)
+
+            self._walkers.append([path, walker, pattern_stats, 0])
+            if timed_out:
+                self._path_unavailable(len(self._walkers) - 1)
+            else:
+                self._push(len(self._walkers) - 1, walker.walk(process))
+
+    def _claim(self, items):
+        targets = [os.path.normcase(item.target()) for item in items]
+        granted = self.registry.claim(targets, self.rank)
+        claimed = []
+        for item, target, ok in zip(items, targets, granted):
+            if ok:
+                claimed.append(item)
+                self.targets.append(target)
+        self.duplicates += len(items) - len(claimed)
+        return claimed
+
+    def _push(self, idx, batches):
+        # fetch the next batch of items of a walker, the walker index breaks
+        # the ties between the batches of the same depth
+        try:
+            depth, items = next(batches)
+        except StopIteration:
+            if self._walkers[idx][1].cancelled:
+                self.cancelled = True
+            return
+        except fsaccess.PathTimeoutError:
+            self._path_unavailable(idx)
+            return
+        heapq.heappush(self._heap, (depth, idx, items, batches))
+
+    def _path_unavailable(self, idx):
+        # stop walking the path and fall back to the items of its previous
+        # scan for the directories that have not been visited
+        path, walker = self._walkers[idx][0:2]
+        self.unavailable.add(path)
+        self.plugin.warn((
+            "Profile {}: {} did not respond within {} seconds, reusing the " +
+            "items of the previous scan").format(
+            self.profile.label, path, self.plugin.network_timeout))
+
+        cached = _snapshot_batches(
+            self._old_snapshot.get(path, {}), walker.base, walker.records)
+        self._push(idx, iter(cached))
+
 class FilesCatalog(kp.Plugin):
     """A plugin to catalog items from the file system"""
 
@@ -264,8 +876,23 @@ class FilesCatalog(kp.Plugin):
 
     MAX_PROFILE_INHERITANCE_DEPTH = 5
 
+    METRICS_FILE = "metrics.json"
+    SNAPSHOT_FILE_FORMAT = "snapshot_{}.pickle"
+    SNAPSHOT_VERSION = 2
+    CATALOG_FILE = "catalog.pickle"
+    CATALOG_VERSION = 1
+
     DEFAULT_CATALOG_LIMIT = 100_000
     DEFAULT_CONFIG_DEBUG = False
+    DEFAULT_DEDUP = "first"
+    DEFAULT_INCREMENTAL_SCAN = True
+    DEFAULT_METRICS = False
+    DEFAULT_NETWORK_TIMEOUT = 10
+    DEFAULT_NETWORK_WORKERS = 4
+    DEFAULT_SCAN_WORKERS = 1
+    DEFAULT_WARM_START = True
+    DEFAULT_WATCH_DEBOUNCE = 2
+    DEFAULT_WATCH_POLL_INTERVAL = 60
     DEFAULT_ITEM_LABEL = "{clean_name}"
     DEFAULT_SHOW_DIRS_FIRST = True
     DEFAULT_SHOW_HIDDEN_FILES = False
@@ -273,76 +900,214 @@ class FilesCatalog(kp.Plugin):
 
     catalog_limit = DEFAULT_CATALOG_LIMIT
     config_debug = DEFAULT_CONFIG_DEBUG
+    dedup = DEFAULT_DEDUP
+    incremental_scan = DEFAULT_INCREMENTAL_SCAN
+    metrics = DEFAULT_METRICS
+    network_timeout = DEFAULT_NETWORK_TIMEOUT
+    network_workers = DEFAULT_NETWORK_WORKERS
+    scan_workers = DEFAULT_SCAN_WORKERS
+    warm_start = DEFAULT_WARM_START
+    watch_debounce = DEFAULT_WATCH_DEBOUNCE
+    watch_poll_interval = DEFAULT_WATCH_POLL_INTERVAL
     show_dirs_first = DEFAULT_SHOW_DIRS_FIRST
     show_hidden_files = DEFAULT_SHOW_HIDDEN_FILES
     show_system_files = DEFAULT_SHOW_SYSTEM_FILES
     profiles = OrderedDict()
+    profile_signatures = {}
 
     def __init__(self):
         super().__init__()
+        self.profile_signatures = {}
+        self._snapshots = {}
+        self._last_scans = {} # profile name -> produced items of a full scan
+
+        # the filesystem layer the scans go through, may be replaced by any
+        # fsaccess.FileSystem object (e.g. to simulate slow network shares)
+        self.fs = fsaccess.FileSystem()
+        self._network_fs = None
+        self._network_fs_lock = threading.Lock()
+
+        # the catalog may be built by on_catalog() as well as by the watcher
+        self._catalog_lock = threading.Lock()
+        self._catalog_size = 0 # number of items last built
+        self._watcher = None
+        self._watcher_update = None # (catalog, message) left to commit
 
     def on_start(self):
         self._read_config()
+        self._load_warm_catalog()
+        self._start_watcher()
 
     def on_catalog(self):
-        start = time.perf_counter()
-        catalog = []
-        scanned_profiles = OrderedDict()
+        with self._catalog_lock:
+            self._build_catalog()
 
-        if self.profiles:
-            self.info("Cataloging {} profile{}...".format(
-                      len(self.profiles), "s"[len(self.profiles)==1:]))
+    def on_activated(self):
+        self._commit_watcher_update()
 
-        for profile_name, profile in self.profiles.items():
-            items_count = 0
-            sub_start = time.perf_counter()
-
-            for pattern in profile.paths:
-                # we call splitdrive() because a UNC may have a '?' char in it
-                # like in \\?\C:\dir\file
-                has_magic = globex.has_magic(os.path.splitdrive(pattern)[1])
-
-                # if this is not a pattern, warn the user in case path is not
-                # found/readable
-                if not has_magic:
-                    is_dir = os.path.isdir(pattern)
-                    if not is_dir and not os.path.exists(pattern):
-                        self.warn("Path not found in profile {}: {}".format(
-                                  profile.label, pattern))
-                        continue
+    def on_deactivated(self):
+        self._commit_watcher_update()
 
-                    # If path points to a directory, assume only its direct
-                    # content must be scanned.  Also, globex.iglobex() would
-                    # return *pattern* as-is if no wildcard were appended.
-                    if is_dir:
-                        pattern = os.path.join(pattern, "*")
-
-                for entry in globex.iglobex(
-                        pattern,
-                        recursivity=profile.max_depth,
-                        include_hidden=profile.include_hidden):
-                    item = profile.callback(entry, profile, self)
-                    if item and isinstance(item, keypirinha_api.CatalogItem):
-                        catalog.append(item)
-                        items_count += 1
-                        if len(catalog) >= self.catalog_limit:
-                            self.warn((
-                                'Stopping scan of profile "{}" due to ' +
-                                'catalog_limit reached ({} items).').format(
-                                profile.label, self.catalog_limit))
-                            break
-
-            scanned_profiles[profile.label] = (items_count,
-                                               time.perf_counter() - sub_start)
+    def on_events(self, flags):
+        if flags & kp.Events.PACKCONFIG:
+            # cancel the update in progress, if any, before waiting for it
+            self._stop_watcher()
+            with self._catalog_lock:
+                old_settings = (self.catalog_limit, self.dedup)
+                old_profiles = self.profiles
+                old_signatures = self.profile_signatures
+                if self._read_config():
+                    # keep the items of the profiles that have not been
+                    # modified, unless a global setting that affects all of
+                    # them has been
+                    if old_settings != (self.catalog_limit, self.dedup):
+                        self._last_scans = {}
+                    reusable = set(
+                        name for name, profile in self.profiles.items()
+                        if old_profiles.get(name, None) == profile and
+                            old_signatures.get(name, None) ==
+                                self.profile_signatures.get(name, None))
+                    self._build_catalog(reusable)
+            self._start_watcher()
+        else:
+            self._commit_watcher_update()
+
+    def _build_catalog(self, reusable=(), watched=None,
+                       should_terminate=None):
+        """
+        Scan the profiles and commit the catalog. The items of the last scan
+        of the profiles named in *reusable* are reused as-is, provided that
+        scan was complete.
+
+        *watched* maps the names of the profiles the watcher has reported as
+        changed to the set of their changed paths. In this case the catalog is
+        not committed but left to :py:meth:`_commit_watcher_update`, and only
+        if the scan found something new.
+        *should_terminate* replaces the plugin's ``should_terminate()`` if
+        given.
+        """
+        start = time.perf_counter()
+        catalog = []
+        scanned_profiles = OrderedDict()
+        last_scans = self._last_scans
+        self._last_scans = {}
+        if should_terminate is None:
+            should_terminate = self.should_terminate
+
+        reused_count = sum(1 for name in reusable if name in last_scans)
+        if self.profiles and watched is None:
+            self.info("Cataloging {} profile{}{}...".format(
+                      len(self.profiles), "s"[len(self.profiles)==1:],
+                      " ({} unchanged)".format(reused_count)
+                      if reused_count else ""))
+
+        if self.dedup == "none":
+            registry = None
+        else:
+            registry = _TargetRegistry()
+        scans = []
+        for idx, (name, profile) in enumerate(self.profiles.items()):
+            # the lower the rank, the higher the precedence
+            if self.dedup == "last":
+                rank = -idx
+            elif self.dedup == "priority":
+                rank = (-profile.priority, idx)
+            else:
+                rank = idx
+            if name in reusable and name in last_scans:
+                items = last_scans[name]
+            else:
+                items = None
+            if watched is not None and name in last_scans:
+                changed_paths = watched.get(name, None)
+            else:
+                changed_paths = None
+            # a profile which last complete scan stayed well below the limits
+            # is not expected to reach them this time
+            bounded = (
+                name in last_scans and
+                self._catalog_size * 2 <= self.catalog_limit and
+                (not profile.quota or
+                    len(last_scans[name]) * 2 <= profile.quota))
+            scans.append(_ProfileScan(self, name, profile, registry, rank,
+                                      items, should_terminate, changed_paths,
+                                      bounded))
+        workers = min(self.scan_workers, len(scans))
+        if workers > 1:
+            # profiles are scanned concurrently but their results are merged
+            # in the order of declaration
+            with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=workers,
+                    thread_name_prefix="FilesCatalog") as executor:
+                self._schedule_scans(scans, executor)
+        else:
+            self._schedule_scans(scans)
+
+        if any(scan.cancelled for scan in scans) or should_terminate():
+            for scan in scans:
+                scan.finish(interrupted=True)
+            self._last_scans = last_scans
+            if watched is None:
+                self.info("Catalog request cancelled, scan will resume " +
+                          "from where it stopped")
+            return
+
+        duplicates = 0
+        modified = False
+        for scan in scans:
+            stats = scan.finish()
+            scanned_profiles[scan.profile.label] = stats
+            catalog.extend(scan.items)
+            duplicates += scan.duplicates
+            if scan.done:
+                self._last_scans[scan.profile_name] = scan.produced_items
+            if stats['dirs_rescanned'] or stats['timeouts']:
+                modified = True
+
+        if watched is not None:
+            # a directory that has been removed is not rescanned, hence the
+            # size check
+            if modified or len(catalog) != self._catalog_size:
+                self._catalog_size = len(catalog)
+                self._watcher_update = (catalog, (
+                    "Catalog updated after changes in profile{} {}: {} " +
+                    "item{} in {:.1f} seconds").format(
+                    "s"[len(watched)==1:],
+                    ", ".join(self.profiles[name].label
+                              for name in self.profiles if name in watched),
+                    len(catalog), "s"[len(catalog)==1:],
+                    time.perf_counter() - start))
+                self._save_warm_catalog(catalog)
+            return
 
         if self.profiles:
-            for label, (count, elapsed) in scanned_profiles.items():
+            for label, stats in scanned_profiles.items():
+                count = stats['items']
+                if stats.get('reused', False):
+                    self.info(
+                        "Profile {}: kept {} item{} from previous scan".format(
+                        label, count, "s"[count==1:]))
+                    continue
+                skipped_dirs = stats['dirs_unchanged']
+                scanned_dirs = stats['dirs_rescanned']
                 self.info(
                     "Profile {}: found {} item{} in {:.1f} seconds".format(
-                    label, count, "s"[count==1:], elapsed))
+                    label, count, "s"[count==1:], stats['elapsed']))
+                self.info((
+                    "Profile {}: {} unchanged director{} skipped, " +
+                    "{} director{} rescanned, {} pruned by filters").format(
+                    label,
+                    skipped_dirs, "ies" if skipped_dirs != 1 else "y",
+                    scanned_dirs, "ies" if scanned_dirs != 1 else "y",
+                    stats['dirs_pruned']))
+            if duplicates:
+                self.info("Dropped {} duplicate item{} (dedup rule: {})".format(
+                          duplicates, "s"[duplicates==1:], self.dedup))
 
         sub_start = time.perf_counter()
         self.set_catalog(catalog)
+        self._catalog_size = len(catalog)
+        self._watcher_update = None
 
         if self.profiles:
             if catalog:
@@ -354,6 +1119,9 @@ class FilesCatalog(kp.Plugin):
                 len(catalog), "s"[len(catalog)==1:],
                 time.perf_counter() - start))
 
+        self._save_warm_catalog(catalog)
+        self._save_metrics(scanned_profiles, time.perf_counter() - start)
+
     def on_suggest(self, user_input, items_chain):
         if items_chain and items_chain[-1].category() == kp.ItemCategory.FILE:
             current_item = items_chain[-1]
@@ -391,16 +1159,398 @@ class FilesCatalog(kp.Plugin):
         else:
             kpu.execute_default_action(self, item, action)
 
-    def on_events(self, flags):
-        if flags & kp.Events.PACKCONFIG:
-            if self._read_config():
-                self.on_catalog()
+    def _schedule_scans(self, scans, executor=None):
+        """
+        Run the given :py:class:`_ProfileScan` objects until *catalog_limit*
+        is reached or until there is nothing left to scan.
+
+        The limit is split across the profiles according to their *weight*.
+        The budget left unused by the profiles that complete their scan (or
+        reach their *quota*) before using up their share is split again across
+        the others, which resume their scan where they paused, and so on. So
+        is the share of the items lost to another profile as duplicates.
+        """
+        active = list(scans)
+        while active and not any(scan.cancelled for scan in scans):
+            room = self.catalog_limit - sum(scan.count for scan in scans)
+            if room <= 0:
+                break
+
+            total_weight = sum(scan.profile.weight for scan in active)
+            shares = [room * scan.profile.weight // total_weight
+                      for scan in active]
+            for idx in range(room - sum(shares)):
+                shares[idx] += 1
+
+            jobs = [(scan, share)
+                    for scan, share in zip(active, shares) if share > 0]
+            if executor is not None:
+                futures = [executor.submit(scan.run, share)
+                           for scan, share in jobs]
+                for future in futures:
+                    future.result()
+            else:
+                for scan, share in jobs:
+                    scan.run(share)
+
+            active = [scan for scan in active
+                      if not scan.done and not scan.quota_reached]
+
+    def _start_watcher(self):
+        """
+        Watch the paths of the profiles which *watch* setting is enabled, so
+        that the catalog is updated shortly after their content changes.
+        """
+        self._stop_watcher()
+
+        roots = []
+        for name, profile in self.profiles.items():
+            if not profile.watch:
+                continue
+            for path in profile.paths:
+                key = (name, path)
+                if globex.has_magic(os.path.splitdrive(path)[1]):
+                    base, segments = dirwalk.split_pattern(path)
+                    roots.append((key, base, len(segments) > 1 or
+                                  dirwalk.RECURSIVE_SEGMENT in segments))
+                    continue
+                try:
+                    is_dir = self._filesystem(path).isdir(path)
+                except fsaccess.PathTimeoutError:
+                    is_dir = True
+                if is_dir:
+                    roots.append((key, path, False))
+                else:
+                    roots.append((key, os.path.dirname(path), False))
+        if not roots:
+            return
+
+        # the watcher must not keep a reloaded plugin alive
+        plugin_ref = weakref.ref(self)
+        def _on_change(keys):
+            plugin = plugin_ref()
+            if plugin is None:
+                watcher.stop()
+            else:
+                plugin._on_watched_change(watcher, keys)
+
+        def _filesystem(path):
+            plugin = plugin_ref()
+            if plugin is None:
+                return fsaccess.FileSystem()
+            return plugin._filesystem(path)
+
+        watcher = dirwatch.DirWatcher(
+            roots, _on_change, debounce=self.watch_debounce,
+            poll_interval=self.watch_poll_interval, filesystem=_filesystem)
+        watcher.start()
+        self._watcher = watcher
+        if self.config_debug:
+            self.info("Watching {} path{} for changes".format(
+                      len(roots), "s"[len(roots)==1:]))
+
+    def _stop_watcher(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
+    def _on_watched_change(self, watcher, keys):
+        # called from the thread of the watcher with the (profile name, path)
+        # keys of the modified paths: only those are walked again, and the
+        # snapshot of their last scan limits the walk to the directories which
+        # content has changed
+        with self._catalog_lock:
+            if watcher.stopped():
+                return
+            watched = {}
+            for name, path in keys:
+                if name in self.profiles:
+                    watched.setdefault(name, set()).add(path)
+            if watched:
+                self._build_catalog(
+                    reusable=set(self.profiles) - set(watched),
+                    watched=watched, should_terminate=watcher.stopped)
+
+    def _commit_watcher_update(self):
+        """
+        Commit the catalog built after a change reported by the watcher, if
+        any. A catalog still being built is committed the time after.
+
+        The catalog is built from the thread of the watcher but must be
+        committed from the one of the plugin, and Keypirinha offers no way to
+        schedule a call in that thread. So the commit waits for the next
+        callback of the plugin that does not build the catalog itself:
+        :py:meth:`on_activated` (the LaunchBox is shown, before any search is
+        typed), :py:meth:`on_deactivated` and :py:meth:`on_events`.
+        """
+        if not self._catalog_lock.acquire(blocking=False):
+            return
+        try:
+            update = self._watcher_update
+            self._watcher_update = None
+        finally:
+            self._catalog_lock.release()
+        if update is not None:
+            catalog, message = update
+            self.set_catalog(catalog)
+            self.info(message)
+
+    def _filesystem(self, path):
+        """
+        Return the :py:class:`fsaccess.FileSystem` object to scan *path* with.
+        The calls made to a remote path are subject to *network_timeout* and
+        *network_workers*.
+        """
+        if not self.network_timeout or not self.fs.is_remote(path):
+            return self.fs
+
+        # profiles may be scanned concurrently
+        with self._network_fs_lock:
+            network_fs = self._network_fs
+            if (network_fs is None or network_fs.fs is not self.fs or
+                    network_fs.timeout != self.network_timeout or
+                    network_fs.max_calls != self.network_workers):
+                if network_fs is not None:
+                    network_fs.shutdown()
+                network_fs = fsaccess.TimeoutFileSystem(
+                    self.network_timeout, self.network_workers, self.fs)
+                self._network_fs = network_fs
+            return network_fs
+
+    def _new_scan_stats(self):
+        return {
+            'items': 0,
+            'duplicates': 0,
+            'dirs_visited': 0,
+            'dirs_unchanged': 0,
+            'dirs_rescanned': 0,
+            'dirs_pruned': 0,
+            'entries_yielded': 0,
+            'rejected_hidden': 0,
+            'rejected_dirs': 0,
+            'rejected_files': 0,
+            'rejected_filters': 0,
+            'rejected_callback': 0, # entries rejected by a python_callback
+            'deepest_level': -1,
+            'fs_time': 0.0,
+            'timeouts': 0,
+            'callback_time': 0.0}
+
+    def _scan_entries(self, entries, profile, stats=None):
+        # *entries* are the matching entries of a single directory. A callback
+        # flagged with a true *batch* attribute gets them all at once and
+        # returns a list of items, so that its setup cost is paid once per
+        # directory instead of once per entry.
+        start = time.perf_counter() if stats is not None else None
+        callback = profile.callback
+
+        if callback is default_scan_callback:
+            items = default_batch_scan_callback(entries, profile, self, stats)
+        elif getattr(callback, "batch", False):
+            items = [
+                item for item in (callback(entries, profile, self) or ())
+                if item and isinstance(item, keypirinha_api.CatalogItem)]
+            if stats is not None:
+                stats['rejected_callback'] += len(entries) - len(items)
+        else:
+            items = []
+            for entry in entries:
+                item = callback(entry, profile, self)
+                if item and isinstance(item, keypirinha_api.CatalogItem):
+                    items.append(item)
+                elif stats is not None:
+                    stats['rejected_callback'] += 1
+
+        if stats is not None:
+            stats['callback_time'] += time.perf_counter() - start
+        return items
+
+    def _save_metrics(self, scanned_profiles, elapsed):
+        metrics_file = os.path.join(
+            self.get_package_cache_path(create=True), self.METRICS_FILE)
+        if not self.metrics:
+            try:
+                os.remove(metrics_file)
+            except OSError:
+                pass
+            return
+
+        metrics = OrderedDict()
+        metrics['timestamp'] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        metrics['elapsed'] = elapsed
+        metrics['profiles'] = scanned_profiles
+        try:
+            with open(metrics_file, "w", encoding="utf-8") as fh:
+                json.dump(metrics, fh, indent=2)
+        except Exception as exc:
+            self.warn("Failed to save scan metrics: {}".format(exc))
+
+    def _freeze_items(self, items):
+        frozen = []
+        for item in items:
+            if isinstance(item, keypirinha_api.CatalogItem):
+                item = (int(item.category()), item.label(), item.short_desc(),
+                        item.target(), int(item.args_hint()),
+                        int(item.hit_hint()), item.data_bag())
+            frozen.append(item)
+        return frozen
+
+    def _thaw_items(self, items):
+        # items of a snapshot that has just been loaded from the disk are
+        # tuples, turn them into CatalogItem objects and keep them as such in
+        # the snapshot
+        for idx, item in enumerate(items):
+            if isinstance(item, tuple):
+                items[idx] = self.create_item(
+                    category=item[0],
+                    label=item[1],
+                    short_desc=item[2],
+                    target=item[3],
+                    args_hint=kp.ItemArgsHint(item[4]),
+                    hit_hint=kp.ItemHitHint(item[5]),
+                    data_bag=item[6])
+        return items
+
+    def _snapshot_file(self, profile_name):
+        # profile names may contain characters that are not allowed in a
+        # file name
+        digest = hashlib.sha1(profile_name.encode("utf-8")).hexdigest()
+        return os.path.join(
+            self.get_package_cache_path(create=True),
+            self.SNAPSHOT_FILE_FORMAT.format(digest[0:16]))
+
+    def _load_snapshot(self, profile_name):
+        """
+        Return the snapshot of the last scan of the given profile as a
+        ``(snapshot, cursors)`` tuple.
+        *snapshot* is a dict that maps every path pattern of the profile to the
+        :py:attr:`dirwalk.DirWalker.records` of its last walk. *cursors* is a
+        dict that maps every path pattern to the
+        :py:class:`dirwalk.WalkCursor` of its last walk if it was interrupted.
+        Empty dicts are returned if incremental scanning is disabled and the
+        profile is not watched, if there is no usable snapshot, or if the
+        profile has been modified since then.
+        """
+        if not self._keeps_snapshot(profile_name):
+            return {}, {}
+
+        signature = self.profile_signatures.get(profile_name, None)
+        try:
+            snapshot_signature, snapshot, cursors = \
+                self._snapshots[profile_name]
+        except KeyError:
+            if not self.incremental_scan:
+                return {}, {}
+            data = scancache.load(self._snapshot_file(profile_name),
+                                  self.SNAPSHOT_VERSION)
+            if not data:
+                return {}, {}
+            snapshot_signature, snapshot, cursors = data
+            snapshot = {
+                pattern: {
+                    key: dirwalk.DirRecord._make(record)
+                    for key, record in records.items()}
+                for pattern, records in snapshot.items()}
+            cursors = {
+                pattern: dirwalk.WalkCursor._make(cursor)
+                for pattern, cursor in cursors.items()}
+
+        if snapshot_signature != signature:
+            return {}, {}
+        return snapshot, cursors
+
+    def _save_snapshot(self, profile_name, snapshot, cursors=None):
+        if not self._keeps_snapshot(profile_name):
+            self._snapshots.pop(profile_name, None)
+            return
+
+        if cursors is None:
+            cursors = {}
+        signature = self.profile_signatures.get(profile_name, None)
+        self._snapshots[profile_name] = (signature, snapshot, cursors)
+        if not self.incremental_scan:
+            # watched profile, the snapshot is only kept in memory
+            return
+
+        frozen = {
+            pattern: {
+                key: (record.mtime, record.subdirs,
+                      self._freeze_items(record.items))
+                for key, record in records.items()}
+            for pattern, records in snapshot.items()}
+        frozen_cursors = {
+            pattern: tuple(cursor) for pattern, cursor in cursors.items()}
+        try:
+            scancache.save(self._snapshot_file(profile_name),
+                           self.SNAPSHOT_VERSION,
+                           (signature, frozen, frozen_cursors))
+        except Exception as exc:
+            self.warn("Failed to save scan snapshot of profile {}: {}".format(
+                      profile_name, exc))
+
+    def _keeps_snapshot(self, profile_name):
+        # the snapshot of a watched profile is what makes its rescans cheap
+        if self.incremental_scan:
+            return True
+        profile = self.profiles.get(profile_name, None)
+        return profile is not None and profile.watch
+
+    def _catalog_signature(self):
+        # the committed catalog is only valid for the same set of profiles
+        signature = [str(self.catalog_limit), self.dedup]
+        for profile_name, profile in self.profiles.items():
+            signature.append(profile_name)
+            signature.append(self.profile_signatures.get(profile_name, ""))
+            signature.append("{}/{}/{}".format(
+                profile.weight, profile.quota, profile.priority))
+        return hashlib.sha1("|".join(signature).encode("utf-8")).hexdigest()
+
+    def _load_warm_catalog(self):
+        """
+        Commit the catalog saved by the last scan so that items are available
+        right away, while waiting for the first scan to complete
+        """
+        if not self.warm_start or not self.profiles:
+            return
+
+        start = time.perf_counter()
+        catalog_file = os.path.join(
+            self.get_package_cache_path(create=True), self.CATALOG_FILE)
+        data = scancache.load(catalog_file, self.CATALOG_VERSION)
+        if not data:
+            return
+        signature, catalog = data
+        if signature != self._catalog_signature():
+            return
+
+        self.set_catalog(self._thaw_items(catalog))
+        self._catalog_size = len(catalog)
+        self.info("Loaded {} item{} from previous scan in {:.1f} seconds".format(
+                  len(catalog), "s"[len(catalog)==1:],
+                  time.perf_counter() - start))
+
+    def _save_warm_catalog(self, catalog):
+        catalog_file = os.path.join(
+            self.get_package_cache_path(create=True), self.CATALOG_FILE)
+        if not self.warm_start or not self.profiles:
+            try:
+                os.remove(catalog_file)
+            except OSError:
+                pass
+            return
+
+        try:
+            scancache.save(catalog_file, self.CATALOG_VERSION, (
+                self._catalog_signature(), self._freeze_items(catalog)))
+        except Exception as exc:
+            self.warn("Failed to save catalog: {}".format(exc))
 
     def _read_config(self):
         config_changed = False
         settings = self.load_settings()
         profiles_map = OrderedDict() # profile name -> profile label
         profiles_def = OrderedDict() # profile name -> settings dict
+        profiles_sig = {} # profile name -> signature of its settings
 
         old_profiles = self.profiles
         self.profiles = OrderedDict()
@@ -415,6 +1565,37 @@ class FilesCatalog(kp.Plugin):
         if catalog_limit != self.catalog_limit:
             self.catalog_limit = catalog_limit
             config_changed = True
+        dedup = settings.get_enum(
+            "dedup", section=self.CONFIG_SECTION_MAIN,
+            fallback=self.DEFAULT_DEDUP,
+            enum=["none", "first", "last", "priority"])
+        if dedup != self.dedup:
+            self.dedup = dedup
+            config_changed = True
+        self.incremental_scan = settings.get_bool(
+            "incremental_scan", section=self.CONFIG_SECTION_MAIN,
+            fallback=self.DEFAULT_INCREMENTAL_SCAN)
+        self.metrics = settings.get_bool(
+            "metrics", section=self.CONFIG_SECTION_MAIN,
+            fallback=self.DEFAULT_METRICS)
+        self.network_timeout = settings.get_int(
+            "network_timeout", section=self.CONFIG_SECTION_MAIN,
+            fallback=self.DEFAULT_NETWORK_TIMEOUT, min=0, max=600)
+        self.network_workers = settings.get_int(
+            "network_workers", section=self.CONFIG_SECTION_MAIN,
+            fallback=self.DEFAULT_NETWORK_WORKERS, min=1, max=32)
+        self.scan_workers = settings.get_int(
+            "scan_workers", section=self.CONFIG_SECTION_MAIN,
+            fallback=self.DEFAULT_SCAN_WORKERS, min=1, max=16)
+        self.warm_start = settings.get_bool(
+            "warm_start", section=self.CONFIG_SECTION_MAIN,
+            fallback=self.DEFAULT_WARM_START)
+        self.watch_debounce = settings.get_int(
+            "watch_debounce", section=self.CONFIG_SECTION_MAIN,
+            fallback=self.DEFAULT_WATCH_DEBOUNCE, min=1, max=60)
+        self.watch_poll_interval = settings.get_int(
+            "watch_poll_interval", section=self.CONFIG_SECTION_MAIN,
+            fallback=self.DEFAULT_WATCH_POLL_INTERVAL, min=5, max=3600)
 
         # Ideally, changing these settings shouldn't trigger recatalogging.
         # However, this seems to be necessary due to the way that filter
@@ -556,6 +1737,29 @@ class FilesCatalog(kp.Plugin):
             elif profdef['max_depth'] < -1:
                 profdef['max_depth'] = -1
 
+            # weight
+            profdef['weight'] = self._read_profile_setting(
+                profiles_map, profiles_def, settings,
+                profile_name, "get_int", "weight", fallback=1,
+                min=1, max=1000)
+
+            # quota
+            profdef['quota'] = self._read_profile_setting(
+                profiles_map, profiles_def, settings,
+                profile_name, "get_int", "quota", fallback=0,
+                min=0, max=300_000)
+
+            # priority
+            profdef['priority'] = self._read_profile_setting(
+                profiles_map, profiles_def, settings,
+                profile_name, "get_int", "priority", fallback=0,
+                min=-1000, max=1000)
+
+            # watch
+            profdef['watch'] = self._read_profile_setting(
+                profiles_map, profiles_def, settings,
+                profile_name, "get_bool", "watch", fallback=False)
+
             # include_hidden
             profdef['include_hidden'] = self._read_profile_setting(
                 profiles_map, profiles_def, settings,
@@ -607,8 +1811,7 @@ class FilesCatalog(kp.Plugin):
                         profdef[key] = None
 
                 if profdef[key]:
-                    invalid_tags = \
-                        LazyItemLabelFormatter.list_invalid_tags(profdef[key])
+                    invalid_tags = ItemTemplate.list_invalid_tags(profdef[key])
                     if invalid_tags:
                         self.warn((
                             "Invalid tag(s) found in {}: {}. " +
@@ -616,18 +1819,30 @@ class FilesCatalog(kp.Plugin):
                             section_name, ", ".join(invalid_tags)))
                         profdef[key] = None
 
+            # parse templates once and for all
+            template_constants = {
+                "package": self.package_full_name(),
+                "profile": profdef['label']}
+            for key in ("file_item_label", "file_item_desc",
+                        "dir_item_label", "dir_item_desc"):
+                if profdef[key]:
+                    profdef[key] = ItemTemplate(profdef[key],
+                                                template_constants)
+
             # filters
             filters = self._read_profile_setting(
                 profiles_map, profiles_def, settings,
                 profile_name, "get_multiline", "filters", fallback=[],
                 keep_empty_lines=False)
             profdef['filters'] = []
+            filter_exprs = []
             for expression in filters:
                 if not expression:
                     continue
                 try:
                     profdef['filters'].append(
                         filefilter.create_filter(expression))
+                    filter_exprs.append(expression)
                 except ValueError as exc:
                     self.warn((
                         'Ignoring invalid filter "{}" from "{}". ' +
@@ -655,6 +1870,7 @@ class FilesCatalog(kp.Plugin):
                 count = 0
                 while profdef['filters'] and not profdef['filters'][-1].inclusive:
                     profdef['filters'].pop()
+                    filter_exprs.pop()
                     count += 1
                 if count:
                     self.warn((
@@ -664,6 +1880,12 @@ class FilesCatalog(kp.Plugin):
 
             profdef['filters'] = tuple(profdef['filters']) # memory usage
 
+            # filters - compile them into a single decision engine so that
+            # they do not have to be tested one by one for every scanned entry
+            profdef['filter_engine'] = filterengine.FilterEngine(
+                tuple(zip(filter_exprs, profdef['filters'])),
+                profdef['filters_default'])
+
             # trim_extensions
             # note: we do not use PATHEXT as a default because user may need to
             # differentiate between an exe file and a script with the same name
@@ -715,6 +1937,9 @@ class FilesCatalog(kp.Plugin):
             if not profdef['callback']:
                 profdef['callback'] = default_scan_callback
 
+            profiles_sig[profile_name] = self._profile_signature(
+                profdef, filters)
+
         # create profile objects...
         # ... now that we have roughly validated the settings
         self.profiles = OrderedDict()
@@ -723,6 +1948,9 @@ class FilesCatalog(kp.Plugin):
                 del profile_def['enabled']
                 del profile_def['inherit']
                 self.profiles[profile_name] = ScanProfile(**profile_def)
+        self.profile_signatures = {
+            name: sig for name, sig in profiles_sig.items()
+            if name in self.profiles}
 
         # print profiles settings
         if self.config_debug and self.profiles:
@@ -752,6 +1980,25 @@ class FilesCatalog(kp.Plugin):
 
         return fallback
 
+    def _profile_signature(self, profdef, filters):
+        # a digest of every setting that may have an impact on the items
+        # produced by the scan of a profile, so that the snapshot of a previous
+        # scan is not reused if the profile has been modified since then
+        callback = profdef['callback']
+        callback_code = getattr(callback, "__code__", None)
+        fields = (
+            profdef['label'], profdef['paths'], profdef['max_depth'],
+            profdef['include_hidden'], profdef['include_dirs'],
+            profdef['include_files'],
+            tuple(filters), sorted(profdef['trim_extensions']),
+            profdef['file_item_label'], profdef['file_item_desc'],
+            profdef['dir_item_label'], profdef['dir_item_desc'],
+            profdef['open_with'],
+            getattr(callback, "__module__", None),
+            getattr(callback, "__qualname__", None),
+            callback_code.co_code if callback_code else None)
+        return hashlib.sha1(repr(fields).encode("utf-8")).hexdigest()
+
     def _print_profiles(self):
         indent = 3
         max_key_len = len(max(("internal_name", ) + ScanProfile._fields,
@@ -783,7 +2030,8 @@ class FilesCatalog(kp.Plugin):
 
             profile_dict = profile._asdict()
             for key in ("include_hidden", "include_dirs", "include_files",
-                        "max_depth", "trim_extensions",
+                        "max_depth", "weight", "quota", "priority",
+                        "watch", "trim_extensions",
                         "file_item_label", "file_item_desc",
                         "dir_item_label", "dir_item_desc",
                         "callback"):
@@ -12,6 +12,13 @@
 # filesystem entry from the scan loop so you probably want to keep it as
 # lightweight as possible in terms of speed and I/O access.
 #
+# A callback can also be called with a list of entries of the same directory
+# instead, in which case it must return a list of items. This allows to pay the
+# cost of any setup work (attribute lookups, compiled regexes, loading external
+# metadata, ...) once per list instead of once per entry.
+# To opt in, set the *batch* attribute of the function to True (see the second
+# example at the end of this file).
+#
 # For convenience, right after the import statement of this module,
 # filescatalog.py monkey-patches this module to declare the following variables
 # so you have access to some filescatalog's tools that may come handy during the
@@ -21,9 +28,16 @@
 #   * _TEMPLATE_TAG_SEP: filescatalog's *TEMPLATE_TAG_SEP* constant
 #   * _TEMPLATE_TAG_REGEX: filescatalog's *TEMPLATE_TAG_REGEX* constant
 #   * _LazyItemLabelFormatter: filescatalog's *LazyItemLabelFormatter* class
+#   * _ItemTemplate: filescatalog's *ItemTemplate* class. The *file_item_label*,
+#       *file_item_desc*, *dir_item_label* and *dir_item_desc* values of a
+#       profile are already parsed *ItemTemplate* objects (a str subclass), so
+#       calling their render(entry, profile, plugin, fallback="") method is
+#       faster than going through *_LazyItemLabelFormatter*
 #   * _default_scan_callback: filescatalog's own callback named
 #       *default_scan_callback* that you may want to call from your function as
 #       a fallback method for example
+#   * _default_batch_scan_callback: the batch version of
+#       *_default_scan_callback*, named *default_batch_scan_callback*
 #
 # Because those variables are not defined yet at import time, it is possible to
 # implement a ``on_imported()`` function that will be called right after this
@@ -38,8 +52,16 @@
 #
 #def my_callback(entry, profile, plugin):
 #    """
-#    *entry* is a `_globex.GlobExEntry` object, which is an improved version of
-#    `os.DirEntry`.
+#    *entry* is a filesystem entry, whichever walker found it. A callback can
+#    rely on the following attributes and methods only:
+#      * name: the name of the entry
+#      * path: the full path of the entry (os.fspath(entry) returns it too)
+#      * depth: the level of the directory of the entry below the base
+#        directory of the scanned path (0 for its direct content)
+#      * is_dir(), is_file() and is_symlink(), like `os.DirEntry`'s
+#      * stat(), like `os.DirEntry`'s
+#      * attributes(): the Windows file attributes of the entry
+#      * is_hidden() and is_system()
 #
 #    *profile* is a `namedtuple` defined in :file:`filescatalog.py` as
 #    ``ScanProfile``.
@@ -54,12 +76,13 @@
 #    if not profile.include_files and not entry.is_dir():
 #        return None
 #
-#    include = profile.filters_default
-#    for filter in profile.filters:
-#        if filter.match(entry):
-#            include = filter.inclusive
-#            break
-#    if not include:
+#    # profile.filters compiled into a single matcher, it is equivalent to:
+#    #   include = profile.filters_default
+#    #   for filter in profile.filters:
+#    #       if filter.match(entry):
+#    #           include = filter.inclusive
+#    #           break
+#    if not profile.filter_engine.decide(entry):
 #        return None
 #
 #    if entry.is_dir():
@@ -69,9 +92,12 @@
 #        item_label_tmpl = profile.file_item_label
 #        item_desc_tmpl = profile.file_item_desc
 #
-#    formatter = _LazyItemLabelFormatter(entry, profile, plugin)
-#    item_label = formatter.format(item_label_tmpl, fallback=entry.name)
-#    item_desc = formatter.format(item_desc_tmpl, fallback="")
+#    item_label = item_label_tmpl.render(entry, profile, plugin,
+#                                        fallback=entry.name)
+#    if item_desc_tmpl:
+#        item_desc = item_desc_tmpl.render(entry, profile, plugin)
+#    else:
+#        item_desc = ""
 #
 #    return plugin.create_item(
 #        category=kp.ItemCategory.FILE,
@@ -80,3 +106,29 @@
 #        target=entry.path,
 #        args_hint=kp.ItemArgsHint.ACCEPTED,
 #        hit_hint=kp.ItemHitHint.KEEPALL)
+#
+# And here is the batch version of the same callback. Note the *batch*
+# attribute that must be set on the function:
+#
+#def my_batch_callback(entries, profile, plugin):
+#    """
+#    *entries* is a list of entries located in the same directory, with the
+#    same attributes as the *entry* of the callback above. The content of a
+#    directory may come in several lists.
+#    A list of `CatalogItem` objects must be returned.
+#    """
+#    items = []
+#    for entry in entries:
+#        if entry.is_dir() or not profile.filter_engine.decide(entry):
+#            continue
+#        items.append(plugin.create_item(
+#            category=kp.ItemCategory.FILE,
+#            label=profile.file_item_label.render(entry, profile, plugin,
+#                                                 fallback=entry.name),
+#            short_desc="",
+#            target=entry.path,
+#            args_hint=kp.ItemArgsHint.ACCEPTED,
+#            hit_hint=kp.ItemHitHint.KEEPALL))
+#    return items
+#
+#my_batch_callback.batch = True
@@ -0,0 +1,394 @@
+# Keypirinha: a fast launcher for Windows (keypirinha.com)
+
+from collections import namedtuple, deque
+import fnmatch
+import os
+import re
+import stat
+import time
+
+from . import fsaccess
+
+FILE_ATTRIBUTE_HIDDEN = getattr(stat, "FILE_ATTRIBUTE_HIDDEN", 0x2)
+FILE_ATTRIBUTE_SYSTEM = getattr(stat, "FILE_ATTRIBUTE_SYSTEM", 0x4)
+
+RECURSIVE_SEGMENT = "**"
+
+# how many directories to visit between two calls to *should_terminate*
+TERMINATION_CHECK_INTERVAL = 32
+
+# The snapshot of a scanned directory.
+# * mtime: the modification time (ns) of the directory at scan time
+# * subdirs: a tuple of (name, states) pairs, one for each sub-directory to
+#   walk into
+# * items: the list of the items produced from the direct content of the
+#   directory
+DirRecord = namedtuple("DirRecord", ("mtime", "subdirs", "items"))
+
+# The state of an interrupted walk, to resume it later on.
+# * visited: a tuple of (key, depth) pairs, one for each visited directory, in
+#   the order of the visit. *key* is the key of its record in the snapshot.
+# * queue: a tuple of (dir_path, depth, states) tuples, one for each directory
+#   that remains to be visited
+WalkCursor = namedtuple("WalkCursor", ("visited", "queue"))
+
+def has_magic(s):
+    return any(c in s for c in "*?[")
+
+def split_pattern(pattern):
+    """
+    Split *pattern* into a non-magic base directory and the tuple of the
+    remaining path segments.
+    The last segment of *pattern* is always part of the returned segments, even
+    if it does not contain any wildcard.
+    """
+    drive, tail = os.path.splitdrive(pattern)
+    parts = [p for p in re.split(r"[\\/]+", tail) if p]
+    if not parts:
+        raise ValueError("empty pattern: " + pattern)
+
+    idx = 0
+    while idx < len(parts) - 1 and not has_magic(parts[idx]):
+        idx += 1
+
+    base = drive + os.sep + os.sep.join(parts[0:idx])
+    return base, tuple(parts[idx:])
+
+def _attributes(direntry):
+    try:
+        return direntry.stat(follow_symlinks=False).st_file_attributes
+    except AttributeError:
+        # not on Windows
+        return FILE_ATTRIBUTE_HIDDEN if direntry.name[0] == "." else 0
+
+class DirNode:
+    """
+    A directory which content has been scanned, shared by all its entries.
+
+    The parent nodes are created on demand, and only once, so the nodes of a
+    walk form a tree that mirrors the walked directories. The path-derived
+    values the item templates need (e.g. the ``{2dirs}`` tag) are computed from
+    it instead of splitting the path of every entry, and the strings are shared
+    by all the items of a directory.
+
+    The parent of a root directory (e.g. ``C:\\``) is the directory itself,
+    like :py:func:`os.path.dirname` does.
+    """
+    __slots__ = ("path", "name", "_parent", "_two_dirs", "_three_dirs")
+
+    def __init__(self, path, parent=None, name=None):
+        self.path = path
+        self.name = os.path.basename(path) if name is None else name
+        self._parent = parent
+        self._two_dirs = None
+        self._three_dirs = None
+
+    def __repr__(self):
+        return "<{} {!r}>".format(self.__class__.__name__, self.path)
+
+    @property
+    def parent(self):
+        if self._parent is None:
+            parent_path = os.path.dirname(self.path)
+            if parent_path == self.path:
+                self._parent = self
+            else:
+                self._parent = DirNode(parent_path)
+        return self._parent
+
+    @property
+    def two_dirs(self):
+        """The names of the parent directory and of this one"""
+        if self._two_dirs is None:
+            self._two_dirs = os.path.join(self.parent.name, self.name)
+        return self._two_dirs
+
+    @property
+    def three_dirs(self):
+        """The names of the two parent directories and of this one"""
+        if self._three_dirs is None:
+            parent = self.parent
+            self._three_dirs = os.path.join(
+                parent.parent.name, parent.name, self.name)
+        return self._three_dirs
+
+class WalkEntry:
+    """
+    A thin wrapper around :py:class:`os.DirEntry` that offers the same
+    interface than ``globex.GlobExEntry`` so that scan callbacks and filters do
+    not need to know which walker produced the entry.
+
+    *dir_node* is the :py:class:`DirNode` of the directory of the entry.
+    """
+    __slots__ = ("_entry", "depth", "dir_node")
+
+    def __init__(self, direntry, depth, dir_node=None):
+        self._entry = direntry
+        self.depth = depth
+        self.dir_node = dir_node
+
+    def __getattr__(self, attr):
+        return getattr(self._entry, attr)
+
+    def __fspath__(self):
+        return self._entry.path
+
+    def __repr__(self):
+        return "<{} {!r}>".format(self.__class__.__name__, self._entry.path)
+
+    @property
+    def name(self):
+        return self._entry.name
+
+    @property
+    def path(self):
+        return self._entry.path
+
+    def is_dir(self, *, follow_symlinks=True):
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, *, follow_symlinks=True):
+        return self._entry.is_file(follow_symlinks=follow_symlinks)
+
+    def is_symlink(self):
+        return self._entry.is_symlink()
+
+    def stat(self, *, follow_symlinks=True):
+        return self._entry.stat(follow_symlinks=follow_symlinks)
+
+    def inode(self):
+        return self._entry.inode()
+
+    def attributes(self):
+        return _attributes(self._entry)
+
+    def is_hidden(self):
+        return bool(self.attributes() & FILE_ATTRIBUTE_HIDDEN)
+
+    def is_system(self):
+        return bool(self.attributes() & FILE_ATTRIBUTE_SYSTEM)
+
+class DirWalker:
+    """
+    Walk the filesystem breadth-first according to a glob-like *pattern*.
+
+    The ``**`` segment matches zero or more directories, up to *max_depth*
+    levels below the base directory of the pattern (-1 for no limit).
+
+    If *snapshot* is given, it must be the :py:attr:`records` dict of a previous
+    walk of the same pattern. The content of the directories which modification
+    time did not change since then is not read again, and their items are
+    reused as-is instead. Note that only the sub-directories themselves are
+    still visited since the modification time of a directory does not change
+    when the content of one of its sub-directories does.
+
+    If *prune* is given, it is called with the path of every sub-directory the
+    walker is about to walk into, and must return ``True`` to prevent it, in
+    which case none of its descendants is visited. The sub-directory itself is
+    still passed to *process* if it matches the pattern.
+
+    If *should_terminate* is given, it is called every
+    :py:data:`TERMINATION_CHECK_INTERVAL` directories and must return ``True``
+    to interrupt the walk, in which case :py:attr:`cancelled` is set and
+    :py:meth:`cursor` tells where to resume from.
+
+    If *cursor* is given, it must be the :py:meth:`cursor` of an interrupted
+    walk of the same pattern, and *snapshot* the :py:attr:`records` of that
+    walk (or a superset of them). The directories visited by the interrupted
+    walk are then not visited again, their items are yielded from *snapshot*
+    before the walk goes on where it stopped. The cursor is ignored if
+    *snapshot* lacks the record of any of those directories.
+
+    The filesystem is read through *fs*, a :py:class:`fsaccess.FileSystem`
+    object. The :py:exc:`fsaccess.PathTimeoutError` exceptions it may raise are
+    propagated, in which case the walk cannot be continued.
+    """
+
+    def __init__(self, pattern, max_depth=-1, include_hidden=False,
+                 snapshot=None, prune=None, should_terminate=None,
+                 cursor=None, fs=None):
+        self.pattern = pattern
+        self.base, self.segments = split_pattern(pattern)
+        self.max_depth = max_depth
+        self.include_hidden = include_hidden
+        self.snapshot = snapshot if snapshot else {}
+        self.prune = prune
+        self.should_terminate = should_terminate
+        self.fs = fs if fs is not None else fsaccess.FileSystem()
+        self.resume_cursor = None
+        if cursor is not None and all(
+                key in self.snapshot for key, _ in cursor.visited):
+            self.resume_cursor = cursor
+        self.cancelled = False
+        self.records = {}
+        self.skipped_dirs = 0
+        self.scanned_dirs = 0
+        self.pruned_dirs = 0
+        self.hidden_entries = 0 # entries ignored because of include_hidden
+        self.yielded_entries = 0 # entries passed to *process*
+        self.deepest_level = -1
+        self.fs_time = 0.0 # time spent reading the filesystem
+
+        self._visited = [] # (key, depth) of the visited directories
+        self._queue = deque()
+        self._nodes = {} # path -> DirNode of the queued directories
+
+        self._matchers = []
+        for seg in self.segments:
+            if seg == RECURSIVE_SEGMENT:
+                self._matchers.append(None)
+            elif has_magic(seg):
+                self._matchers.append(re.compile(
+                    fnmatch.translate(os.path.normcase(seg))).match)
+            else:
+                self._matchers.append(os.path.normcase(seg).__eq__)
+
+    def walk(self, process):
+        """
+        Walk the filesystem and yield one ``(depth, items)`` tuple per visited
+        directory, where *depth* is the level of the directory below the base
+        directory of the pattern. Directories come in breadth-first order so
+        that *depth* never decreases.
+
+        *process* is called with the list of the :py:class:`WalkEntry` objects
+        that matched the pattern in a given directory, and must return the list
+        of items produced from them. It is not called for the directories which
+        content is reused from the snapshot.
+        """
+        queue = self._queue
+        if self.resume_cursor is not None:
+            for key, depth in self.resume_cursor.visited:
+                record = self.snapshot[key]
+                self.skipped_dirs += 1
+                self._visited.append((key, depth))
+                self.records[key] = record
+                if record.items:
+                    yield depth, record.items
+            queue.extend(self.resume_cursor.queue)
+        else:
+            queue.append((self.base, 0, self._closure((0, ))))
+
+        countdown = TERMINATION_CHECK_INTERVAL
+        while queue:
+            if self.should_terminate is not None:
+                countdown -= 1
+                if countdown <= 0:
+                    countdown = TERMINATION_CHECK_INTERVAL
+                    if self.should_terminate():
+                        self.cancelled = True
+                        return
+
+            dir_path, depth, states = queue.popleft()
+            node = self._nodes.pop(dir_path, None)
+            if node is None:
+                node = DirNode(dir_path)
+            record = self._visit(dir_path, depth, states, node, process)
+            if record is None:
+                continue
+
+            if record.items:
+                yield depth, record.items
+
+            for name, sub_states in record.subdirs:
+                sub_path = os.path.join(dir_path, name)
+                self._nodes[sub_path] = DirNode(sub_path, node, name)
+                queue.append((sub_path, depth + 1, sub_states))
+
+    def cursor(self):
+        """
+        Return a :py:class:`WalkCursor` to resume the walk from its current
+        state. Note that the resumed walk yields again the items of all the
+        directories visited so far, including the ones that have not been
+        consumed yet.
+        """
+        return WalkCursor(tuple(self._visited), tuple(self._queue))
+
+    def _visit(self, dir_path, depth, states, node, process):
+        start = time.perf_counter()
+        key = (os.path.normcase(dir_path), states)
+        try:
+            mtime = self.fs.stat(dir_path).st_mtime_ns
+        except OSError:
+            self.fs_time += time.perf_counter() - start
+            return None
+
+        record = self.snapshot.get(key, None)
+        if record is not None and record.mtime == mtime:
+            self.skipped_dirs += 1
+            self.fs_time += time.perf_counter() - start
+        else:
+            try:
+                direntries = self.fs.scandir(dir_path)
+            except OSError:
+                self.fs_time += time.perf_counter() - start
+                return None
+
+            matched, subdirs = self._match(direntries, depth, states, node)
+            self.fs_time += time.perf_counter() - start
+            self.yielded_entries += len(matched)
+            record = DirRecord(mtime, tuple(subdirs),
+                               process(matched) if matched else [])
+            self.scanned_dirs += 1
+
+        if depth > self.deepest_level:
+            self.deepest_level = depth
+        self.records[key] = record
+        self._visited.append((key, depth))
+        return record
+
+    def _match(self, direntries, depth, states, node):
+        last_idx = len(self.segments) - 1
+        can_recurse = self.max_depth < 0 or depth + 1 <= self.max_depth
+        matched = []
+        subdirs = []
+
+        for direntry in direntries:
+            if (not self.include_hidden and
+                    _attributes(direntry) & FILE_ATTRIBUTE_HIDDEN):
+                self.hidden_entries += 1
+                continue
+            try:
+                is_dir = direntry.is_dir()
+            except OSError:
+                is_dir = False
+
+            norm_name = None
+            is_match = False
+            next_states = set()
+            for idx in states:
+                matcher = self._matchers[idx]
+                if matcher is None: # "**" segment
+                    if idx == last_idx:
+                        is_match = True
+                    if is_dir and can_recurse:
+                        next_states.add(idx)
+                else:
+                    if norm_name is None:
+                        norm_name = os.path.normcase(direntry.name)
+                    if matcher(norm_name):
+                        if idx == last_idx:
+                            is_match = True
+                        elif is_dir:
+                            next_states.add(idx + 1)
+
+            if is_match:
+                matched.append(WalkEntry(direntry, depth, node))
+            if next_states:
+                if self.prune is not None and self.prune(direntry.path):
+                    self.pruned_dirs += 1
+                else:
+                    subdirs.append((direntry.name, self._closure(next_states)))
+
+        return matched, subdirs
+
+    def _closure(self, states):
+        # a "**" segment may match zero directory so the segment that follows
+        # it must be tried as well
+        closed = set()
+        for idx in states:
+            closed.add(idx)
+            while (self._matchers[idx] is None and
+                    idx + 1 < len(self._matchers)):
+                idx += 1
+                closed.add(idx)
+        return tuple(sorted(closed))
@@ -0,0 +1,235 @@
+# Keypirinha: a fast launcher for Windows (keypirinha.com)
+
+import os
+import sys
+import threading
+import time
+
+from . import fsaccess
+
+FILE_NOTIFY_CHANGE_FILE_NAME = 0x1
+FILE_NOTIFY_CHANGE_DIR_NAME = 0x2
+INVALID_HANDLE_VALUE = (1 << 64) - 1 if sys.maxsize > 2 ** 32 else (1 << 32) - 1
+MAXIMUM_WAIT_OBJECTS = 64
+WAIT_OBJECT_0 = 0x0
+
+# how long to wait for a notification before checking whether the watcher
+# must stop
+_WAIT_SLICE = 0.5
+
+def _kernel32():
+    # return the kernel32 functions used by the native watcher, or None if not
+    # available (i.e. not on Windows)
+    if os.name != "nt":
+        return None
+    try:
+        import ctypes
+        from ctypes import wintypes
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        kernel32.FindFirstChangeNotificationW.argtypes = (
+            wintypes.LPCWSTR, wintypes.BOOL, wintypes.DWORD)
+        kernel32.FindFirstChangeNotificationW.restype = wintypes.HANDLE
+        kernel32.FindNextChangeNotification.argtypes = (wintypes.HANDLE, )
+        kernel32.FindNextChangeNotification.restype = wintypes.BOOL
+        kernel32.FindCloseChangeNotification.argtypes = (wintypes.HANDLE, )
+        kernel32.FindCloseChangeNotification.restype = wintypes.BOOL
+        kernel32.WaitForMultipleObjects.argtypes = (
+            wintypes.DWORD, ctypes.POINTER(wintypes.HANDLE), wintypes.BOOL,
+            wintypes.DWORD)
+        kernel32.WaitForMultipleObjects.restype = wintypes.DWORD
+        return kernel32
+    except Exception:
+        return None
+
+class DirWatcher:
+    """
+    Watch directory trees from a background thread and report the ones that
+    have changed.
+
+    *roots* is a sequence of ``(key, dir_path, recursive)`` tuples.
+    *on_change* is called from the thread of the watcher with the set of the
+    keys which directory has changed. Notifications are debounced: the
+    callback is called once no new notification came for *debounce* seconds,
+    or *debounce* times 5 seconds after the first pending notification at the
+    latest, so that a file being written continuously does not postpone it
+    forever.
+
+    On Windows, the directories are watched with the
+    ``FindFirstChangeNotification`` API (file and directory creation, deletion
+    and renaming). Otherwise, or if a directory cannot be watched this way
+    (e.g. too many directories, unsupported remote filesystem), it is polled
+    every *poll_interval* seconds: its key is reported only if the modification
+    time of the directory, or of one of its sub-directories if *recursive* is
+    true, has changed since the previous poll (see :py:class:`PolledTree`).
+
+    *filesystem* is called with the path of a polled directory and must return
+    the :py:class:`fsaccess.FileSystem` object to read it with.
+    """
+
+    def __init__(self, roots, on_change, debounce=2.0, poll_interval=60.0,
+                 filesystem=None):
+        self.roots = tuple(roots)
+        self.on_change = on_change
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        if filesystem is None:
+            default_fs = fsaccess.FileSystem()
+            filesystem = lambda path: default_fs
+        self.filesystem = filesystem
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="FilesCatalogWatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=False):
+        self._stop_event.set()
+        if wait and self._thread is not None:
+            self._thread.join()
+
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def _run(self):
+        kernel32 = _kernel32()
+        handles = [] # native handles, in the same order as handle_keys
+        handle_keys = []
+        polled = [] # (key, PolledTree) tuples
+
+        for key, dir_path, recursive in self.roots:
+            handle = None
+            if kernel32 is not None and len(handles) < MAXIMUM_WAIT_OBJECTS:
+                handle = kernel32.FindFirstChangeNotificationW(
+                    dir_path, bool(recursive),
+                    FILE_NOTIFY_CHANGE_FILE_NAME |
+                    FILE_NOTIFY_CHANGE_DIR_NAME)
+                if not handle or handle == INVALID_HANDLE_VALUE:
+                    handle = None
+            if handle is None:
+                tree = PolledTree(
+                    dir_path, recursive, self.filesystem(dir_path))
+                tree.poll()
+                polled.append((key, tree))
+            else:
+                handles.append(handle)
+                handle_keys.append(key)
+
+        try:
+            self._loop(kernel32, handles, handle_keys, polled)
+        finally:
+            for handle in handles:
+                kernel32.FindCloseChangeNotification(handle)
+
+    def _loop(self, kernel32, handles, handle_keys, polled):
+        pending = set()
+        first_change = None
+        last_change = None
+        next_poll = time.monotonic() + self.poll_interval
+
+        if handles:
+            from ctypes import wintypes
+            handles_array = (wintypes.HANDLE * len(handles))(*handles)
+
+        while not self._stop_event.is_set():
+            changed = set()
+            if handles:
+                res = kernel32.WaitForMultipleObjects(
+                    len(handles), handles_array, False,
+                    int(_WAIT_SLICE * 1000))
+                if WAIT_OBJECT_0 <= res < WAIT_OBJECT_0 + len(handles):
+                    idx = res - WAIT_OBJECT_0
+                    changed.add(handle_keys[idx])
+                    kernel32.FindNextChangeNotification(handles[idx])
+            else:
+                self._stop_event.wait(_WAIT_SLICE)
+
+            now = time.monotonic()
+            if polled and now >= next_poll:
+                for key, tree in polled:
+                    if key not in pending and tree.poll():
+                        changed.add(key)
+                    if self._stop_event.is_set():
+                        return
+                now = time.monotonic()
+                next_poll = now + self.poll_interval
+
+            if changed:
+                pending |= changed
+                last_change = now
+                if first_change is None:
+                    first_change = now
+
+            if pending and (now - last_change >= self.debounce or
+                            now - first_change >= self.debounce * 5):
+                keys = pending
+                pending = set()
+                first_change = None
+                if self._stop_event.is_set():
+                    break
+                try:
+                    self.on_change(keys)
+                except Exception:
+                    import traceback
+                    traceback.print_exc()
+
+class PolledTree:
+    """
+    The modification times of a directory and, if *recursive* is true, of all
+    its sub-directories, read through *fs* (a :py:class:`fsaccess.FileSystem`
+    object).
+
+    A directory which modification time has not changed still has the same
+    sub-directories, so a poll only lists the directories that have changed
+    and costs one ``stat()`` call per directory otherwise.
+    """
+
+    def __init__(self, dir_path, recursive, fs):
+        self.dir_path = dir_path
+        self.recursive = recursive
+        self.fs = fs
+        self.dirs = None # path -> (mtime, sub-directories paths)
+
+    def poll(self):
+        """
+        Read the modification times again and return ``True`` if any of them
+        has changed, or if a directory has been created or removed, since the
+        previous call. The first call only records them and returns ``False``.
+        A directory that does not respond in time is considered unchanged.
+        """
+        old_dirs = self.dirs if self.dirs is not None else {}
+        dirs = {}
+        changed = False
+        stack = [self.dir_path]
+        while stack:
+            dir_path = stack.pop()
+            old = old_dirs.get(dir_path, None)
+            try:
+                mtime = self.fs.stat(dir_path).st_mtime_ns
+                if old is not None and old[0] == mtime:
+                    subdirs = old[1]
+                elif self.recursive:
+                    subdirs = tuple(
+                        direntry.path for direntry in self.fs.scandir(dir_path)
+                        if direntry.is_dir(follow_symlinks=False))
+                    changed = True
+                else:
+                    subdirs = ()
+                    changed = True
+            except fsaccess.PathTimeoutError:
+                if old is None:
+                    continue
+                mtime, subdirs = old
+            except OSError:
+                continue
+            dirs[dir_path] = (mtime, subdirs)
+            stack.extend(subdirs)
+
+        if self.dirs is None:
+            changed = False
+        elif len(dirs) != len(old_dirs):
+            # a directory has been removed
+            changed = True
+        self.dirs = dirs
+        return changed
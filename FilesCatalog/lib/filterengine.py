@@ -0,0 +1,367 @@
+# Keypirinha: a fast launcher for Windows (keypirinha.com)
+
+import os
+import re
+
+_PROPERTY_REGEX = re.compile(
+    r"(?P<name>ext|regex|nodrive|case|attr_all|attr)\s*:\s*", re.IGNORECASE)
+_EXT_SPLIT_REGEX = re.compile(r"[\s;]+")
+
+# the subjects a compiled regex can be matched against
+_SUBJECT_PATH = 0
+_SUBJECT_NODRIVE = 1
+
+# the name of the fake entries filters are tested against to confirm pruning
+# or merging
+_PROBE_NAME = "__filterengine_probe__"
+
+def _translate_glob(pattern, anchor_end=True):
+    """
+    Translate a shell-like *pattern* into a regular expression that matches the
+    tail of a path, as described in the documentation of the *filters* setting.
+    Unlike :py:func:`fnmatch.translate`, path separators are matched regardless
+    of their flavor. Character classes (``[...]``) are not supported, the
+    filters that use them are not compiled.
+    If *anchor_end* is false, the regex matches any path that starts with a
+    matching tail.
+    """
+    res = []
+    for c in pattern:
+        if c == "*":
+            if not res or res[-1] != r"[\s\S]*":
+                res.append(r"[\s\S]*")
+        elif c == "?":
+            res.append(r"[\s\S]")
+        elif c in "\\/":
+            res.append(r"[\\/]")
+        else:
+            res.append(re.escape(c))
+
+    if pattern[0] in "\\/*":
+        prefix = r"[\s\S]*" if pattern[0] != "*" else ""
+    else:
+        prefix = r"(?:[\s\S]*[\\/])?"
+    return prefix + "".join(res) + (r"\Z" if anchor_end else "")
+
+def _translate_glob_reversed(pattern):
+    """
+    Same as :py:func:`_translate_glob` but the returned regex matches the
+    *reversed* path from its beginning.
+    All the filters are anchored to the end of the path, so this allows the
+    alternatives of a merged regex to fail on the first characters of the path
+    instead of having to backtrack over the whole of it.
+    """
+    res = []
+    for c in reversed(pattern):
+        if c == "*":
+            if not res or res[-1] != r"[\s\S]*":
+                res.append(r"[\s\S]*")
+        elif c == "?":
+            res.append(r"[\s\S]")
+        elif c in "\\/":
+            res.append(r"[\\/]")
+        else:
+            res.append(re.escape(c))
+
+    if pattern[0] not in "\\/*":
+        # the pattern matches the whole path or a tail that follows a
+        # separator
+        res.append(r"(?:[\\/]|\Z)")
+    return "".join(res)
+
+def parse_expression(expression):
+    """
+    Parse a filter *expression* and return a ``(inclusive, properties, body)``
+    tuple, where *properties* is a set of lower-case property names.
+    """
+    expr = expression.strip()
+    inclusive = True
+    if expr[0:1] in ("+", "-"):
+        inclusive = expr[0] == "+"
+        expr = expr[1:].lstrip()
+
+    properties = set()
+    while True:
+        rem = _PROPERTY_REGEX.match(expr)
+        if not rem:
+            break
+        properties.add(rem.group("name").lower())
+        expr = expr[rem.end():]
+
+    return inclusive, properties, expr
+
+class _ProbeEntry:
+    """
+    A fake file entry, to test a filter against a path that does not exist.
+    It offers the part of the ``globex.GlobExEntry`` interface a path filter
+    needs.
+    """
+    __slots__ = ("path", "name")
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+
+    def __fspath__(self):
+        return self.path
+
+    def is_dir(self, follow_symlinks=True):
+        return False
+
+    def is_file(self, follow_symlinks=True):
+        return True
+
+    def is_symlink(self):
+        return False
+
+    def is_hidden(self):
+        return False
+
+class FilterEngine:
+    """
+    Compile an ordered list of filters into a single decision engine.
+
+    *filters* is a sequence of ``(expression, filter)`` pairs where *filter* is
+    the ``filefilter`` object created from *expression*. *default* is the
+    decision to return when an entry matches none of them.
+
+    As with the sequential evaluation of the filters, the first filter that
+    matches an entry wins. The engine just finds it faster:
+
+    * plain shell-like patterns (no property, no ``[...]`` character class) are
+      merged into one alternation regex, which alternatives are tried in order
+      so that the first successful one is the lowest matching filter. The
+      regex is matched against the reversed path (see
+      :py:func:`_translate_glob_reversed`). A pattern is only merged if its
+      original object takes the same decisions as its translation on a set of
+      probe paths (see :py:meth:`_confirm_glob`).
+    * ``ext:`` filters which extensions have a single dot are merged into a
+      dict that maps each extension to the lowest filter that lists it
+    * the other filters (``regex:``, ``attr:``, ``nodrive:``, ``case:``, ...)
+      are evaluated one by one with their original object, but only if they
+      come before the best match found so far
+
+    Only the filters which semantics are known to be the same as their original
+    object's are merged, anything else is left to the original object.
+
+    The engine also finds out which directories do not need to be walked into
+    at all (see :py:meth:`prunes`).
+    """
+
+    # where the probe paths of _confirm_glob() are located
+    _PROBE_DIR = os.path.join(os.path.abspath(os.sep), _PROBE_NAME)
+
+    def __init__(self, filters, default):
+        self.expressions = tuple(expr for expr, _ in filters)
+        self.default = default
+
+        self._inclusive = []
+        self._regex = None
+        self._groups = {} # group index -> filter index
+        self._exts = {}
+        self._fallbacks = []
+        self._prune_filters = () # (subject, regex, filter) tuples
+
+        alternatives = []
+        prune_filters = []
+        for idx, (expr, flt) in enumerate(filters):
+            self._inclusive.append(flt.inclusive)
+            try:
+                inclusive, properties, body = parse_expression(expr)
+                if inclusive != flt.inclusive or not body:
+                    raise ValueError(expr)
+            except ValueError:
+                self._fallbacks.append((idx, flt))
+                continue
+
+            try:
+                compiled = self._compile_filter(idx, properties, body, flt)
+            except re.error:
+                compiled = None
+            if compiled is None:
+                self._fallbacks.append((idx, flt))
+            elif compiled is not True:
+                alternatives.append((idx, compiled))
+
+            # A negative filter that matches every descendant of a directory
+            # excludes the whole subtree, as long as no inclusive filter comes
+            # before it
+            if not flt.inclusive and not any(self._inclusive):
+                try:
+                    pruning = self._compile_prune_filter(properties, body)
+                except re.error:
+                    pruning = None
+                if pruning is not None:
+                    prune_filters.append(pruning + (flt, ))
+
+        self._prune_filters = tuple(prune_filters)
+
+        if alternatives:
+            regex_str = "|".join(
+                "(?P<_f{}>{})".format(idx, alt) for idx, alt in alternatives)
+            self._regex = re.compile(regex_str)
+            for name, group_idx in self._regex.groupindex.items():
+                self._groups[group_idx] = int(name[2:])
+
+        self._count = len(self._inclusive)
+
+    def __eq__(self, other):
+        if not isinstance(other, FilterEngine):
+            return NotImplemented
+        return (self.expressions == other.expressions and
+                self.default == other.default)
+
+    def __hash__(self):
+        return hash((self.expressions, self.default))
+
+    def __repr__(self):
+        return "<{} of {} filter{}>".format(
+            self.__class__.__name__, self._count, "s"[self._count==1:])
+
+    def match_index(self, entry):
+        """
+        Return the index of the first filter that matches *entry*, or the
+        number of filters if none does.
+        """
+        best = self._count
+
+        if self._regex is not None:
+            rem = self._regex.match(entry.path[::-1])
+            if rem:
+                best = self._groups[rem.lastindex]
+
+        if self._exts:
+            ext = os.path.splitext(os.path.normcase(entry.name))[1]
+            idx = self._exts.get(ext, best)
+            if idx < best:
+                best = idx
+
+        for idx, flt in self._fallbacks:
+            if idx >= best:
+                break
+            if flt.match(entry):
+                best = idx
+                break
+
+        return best
+
+    @property
+    def can_prune(self):
+        return bool(self._prune_filters)
+
+    def prunes(self, dir_path):
+        """
+        Return ``True`` if every descendant of the directory *dir_path* is known
+        to be excluded by the filters, in which case it is not worth walking
+        into it. The directory itself is not concerned.
+
+        A candidate filter is only trusted once its original object confirms
+        that it matches a path located below *dir_path*. If it does not, the
+        filter is not considered for pruning anymore.
+        """
+        for prune_filter in self._prune_filters:
+            subject, regex, flt = prune_filter
+            if subject == _SUBJECT_NODRIVE:
+                subject_path = os.path.splitdrive(dir_path)[1]
+            else:
+                subject_path = dir_path
+            if not regex.match(subject_path + os.sep):
+                continue
+
+            probe = _ProbeEntry(os.path.join(dir_path, _PROBE_NAME, _PROBE_NAME))
+            try:
+                confirmed = bool(flt.match(probe))
+            except Exception:
+                confirmed = False
+            if confirmed:
+                return True
+
+            self._prune_filters = tuple(
+                pf for pf in self._prune_filters if pf is not prune_filter)
+
+        return False
+
+    def decide(self, entry):
+        """Return ``True`` if *entry* must be included"""
+        if not self._count:
+            return self.default
+        idx = self.match_index(entry)
+        if idx >= self._count:
+            return self.default
+        return self._inclusive[idx]
+
+    def _compile_filter(self, idx, properties, body, flt):
+        # Return None if the filter cannot be compiled, True if it has been
+        # merged into the extensions dict, or the alternative of the path regex
+        if properties == {"ext"}:
+            exts = []
+            for ext in _EXT_SPLIT_REGEX.split(body):
+                if not ext:
+                    continue
+                ext = os.path.normcase(ext)
+                if ext[0] != ".":
+                    ext = "." + ext
+                if ext.count(".") > 1:
+                    return None
+                exts.append(ext)
+            for ext in exts:
+                self._exts.setdefault(ext, idx)
+            return True
+
+        if properties or "[" in body:
+            return None
+
+        alternative = "(?i:{})".format(_translate_glob_reversed(body))
+        if not self._confirm_glob(body, re.compile(alternative), flt):
+            return None
+        return alternative
+
+    def _confirm_glob(self, pattern, regex, flt):
+        """
+        Return ``True`` if the original object *flt* of the shell-like
+        *pattern* takes the same decisions as *regex*, its reversed translation,
+        for a set of probe paths: the pattern with its wildcards expanded
+        (including to path separators for ``*``), located after a separator or
+        not, in another case, and followed by an extra character.
+        """
+        probe_dir = self._PROBE_DIR
+        probes = []
+        for star in ("", "x" + os.sep + "x"):
+            tail = pattern.replace("*", star).replace("?", "x")
+            if tail.startswith(("\\", "/")):
+                probes.append(probe_dir + tail)
+            else:
+                probes.append(probe_dir + os.sep + tail)
+                probes.append(probe_dir + os.sep + "x" + tail)
+                probes.append(probe_dir + os.sep + tail.swapcase())
+                probes.append(probe_dir + os.sep + tail + "x")
+
+        for path in probes:
+            try:
+                confirmed = bool(flt.match(_ProbeEntry(path)))
+            except Exception:
+                return False
+            if confirmed != bool(regex.match(path[::-1])):
+                return False
+        return True
+
+    def _compile_prune_filter(self, properties, body):
+        # A shell-like pattern that ends with "*" matches any path that starts
+        # with a tail matching the rest of the pattern, provided its "*" also
+        # matches path separators. So if the rest of the pattern matches the
+        # path of a directory followed by a separator, it may match all the
+        # descendants of that directory too, which prunes() has the filter
+        # confirm.
+        if properties - {"nodrive", "case"} or "[" in body:
+            return None
+        head = body.rstrip("*")
+        if head == body:
+            return None
+        subject = _SUBJECT_NODRIVE if "nodrive" in properties else _SUBJECT_PATH
+        flags = "-i" if "case" in properties else "i"
+        if not head:
+            alternative = ""
+        else:
+            alternative = "(?{}:{})".format(
+                flags, _translate_glob(head, anchor_end=False))
+        return subject, re.compile(alternative)
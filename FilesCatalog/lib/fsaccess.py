@@ -0,0 +1,157 @@
+# Keypirinha: a fast launcher for Windows (keypirinha.com)
+
+import concurrent.futures
+import os
+import threading
+import time
+
+DRIVE_REMOTE = 4 # see GetDriveTypeW()
+
+class PathTimeoutError(Exception):
+    """
+    Raised when a filesystem call did not complete in time.
+    This is not an :py:exc:`OSError` on purpose, so that it is not mistaken for
+    an unreadable directory by the code that tolerates those.
+    """
+    pass
+
+def is_network_path(path):
+    """
+    Return ``True`` if *path* is an UNC path or is located on a mapped network
+    drive
+    """
+    norm_path = path.replace("/", "\\")
+    if norm_path.upper().startswith("\\\\?\\UNC\\"):
+        return True
+    if norm_path.startswith("\\\\"):
+        # \\?\ and \\.\ prefixes denote local device paths
+        return norm_path[2:3] not in ("?", ".")
+
+    drive = os.path.splitdrive(path)[0]
+    if os.name != "nt" or len(drive) != 2 or drive[1] != ":":
+        return False
+    try:
+        import ctypes
+        return ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == DRIVE_REMOTE
+    except Exception:
+        return False
+
+class FileSystem:
+    """
+    The filesystem calls a scan depends on.
+    This is the default implementation, other classes of this module wrap an
+    instance of it to alter its behavior.
+    """
+    def is_remote(self, path):
+        """Return ``True`` if *path* may be slow or unreachable"""
+        return is_network_path(path)
+
+    def stat(self, path):
+        return os.stat(path)
+
+    def scandir(self, path):
+        """Return the list of the :py:class:`os.DirEntry` objects of *path*"""
+        with os.scandir(path) as it:
+            return list(it)
+
+    def isdir(self, path):
+        return os.path.isdir(path)
+
+    def exists(self, path):
+        return os.path.exists(path)
+
+class LatencyFileSystem(FileSystem):
+    """
+    Delay every call made to *fs* by *delay* seconds.
+    If *prefixes* is given, only the paths that start with one of them are
+    slowed down, and they are considered as remote paths by
+    :py:meth:`is_remote`. This allows to use a local directory tree as a
+    stand-in for a slow network share.
+    """
+    def __init__(self, delay, prefixes=None, fs=None):
+        self.delay = delay
+        self.prefixes = None
+        if prefixes is not None:
+            self.prefixes = tuple(os.path.normcase(p) for p in prefixes)
+        self.fs = fs if fs is not None else FileSystem()
+
+    def is_remote(self, path):
+        if self.prefixes is None:
+            return self.fs.is_remote(path)
+        return self._is_slow(path)
+
+    def stat(self, path):
+        self._wait(path)
+        return self.fs.stat(path)
+
+    def scandir(self, path):
+        self._wait(path)
+        return self.fs.scandir(path)
+
+    def isdir(self, path):
+        self._wait(path)
+        return self.fs.isdir(path)
+
+    def exists(self, path):
+        self._wait(path)
+        return self.fs.exists(path)
+
+    def _is_slow(self, path):
+        return (self.prefixes is None or
+                os.path.normcase(path).startswith(self.prefixes))
+
+    def _wait(self, path):
+        if self._is_slow(path):
+            time.sleep(self.delay)
+
+class TimeoutFileSystem(FileSystem):
+    """
+    Run the calls made to *fs* in worker threads, at most *max_calls* of them
+    at a time, and raise :py:exc:`PathTimeoutError` if a call does not
+    complete within *timeout* seconds, including the time spent waiting for a
+    free worker.
+
+    A call that timed out keeps its worker busy until the OS gives up on it, so
+    that an unreachable server cannot take more than *max_calls* threads.
+    """
+    def __init__(self, timeout, max_calls, fs=None):
+        self.timeout = timeout
+        self.max_calls = max_calls
+        self.fs = fs if fs is not None else FileSystem()
+        self._slots = threading.BoundedSemaphore(max_calls)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_calls, thread_name_prefix="FilesCatalogNet")
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def is_remote(self, path):
+        return self.fs.is_remote(path)
+
+    def stat(self, path):
+        return self._call(self.fs.stat, path)
+
+    def scandir(self, path):
+        return self._call(self.fs.scandir, path)
+
+    def isdir(self, path):
+        return self._call(self.fs.isdir, path)
+
+    def exists(self, path):
+        return self._call(self.fs.exists, path)
+
+    def _call(self, func, path):
+        deadline = time.monotonic() + self.timeout
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PathTimeoutError(path)
+        try:
+            future = self._executor.submit(func, path)
+        except:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(
+                timeout=max(0.0, deadline - time.monotonic()))
+        except concurrent.futures.TimeoutError:
+            raise PathTimeoutError(path) from None
@@ -0,0 +1,30 @@
+# Keypirinha: a fast launcher for Windows (keypirinha.com)
+
+import os
+import pickle
+
+def load(file, version):
+    """
+    Load and return the object stored in *file* by :py:func:`save`.
+    Return ``None`` if the file does not exist, cannot be read, or has been
+    written with a different *version*.
+    """
+    try:
+        with open(file, "rb") as fh:
+            if pickle.load(fh) != version:
+                return None
+            return pickle.load(fh)
+    except Exception:
+        return None
+
+def save(file, version, obj):
+    """
+    Store *obj* into *file*, tagged with *version*.
+    The file is first written under a temporary name and then renamed so that a
+    concurrent reader never gets to see a truncated file.
+    """
+    tmp_file = file + ".tmp"
+    with open(tmp_file, "wb") as fh:
+        pickle.dump(version, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(obj, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, file)
@@ -0,0 +1,104 @@
+# Keypirinha: a fast launcher for Windows (keypirinha.com)
+#
+# Helpers shared by the benchmarks of this directory.
+
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+STUBS_DIR = os.path.join(BENCH_DIR, "kpstubs")
+
+def setup_stubs():
+    """
+    Make the stand-ins of the modules of Keypirinha's embedded Python runtime
+    importable, as well as the packages of this repository
+    """
+    for path in (REPO_DIR, STUBS_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+def fake_drive(root):
+    """
+    Make *root* look like a drive to :py:func:`os.path.splitdrive` so that the
+    plugins, which expect absolute Windows paths, accept the paths located
+    under *root*. Nothing is done on Windows.
+    """
+    if os.name == "nt":
+        return
+    import posixpath
+    root = root.rstrip("/")
+    splitdrive = posixpath.splitdrive
+    def _splitdrive(p):
+        if isinstance(p, str) and (p == root or p.startswith(root + "/")):
+            return p[0:len(root)], p[len(root):]
+        return splitdrive(p)
+    posixpath.splitdrive = _splitdrive
+
+def parse_count(value):
+    """Parse a number of entries like ``"100k"`` or ``"1M"``"""
+    value = value.strip().lower().replace("_", "")
+    multiplier = 1
+    if value.endswith("k"):
+        multiplier, value = 1_000, value[0:-1]
+    elif value.endswith("m"):
+        multiplier, value = 1_000_000, value[0:-1]
+    return int(float(value) * multiplier)
+
+def format_count(count):
+    for threshold, suffix in ((1_000_000, "M"), (1_000, "k")):
+        if count >= threshold and count % (threshold // 10) == 0:
+            return "{:g}{}".format(count / threshold, suffix)
+    return str(count)
+
+def format_bytes(size):
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return "{:.1f} {}".format(size, unit)
+        size /= 1024
+    return "{:.1f} GiB".format(size)
+
+def peak_rss():
+    """Return the peak resident set size of the process in bytes, or None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+class Measure:
+    """
+    A context manager that measures the wall time and, if *trace_memory* is
+    true, the peak memory allocated by Python code while it is active
+    """
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.elapsed = 0.0
+        self.peak_memory = None
+
+    def __enter__(self):
+        gc.collect()
+        if self.trace_memory:
+            tracemalloc.start()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self._start
+        if self.trace_memory:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return False
+
+def print_table(headers, rows):
+    widths = [max(len(str(cell)) for cell in column)
+              for column in zip(headers, *rows)]
+    for idx, row in enumerate([headers] + rows):
+        print("  ".join(str(cell).rjust(width)
+                        for cell, width in zip(row, widths)))
+        if idx == 0:
+            print("  ".join("-" * width for width in widths))
@@ -0,0 +1,231 @@
+# Keypirinha: a fast launcher for Windows (keypirinha.com)
+"""
+Micro-benchmark of the retokenizer of the Calc package, outside of Keypirinha.
+
+A corpus of long random expressions is rewritten by Calc._retokenize() and by
+the two-pass implementation it replaced (see legacy_retokenize()). Both must
+give the same output for every expression of the corpus, the benchmark fails
+otherwise.
+
+The corpus mixes integer-only expressions, expressions with float literals or
+divisions (in which case every number is converted to a Number object), and
+numbers with SI or binary suffixes.
+
+Examples:
+
+    python bench/calc_bench.py
+    python bench/calc_bench.py --count 5000 --length 400 --repeat 5
+"""
+
+import argparse
+import io
+import random
+import sys
+import time
+import tokenize
+
+import benchlib
+
+INT_LITERALS = ("0", "1", "7", "42", "255", "1000", "1_000", "0x1f", "0b101",
+                "0o17", "65536")
+FLOAT_LITERALS = ("1.5", ".25", "3.", "2.5e-3", "6.02e23", "0.1")
+EXP_LITERALS = ("1e3", "3E-2") # floats without a "." are not Number-converted
+SUFFIXES = ("k", "M", "G", "m", "u", "n", "da", "h", "Ki", "Mi", "Gi", "y")
+INT_OPERATORS = ("+", "-", "*", "//", "%", "^", "~", "<<", ">>", " xor ",
+                 " and ", " or ", " AND ")
+NAMES = ("pi", "e", "ans")
+FUNCTIONS = ("sqrt({})", "abs({})", "max({}, {})", "round({}, 2)",
+             "min({}, {}, {})")
+
+def generate_corpus(count, length, seed):
+    """
+    Return a list of *count* expressions of roughly *length* characters.
+    Forty percent of them do not contain any float literal nor division.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        int_only = rng.random() < 0.4
+        parts = []
+        size = 0
+        while size < length:
+            operand = _operand(rng, int_only, depth=0)
+            if parts:
+                ops = INT_OPERATORS if int_only else INT_OPERATORS + ("/", )
+                parts.append(rng.choice(ops))
+            parts.append(operand)
+            size += len(operand) + 2
+        corpus.append("".join(parts))
+    return corpus
+
+def _operand(rng, int_only, depth):
+    kind = rng.random()
+    if kind < 0.45 or depth >= 2:
+        if not int_only and rng.random() < 0.15:
+            number = rng.choice(FLOAT_LITERALS)
+        elif rng.random() < 0.05:
+            number = rng.choice(EXP_LITERALS)
+        else:
+            number = rng.choice(INT_LITERALS[:7] if rng.random() < 0.3
+                                else INT_LITERALS)
+        if rng.random() < 0.2 and number[:2] not in ("0x", "0b", "0o"):
+            suffixes = SUFFIXES if not int_only else SUFFIXES[:2] + SUFFIXES[6:11]
+            number += rng.choice(suffixes)
+        return number
+    elif kind < 0.6:
+        return rng.choice(NAMES)
+    elif kind < 0.8:
+        func = rng.choice(FUNCTIONS)
+        return func.format(*(
+            _operand(rng, int_only, depth + 1)
+            for _ in range(func.count("{}"))))
+    else:
+        sub_int_only = int_only or rng.random() < 0.5
+        ops = INT_OPERATORS if sub_int_only else INT_OPERATORS + ("/", )
+        return "({}{}{})".format(
+            _operand(rng, sub_int_only, depth + 1), rng.choice(ops),
+            _operand(rng, sub_int_only, depth + 1))
+
+def legacy_retokenize(plugin, expr):
+    """
+    The two-pass implementation of Calc._retokenize() used as a reference.
+    Suffixed numbers go through eval() like they used to, the multipliers are
+    applied with the (operator, factor) table of the plugin which gives the
+    same values as the former lambdas.
+    """
+    def _tokenize_number(dest, nstr, force_decimal):
+        if force_decimal or "." in nstr:
+            dest.extend([
+                (tokenize.NAME, "Number"),
+                (tokenize.NAME, "("),
+                (tokenize.STRING, repr(nstr)),
+                (tokenize.NAME, ")")])
+            force_decimal = True
+        else:
+            dest.append((tokenize.NUMBER, nstr))
+        return force_decimal
+
+    trans_tokens = []
+    num_tok = None
+    has_decimal = False
+
+    # first pass
+    tokens = tokenize.tokenize(io.BytesIO(expr.encode('utf-8')).readline)
+    prev_tok = None
+    for tokinfo in tokens:
+        if tokinfo.type == tokenize.NUMBER:
+            if "." in tokinfo.string:
+                has_decimal = True
+                break
+        elif tokinfo.exact_type == tokenize.SLASH:
+            if prev_tok is not None and prev_tok.type == tokenize.NUMBER:
+                has_decimal = True
+                break
+        prev_tok = tokinfo
+
+    # second pass
+    tokens = tokenize.tokenize(io.BytesIO(expr.encode('utf-8')).readline)
+    for tokinfo in tokens:
+        push_generic_token = False
+
+        if tokinfo.type == tokenize.NUMBER:
+            if num_tok is not None:
+                has_decimal = _tokenize_number(trans_tokens, num_tok.string, has_decimal)
+                num_tok = None
+            num_tok = tokinfo
+        elif tokinfo.type == tokenize.OP:
+            if tokinfo.exact_type in plugin.TOKENSMAP_OPERATORS:
+                if num_tok is not None:
+                    has_decimal = _tokenize_number(trans_tokens, num_tok.string, has_decimal)
+                    num_tok = None
+                trans_tokens.append((
+                    tokinfo.type,
+                    plugin.TOKENSMAP_OPERATORS[tokinfo.exact_type]))
+            else:
+                push_generic_token = True
+        elif tokinfo.type == tokenize.NAME:
+            if num_tok is not None and tokinfo.string in plugin.TOKENSMAP_NUMBER_SUFFIXES:
+                suffix_op, factor = plugin.TOKENSMAP_NUMBER_SUFFIXES[tokinfo.string]
+                has_decimal = _tokenize_number(
+                    trans_tokens,
+                    str(suffix_op(eval(num_tok.string), factor)),
+                    has_decimal)
+                num_tok = None
+            elif tokinfo.string.lower() in plugin.TOKENSMAP_NAME_OPERATORS:
+                if num_tok is not None:
+                    has_decimal = _tokenize_number(trans_tokens, num_tok.string, has_decimal)
+                    num_tok = None
+                trans_tokens.append((
+                    tokenize.OP,
+                    plugin.TOKENSMAP_NAME_OPERATORS[tokinfo.string.lower()]))
+            else:
+                push_generic_token = True
+        else:
+            push_generic_token = True
+
+        if push_generic_token:
+            if num_tok is not None:
+                has_decimal = _tokenize_number(trans_tokens, num_tok.string, has_decimal)
+                num_tok = None
+            trans_tokens.append((tokinfo.type, tokinfo.string))
+
+    return tokenize.untokenize(trans_tokens).decode('utf-8')
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Calc retokenizer benchmark",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__)
+    parser.add_argument(
+        "--count", type=int, default=2000,
+        help="number of expressions in the corpus (default: %(default)s)")
+    parser.add_argument(
+        "--length", type=int, default=200,
+        help="approximate length of the expressions (default: %(default)s)")
+    parser.add_argument(
+        "--seed", type=int, default=1,
+        help="seed of the corpus generator (default: %(default)s)")
+    parser.add_argument(
+        "--repeat", type=int, default=3,
+        help="number of runs, the best one is reported (default: %(default)s)")
+    args = parser.parse_args()
+
+    benchlib.setup_stubs()
+    from Calc import calc
+
+    plugin = calc.Calc()
+    corpus = generate_corpus(args.count, args.length, args.seed)
+
+    expected = [legacy_retokenize(plugin, expr) for expr in corpus]
+    results = [plugin._retokenize(expr) for expr in corpus]
+    for expr, res, exp in zip(corpus, results, expected):
+        if res != exp:
+            sys.exit(("Output differs for expression: {}\n" +
+                      "  legacy:  {}\n  current: {}").format(expr, exp, res))
+
+    rows = []
+    for name, func in (
+            ("legacy", lambda expr: legacy_retokenize(plugin, expr)),
+            ("current", plugin._retokenize)):
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for expr in corpus:
+                func(expr)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        rows.append([name, "{:.3f}".format(best),
+                     "{:.1f}".format(best / len(corpus) * 1e6), best])
+
+    legacy_time = rows[0][-1]
+    for row in rows:
+        row[-1] = "{:.2f}x".format(legacy_time / row[-1])
+
+    decimal_count = sum(1 for res in results if "Number (" in res)
+    print("{} expressions of {} characters on average, {} with decimals".format(
+          len(corpus), sum(map(len, corpus)) // len(corpus), decimal_count))
+    benchlib.print_table(
+        ("retokenizer", "total (s)", "per expr (us)", "speedup"), rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+# Keypirinha: a fast launcher for Windows (keypirinha.com)
+"""
+Benchmark of the FilesCatalog package, outside of Keypirinha.
+
+The modules of Keypirinha's embedded Python runtime are replaced by the
+stand-ins of the kpstubs directory, and the profiles scan synthetic trees
+generated under a temporary directory (see synthtree.py). Generating the
+largest trees takes a while, they are kept for the next runs.
+
+Modes:
+
+* catalog: time FilesCatalog's on_catalog() for the given tree sizes and
+  profile, first with an empty cache ("cold" run) then with the snapshot of the
+  previous run ("warm" run, see the incremental_scan setting). Each run reports
+  its wall time, the number of items cataloged per second and the peak memory
+  allocated by Python code. With --no-incremental, the "warm" run is a second
+  catalog request of the same plugin, which scans the profile with the globex
+  walker since the first scan showed the catalog is well below catalog_limit
+  (the globex walker is the pure-Python stand-in of Keypirinha's native walker
+  here).
+* filters: time the filter engine against the sequential test of the filters,
+  over all the entries of the trees, for two sets of filters: "merged" only has
+  filters the engine merges (plain shell-like patterns and ext: filters), which
+  is where the engine pays off, "mixed" has filters of every kind, most of them
+  being evaluated one by one by the engine too. The sequential test uses the
+  filefilter stand-in, which may be faster or slower than Keypirinha's own
+  module. The check that both take the same decisions only proves the engine
+  asks the filters in the right order: the engine merges a pattern only once
+  its filter object (here the stand-in, in Keypirinha the native module)
+  agreed with the merged regex on a set of probe paths.
+
+Examples:
+
+    python bench/filescatalog_bench.py --sizes 10k,100k
+    python bench/filescatalog_bench.py --sizes 1M --profile exe --no-trace-memory
+    python bench/filescatalog_bench.py filters --sizes 100k
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import textwrap
+
+import benchlib
+import synthtree
+
+# The settings of the benchmarked profiles. {path} is replaced by the path of
+# the synthetic tree.
+PROFILES = {
+    # every file of the tree
+    'all': """
+        paths = {path}
+        include_files = yes
+        """,
+    # a typical "applications" profile, a few extensions only
+    'exe': """
+        paths = {path}
+        filters = ext: .exe .lnk .py
+        """,
+    # a profile with 40+ filters of every kind
+    'filters': """
+        paths = {path}
+        filters =
+        {filters}
+        """,
+    # files and directories, labels using the directory tags
+    'dirs': """
+        paths = {path}
+        include_dirs = yes
+        file_item_label = {{clean_name}} ({{dir1}})
+        file_item_desc = {{2dirs}}
+        dir_item_label = {{name}} ({{dir1}})
+        """,
+}
+
+FILTERS = (
+    ["- attr: hidden"] +
+    ["- */d{}_*/*.tmp".format(idx) for idx in range(8)] +
+    ["- regex: [\\\\/]d{}[0-9]_[0-9a-f]+[\\\\/]".format(idx)
+     for idx in range(1, 6)] +
+    ["- *\\cache\\*", "- *\\node_modules\\*", "- *.bak", "- *~"] +
+    ["+ ext: .exe .lnk", "+ ext: .py .pyw", "+ case: *README*"] +
+    ["+ f{}*.pdf".format(idx) for idx in range(10)] +
+    ["+ regex: f[0-9]+_[0-9a-f]+\\.doc$", "+ regex: (?i)f1.*\\.jpg$"] +
+    ["+ nodrive: *\\d0_*\\f*.txt", "+ attr: dir", "+ *.md"] +
+    ["- regex: \\.dll$", "+ f?_*.dll", "+ f??_*.dll"])
+
+# filters the engine merges into a single regex and an extensions dict
+MERGED_FILTERS = (
+    ["- */d{}_*/*.tmp".format(idx) for idx in range(8)] +
+    ["- *\\cache\\*", "- *\\node_modules\\*", "- *.bak", "- *~"] +
+    ["+ ext: .exe .lnk", "+ ext: .py .pyw", "+ *README*"] +
+    ["+ f{}*.pdf".format(idx) for idx in range(10)] +
+    ["+ *\\d0_*\\f*.txt", "+ *.md", "+ f?_*.dll", "+ f??_*.dll"] +
+    ["+ ext: .doc{} .jpg{}".format(idx, idx) for idx in range(10)])
+
+FILTER_SETS = (("merged", MERGED_FILTERS), ("mixed", FILTERS))
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="FilesCatalog benchmark",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__)
+    parser.add_argument(
+        "mode", nargs="?", choices=("catalog", "filters"), default="catalog")
+    parser.add_argument(
+        "--sizes", default="10k,100k",
+        help="comma-separated number of entries of the trees " +
+             "(default: %(default)s, 1M is available too)")
+    parser.add_argument(
+        "--depth", type=int, default=synthtree.DEFAULT_DEPTH,
+        help="maximum depth of the trees (default: %(default)s)")
+    parser.add_argument(
+        "--fanout", type=int, default=synthtree.DEFAULT_FANOUT,
+        help="sub-directories per directory (default: %(default)s)")
+    parser.add_argument(
+        "--exts", default=None,
+        help="extension mix, like \"exe:10,txt:5,:1\" (default: " +
+             ",".join("{}:{}".format(*ext)
+                      for ext in synthtree.DEFAULT_EXTENSIONS) + ")")
+    parser.add_argument(
+        "--seed", type=int, default=synthtree.DEFAULT_SEED,
+        help="seed of the tree generator (default: %(default)s)")
+    parser.add_argument(
+        "--profile", choices=sorted(PROFILES), default="all",
+        help="profile to catalog the trees with (default: %(default)s)")
+    parser.add_argument(
+        "--max-depth", type=int, default=-1,
+        help="max_depth setting of the profile (default: %(default)s)")
+    parser.add_argument(
+        "--scan-workers", type=int, default=1,
+        help="scan_workers setting (default: %(default)s)")
+    parser.add_argument(
+        "--no-incremental", dest="incremental", action="store_false",
+        help="disable the incremental_scan setting")
+    parser.add_argument(
+        "--repeat", type=int, default=1,
+        help="number of cold/warm runs per tree (default: %(default)s)")
+    parser.add_argument(
+        "--no-trace-memory", dest="trace_memory", action="store_false",
+        help="do not trace memory allocations, which slows down the runs")
+    parser.add_argument(
+        "--dir", default=os.path.join(tempfile.gettempdir(),
+                                      "filescatalog-bench"),
+        help="where to generate the trees (default: %(default)s)")
+    args = parser.parse_args()
+
+    extensions = synthtree.DEFAULT_EXTENSIONS
+    if args.exts:
+        extensions = synthtree.parse_extensions(args.exts)
+
+    bench_dir = os.path.abspath(args.dir)
+    os.makedirs(bench_dir, exist_ok=True)
+    benchlib.setup_stubs()
+    benchlib.fake_drive(bench_dir)
+
+    trees = []
+    for size in args.sizes.split(","):
+        count = benchlib.parse_count(size)
+        root = os.path.join(bench_dir, "tree-{}-d{}-f{}-s{}".format(
+            benchlib.format_count(count), args.depth, args.fanout, args.seed))
+        print("Generating {} entries in {}...".format(
+              benchlib.format_count(count), root), flush=True)
+        dirs = synthtree.generate(root, count, args.depth, args.fanout,
+                                  extensions, args.seed)
+        trees.append((count, root, dirs))
+
+    if args.mode == "filters":
+        bench_filters(trees, args)
+    else:
+        bench_catalog(trees, bench_dir, args)
+
+def bench_catalog(trees, bench_dir, args):
+    import keypirinha as kp
+    from FilesCatalog import filescatalog
+
+    rows = []
+    for count, root, dirs in trees:
+        path = os.path.join(root, "**")
+        profile = textwrap.dedent(PROFILES[args.profile]).format(
+            path=path, filters="\n".join("    " + f for f in FILTERS))
+        kp.SETTINGS_TEXT = (
+            "[main]\n" +
+            "catalog_limit = 300000\n" +
+            "scan_workers = {}\n".format(args.scan_workers) +
+            "incremental_scan = {}\n".format(
+                "yes" if args.incremental else "no") +
+            "[profile/Bench]\n" +
+            "activate = yes\n" +
+            "max_depth = {}\n".format(args.max_depth) +
+            profile)
+        kp.CACHE_DIR = os.path.join(bench_dir, "cache")
+
+        for _ in range(args.repeat):
+            shutil.rmtree(kp.CACHE_DIR, ignore_errors=True)
+            plugin = None
+            for run in ("cold", "warm"):
+                if args.incremental or plugin is None:
+                    plugin = filescatalog.FilesCatalog()
+                    plugin.on_start()
+                with benchlib.Measure(args.trace_memory) as measure:
+                    plugin.on_catalog()
+                errors = [msg for level, msg in plugin.logs if level == "err"]
+                if errors:
+                    sys.exit("\n".join(errors))
+                items = len(plugin.catalog)
+                rows.append((
+                    benchlib.format_count(count), dirs, run, items,
+                    "{:.2f}".format(measure.elapsed),
+                    "{:,.0f}".format(items / measure.elapsed),
+                    benchlib.format_bytes(measure.peak_memory)
+                    if measure.peak_memory is not None else "n/a"))
+            del plugin
+
+    print()
+    print("profile: {}, scan_workers: {}, incremental_scan: {}".format(
+          args.profile, args.scan_workers,
+          "yes" if args.incremental else "no"))
+    benchlib.print_table(
+        ("entries", "dirs", "run", "items", "wall (s)", "items/s",
+         "peak mem"),
+        rows)
+    rss = benchlib.peak_rss()
+    if rss is not None:
+        print("peak RSS of the process: {}".format(benchlib.format_bytes(rss)))
+
+def bench_filters(trees, args):
+    import filefilter
+    import time
+    from FilesCatalog.lib import dirwalk
+    from FilesCatalog.lib import filterengine
+
+    rows = []
+    for count, root, _ in trees:
+        entries = []
+        walker = dirwalk.DirWalker(os.path.join(root, "**"),
+                                   include_hidden=True)
+        for _ in walker.walk(entries.extend):
+            pass
+
+        for set_name, filter_exprs in FILTER_SETS:
+            filters = [(expr, filefilter.create_filter(expr))
+                       for expr in filter_exprs]
+            default = not any(f.inclusive for _, f in filters)
+            engine = filterengine.FilterEngine(tuple(filters), default)
+
+            start = time.perf_counter()
+            expected = []
+            for entry in entries:
+                decision = default
+                for _, f in filters:
+                    if f.match(entry):
+                        decision = f.inclusive
+                        break
+                expected.append(decision)
+            sequential = time.perf_counter() - start
+
+            start = time.perf_counter()
+            decisions = [engine.decide(entry) for entry in entries]
+            compiled = time.perf_counter() - start
+
+            if decisions != expected:
+                sys.exit("Filter engine and sequential filters disagree " +
+                         "({} filters)".format(set_name))
+            rows.append((
+                benchlib.format_count(count), len(entries), set_name,
+                len(filters), len(engine._fallbacks),
+                "{:.2f}".format(sequential), "{:.2f}".format(compiled),
+                "{:.1f}x".format(sequential / compiled)))
+
+    benchlib.print_table(
+        ("entries", "tested", "set", "filters", "unmerged", "sequential (s)",
+         "engine (s)", "speedup"),
+        rows)
+
+if __name__ == "__main__":
+    main()
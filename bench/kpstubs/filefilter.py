@@ -0,0 +1,106 @@
+# Keypirinha: a fast launcher for Windows (keypirinha.com)
+#
+# Pure-Python stand-in for the "filefilter" module of the embedded Python
+# runtime (see keypirinha.py). The filters follow the syntax documented in the
+# *filters* setting of FilesCatalog's configuration file and are tested one by
+# one, like the original implementation does.
+
+import os
+import re
+
+_PROPERTY_REGEX = re.compile(
+    r"(?P<name>ext|regex|nodrive|case|attr_all|attr)\s*:\s*", re.IGNORECASE)
+
+FILE_ATTRIBUTE_HIDDEN = 0x2
+
+class Filter:
+    def __init__(self, expression, inclusive, properties, pattern):
+        self.expression = expression
+        self.inclusive = inclusive
+        self.properties = properties
+
+        flags = 0 if "case" in properties else re.IGNORECASE
+        if "ext" in properties:
+            self._exts = set(
+                os.path.normcase(ext if ext.startswith(".") else "." + ext)
+                for ext in re.split(r"[\s;]+", pattern) if ext)
+        elif "attr" in properties or "attr_all" in properties:
+            self._attrs = pattern.lower().split()
+        elif "regex" in properties:
+            self._regex = re.compile(pattern, flags)
+        else:
+            self._regex = re.compile(_translate_glob(pattern), flags)
+
+    def __str__(self):
+        return self.expression
+
+    def __eq__(self, other):
+        return (isinstance(other, Filter) and
+                other.expression == self.expression)
+
+    def __hash__(self):
+        return hash(self.expression)
+
+    def match(self, entry):
+        path = entry if isinstance(entry, str) else entry.path
+        if "ext" in self.properties:
+            ext = os.path.splitext(path)[1]
+            return os.path.normcase(ext) in self._exts
+        if "attr" in self.properties or "attr_all" in self.properties:
+            results = (self._match_attr(entry, attr) for attr in self._attrs)
+            if "attr_all" in self.properties:
+                return all(results)
+            return any(results)
+        if "nodrive" in self.properties:
+            path = os.path.splitdrive(path)[1]
+        if "regex" in self.properties:
+            return self._regex.search(path) is not None
+        return self._regex.match(path) is not None
+
+    def _match_attr(self, entry, attr):
+        negate = attr.startswith("!")
+        attr = attr.lstrip("!")
+        if attr in ("d", "dir", "directory"):
+            value = entry.is_dir()
+        elif attr in ("h", "hidden"):
+            value = entry.is_hidden()
+        else:
+            value = False
+        return value != negate
+
+def create_filter(expression, default_inclusive=True):
+    """Parse *expression* and return a :py:class:`Filter` object"""
+    expr = expression.strip()
+    inclusive = default_inclusive
+    if expr[0:1] in ("+", "-"):
+        inclusive = expr[0] == "+"
+        expr = expr[1:].lstrip()
+
+    properties = set()
+    while True:
+        rem = _PROPERTY_REGEX.match(expr)
+        if not rem:
+            break
+        properties.add(rem.group("name").lower())
+        expr = expr[rem.end():]
+    if not expr:
+        raise ValueError("empty filter expression")
+
+    return Filter(expression, inclusive, properties, expr)
+
+def _translate_glob(pattern):
+    res = []
+    for c in pattern:
+        if c == "*":
+            res.append(r"[\s\S]*")
+        elif c == "?":
+            res.append(r"[\s\S]")
+        elif c in "\\/":
+            res.append(r"[\\/]")
+        else:
+            res.append(re.escape(c))
+    if pattern[0] in "\\/*":
+        prefix = r"[\s\S]*" if pattern[0] != "*" else ""
+    else:
+        prefix = r"(?:[\s\S]*[\\/])?"
+    return prefix + "".join(res) + r"\Z"
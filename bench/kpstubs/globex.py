@@ -0,0 +1,107 @@
+# Keypirinha: a fast launcher for Windows (keypirinha.com)
+#
+# Pure-Python stand-in for the "globex" module of the embedded Python runtime
+# (see keypirinha.py). iglobex() walks depth-first, one directory at a time,
+# which is slower than the native implementation.
+
+import fnmatch
+import os
+import re
+
+FILE_ATTRIBUTE_HIDDEN = 0x2
+
+def has_magic(s):
+    """Return ``True`` if *s* contains glob wildcards"""
+    return any(c in s for c in "*?[")
+
+class GlobExEntry:
+    """An :py:class:`os.DirEntry` with the extra methods of GlobExEntry"""
+    __slots__ = ("_entry", "depth")
+
+    def __init__(self, direntry, depth):
+        self._entry = direntry
+        self.depth = depth
+
+    def __getattr__(self, attr):
+        return getattr(self._entry, attr)
+
+    def __fspath__(self):
+        return self._entry.path
+
+    def __repr__(self):
+        return "<{} {!r}>".format(self.__class__.__name__, self._entry.path)
+
+    @property
+    def name(self):
+        return self._entry.name
+
+    @property
+    def path(self):
+        return self._entry.path
+
+    def is_dir(self, *, follow_symlinks=True):
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, *, follow_symlinks=True):
+        return self._entry.is_file(follow_symlinks=follow_symlinks)
+
+    def is_symlink(self):
+        return self._entry.is_symlink()
+
+    def stat(self, *, follow_symlinks=True):
+        return self._entry.stat(follow_symlinks=follow_symlinks)
+
+    def attributes(self):
+        try:
+            return self._entry.stat(follow_symlinks=False).st_file_attributes
+        except AttributeError:
+            # not on Windows
+            return FILE_ATTRIBUTE_HIDDEN if self._entry.name[0] == "." else 0
+
+    def is_hidden(self):
+        return bool(self.attributes() & FILE_ATTRIBUTE_HIDDEN)
+
+def iglobex(pattern, recursivity=-1, include_hidden=False):
+    """
+    Yield the :py:class:`GlobExEntry` objects matching *pattern*. A ``**``
+    segment matches zero or more directories, down to *recursivity* levels
+    (-1 for no limit).
+    """
+    drive, tail = os.path.splitdrive(pattern)
+    parts = [p for p in re.split(r"[\\/]+", tail) if p]
+    idx = 0
+    while idx < len(parts) - 1 and not has_magic(parts[idx]):
+        idx += 1
+    base = drive + os.sep + os.sep.join(parts[0:idx])
+    yield from _walk(base, tuple(parts[idx:]), 0, recursivity, include_hidden)
+
+def _walk(dir_path, segments, depth, recursivity, include_hidden):
+    segment = segments[0]
+    try:
+        with os.scandir(dir_path) as it:
+            direntries = list(it)
+    except OSError:
+        return
+    for direntry in direntries:
+        entry = GlobExEntry(direntry, depth)
+        if not include_hidden and entry.is_hidden():
+            continue
+        is_dir = direntry.is_dir()
+        if segment == "**":
+            if len(segments) == 1:
+                yield entry
+            elif fnmatch.fnmatch(direntry.name, segments[1]):
+                if len(segments) == 2:
+                    yield entry
+                elif is_dir:
+                    yield from _walk(direntry.path, segments[2:], depth + 1,
+                                     recursivity, include_hidden)
+            if is_dir and (recursivity < 0 or depth + 1 <= recursivity):
+                yield from _walk(direntry.path, segments, depth + 1,
+                                 recursivity, include_hidden)
+        elif fnmatch.fnmatch(direntry.name, segment):
+            if len(segments) == 1:
+                yield entry
+            elif is_dir:
+                yield from _walk(direntry.path, segments[1:], depth + 1,
+                                 recursivity, include_hidden)
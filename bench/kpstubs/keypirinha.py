@@ -0,0 +1,251 @@
+# Keypirinha: a fast launcher for Windows (keypirinha.com)
+#
+# Pure-Python stand-in for the "keypirinha" module of the embedded Python
+# runtime. It only implements what the benchmarks need to run a plugin outside
+# of Keypirinha: the plugin callbacks are called directly by the benchmark, the
+# catalog is kept in memory and the log messages are collected.
+
+import configparser
+import enum
+import os
+import tempfile
+
+import keypirinha_api
+
+# the content of the configuration file of the benchmarked plugin (ini format)
+SETTINGS_TEXT = ""
+
+# the directory returned by Plugin.get_package_cache_path(), a temporary
+# directory if None
+CACHE_DIR = None
+
+# print the messages logged by plugins to stdout instead of just collecting
+# them
+ECHO_LOGS = False
+
+class ItemCategory(enum.IntEnum):
+    ERROR = 0
+    KEYWORD = 1
+    REFERENCE = 2
+    FILE = 3
+    URL = 4
+    CMDLINE = 5
+    EXPRESSION = 6
+    USER_BASE = 1000
+
+class ItemArgsHint(enum.IntEnum):
+    FORBIDDEN = 0
+    ACCEPTED = 1
+    REQUIRED = 2
+
+class ItemHitHint(enum.IntEnum):
+    IGNORE = 0
+    NOARGS = 1
+    KEEPALL = 2
+
+class Events(enum.IntFlag):
+    PACKCONFIG = 0x01
+    ENV = 0x02
+    STARTMENU = 0x04
+    DESKTOP = 0x08
+    NETOPTIONS = 0x10
+    APPCONFIG = 0x20
+    APPACTIVATED = 0x40
+
+class Match(enum.IntEnum):
+    FUZZY = 0
+    ANY = 1
+    DEFAULT = 0
+
+class Sort(enum.IntEnum):
+    SCORE_DESC = 0
+    NONE = 1
+    LABEL_ASC = 2
+    DEFAULT = 0
+
+class Settings:
+    """The read-only settings of a package, parsed from :py:data:`SETTINGS_TEXT`"""
+
+    TRUE_VALUES = ("1", "y", "yes", "t", "true", "on")
+
+    def __init__(self, text=""):
+        self._parser = configparser.ConfigParser(
+            interpolation=None, default_section="\x00")
+        self._parser.optionxform = str
+        self._parser.read_string(text)
+
+    def sections(self):
+        return self._parser.sections()
+
+    def keys(self, section="main"):
+        if not self._parser.has_section(section):
+            return []
+        return list(self._parser.options(section))
+
+    def has_section(self, section):
+        return self._parser.has_section(section)
+
+    def has(self, key, section="main"):
+        return self._parser.has_option(section, key)
+
+    def get(self, key, section="main", fallback=None, unquote=False):
+        if not self.has(key, section):
+            return fallback
+        value = self._parser.get(section, key)
+        if unquote and len(value) >= 2 and value[0] == value[-1] == '"':
+            value = value[1:-1]
+        return value
+
+    def get_stripped(self, key, section="main", fallback=None, unquote=True):
+        value = self.get(key, section, None, unquote)
+        if value is None:
+            return fallback
+        value = value.strip()
+        return value if value else fallback
+
+    def get_bool(self, key, section="main", fallback=None):
+        value = self.get_stripped(key, section)
+        if value is None:
+            return fallback
+        return value.lower() in self.TRUE_VALUES
+
+    def get_int(self, key, section="main", fallback=None, min=None, max=None):
+        return self._get_number(int, key, section, fallback, min, max)
+
+    def get_float(self, key, section="main", fallback=None, min=None,
+                  max=None):
+        return self._get_number(float, key, section, fallback, min, max)
+
+    def get_multiline(self, key, section="main", fallback=[],
+                      keep_empty_lines=False):
+        value = self.get(key, section)
+        if value is None:
+            return fallback
+        lines = [line.strip() for line in value.splitlines()]
+        if not keep_empty_lines:
+            lines = [line for line in lines if line]
+        return lines
+
+    def get_enum(self, key, section="main", fallback=None, enum=[],
+                 case_sensitive=False):
+        value = self.get_stripped(key, section)
+        if value is None:
+            return fallback
+        for candidate in enum:
+            if case_sensitive:
+                if candidate == value:
+                    return candidate
+            elif candidate.lower() == value.lower():
+                return candidate
+        return fallback
+
+    def get_mapped(self, key, section="main", fallback=None, map={},
+                   case_sensitive=False):
+        value = self.get_stripped(key, section)
+        if value is None:
+            return fallback
+        for candidate, mapped in map.items():
+            if case_sensitive:
+                if candidate == value:
+                    return mapped
+            elif candidate.lower() == value.lower():
+                return mapped
+        return fallback
+
+    def _get_number(self, cast, key, section, fallback, min, max):
+        value = self.get_stripped(key, section)
+        if value is None:
+            return fallback
+        try:
+            value = cast(value.replace("_", ""), 0) if cast is int \
+                else cast(value)
+        except ValueError:
+            return fallback
+        if min is not None and value < min:
+            value = min
+        if max is not None and value > max:
+            value = max
+        return value
+
+class Plugin:
+    """
+    The base class of the plugins. The catalog committed with
+    :py:meth:`set_catalog` is available as :py:attr:`catalog`, the log messages
+    as :py:attr:`logs`, a list of ``(level, message)`` tuples. Set
+    :py:attr:`terminate` to simulate a request to stop the current callback.
+    """
+
+    def __init__(self):
+        self.catalog = None
+        self.suggestions = None
+        self.logs = []
+        self.terminate = False
+
+    def id(self):
+        return id(self)
+
+    def package_full_name(self):
+        return self.__class__.__module__.split(".")[0]
+
+    def friendly_name(self):
+        return self.__class__.__name__
+
+    def dbg(self, *args, sep=" "):
+        pass
+
+    def info(self, *args, sep=" "):
+        self._log("info", sep.join(map(str, args)))
+
+    def warn(self, *args, sep=" "):
+        self._log("warn", sep.join(map(str, args)))
+
+    def err(self, *args, sep=" "):
+        self._log("err", sep.join(map(str, args)))
+
+    def should_terminate(self, wait=None):
+        return self.terminate
+
+    def load_settings(self):
+        return Settings(SETTINGS_TEXT)
+
+    def create_item(self, **kwargs):
+        return keypirinha_api.CatalogItem(**kwargs)
+
+    def create_error_item(self, **kwargs):
+        return keypirinha_api.CatalogItem(category=ItemCategory.ERROR, **kwargs)
+
+    def create_action(self, **kwargs):
+        return keypirinha_api.CatalogAction(**kwargs)
+
+    def set_actions(self, category, actions):
+        pass
+
+    def set_catalog(self, catalog):
+        self.catalog = list(catalog)
+
+    def merge_catalog(self, catalog):
+        self.catalog = (self.catalog or []) + list(catalog)
+
+    def set_suggestions(self, suggestions, match_method=Match.DEFAULT,
+                        sort_method=Sort.DEFAULT):
+        self.suggestions = list(suggestions)
+
+    def set_default_icon(self, icon):
+        pass
+
+    def load_icon(self, *args, **kwargs):
+        return None
+
+    def get_package_cache_path(self, create=False):
+        path = CACHE_DIR
+        if path is None:
+            path = os.path.join(tempfile.gettempdir(), "kpstubs-cache",
+                                self.package_full_name())
+        if create:
+            os.makedirs(path, exist_ok=True)
+        return path
+
+    def _log(self, level, message):
+        self.logs.append((level, message))
+        if ECHO_LOGS:
+            print("{}: {}".format(level, message))
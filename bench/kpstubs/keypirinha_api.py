@@ -0,0 +1,60 @@
+# Keypirinha: a fast launcher for Windows (keypirinha.com)
+#
+# Pure-Python stand-in for the "keypirinha_api" module of the embedded Python
+# runtime (see keypirinha.py).
+
+class CatalogItem:
+    """A catalog item, that only stores the properties it is created with"""
+
+    __slots__ = ("_props", )
+
+    def __init__(self, **props):
+        self._props = props
+
+    def __repr__(self):
+        return "<{} {!r}>".format(self.__class__.__name__, self.label())
+
+    def category(self):
+        return self._props.get("category", 0)
+
+    def label(self):
+        return self._props.get("label", "")
+
+    def short_desc(self):
+        return self._props.get("short_desc", "")
+
+    def target(self):
+        return self._props.get("target", "")
+
+    def args_hint(self):
+        return self._props.get("args_hint", 0)
+
+    def hit_hint(self):
+        return self._props.get("hit_hint", 0)
+
+    def loop_on_suggest(self):
+        return self._props.get("loop_on_suggest", False)
+
+    def data_bag(self):
+        return self._props.get("data_bag", None)
+
+    def raw_args(self):
+        return self._props.get("raw_args", "")
+
+    def set_args(self, args):
+        self._props['raw_args'] = args
+
+    def clone(self):
+        return self.__class__(**self._props)
+
+class CatalogAction:
+    __slots__ = ("_props", )
+
+    def __init__(self, **props):
+        self._props = props
+
+    def name(self):
+        return self._props.get("name", "")
+
+    def label(self):
+        return self._props.get("label", "")
@@ -0,0 +1,87 @@
+# Keypirinha: a fast launcher for Windows (keypirinha.com)
+#
+# Pure-Python stand-in for the "keypirinha_util" module of the embedded Python
+# runtime (see keypirinha.py). The functions that would interact with the
+# desktop do nothing.
+
+import enum
+import os
+import shlex
+
+class ScanFlags(enum.IntFlag):
+    DEFAULT = 0
+    FILES = 0x1
+    DIRS = 0x2
+    HIDDEN = 0x4
+    CASE_SENSITIVE = 0x8
+    ABSPATH = 0x10
+
+def scan_directory(base_dir, name_patterns="*", flags=ScanFlags.DEFAULT,
+                   max_level=0):
+    """
+    Return the paths, relative to *base_dir* unless :py:attr:`ScanFlags.ABSPATH`
+    is set, of the entries of *base_dir* which name matches *name_patterns*,
+    down to *max_level* levels of sub-directories (-1 for no limit).
+    """
+    import fnmatch
+
+    if isinstance(name_patterns, str):
+        name_patterns = (name_patterns, )
+    if not flags & (ScanFlags.FILES | ScanFlags.DIRS):
+        flags |= ScanFlags.FILES
+    if not flags & ScanFlags.CASE_SENSITIVE:
+        name_patterns = [p.lower() for p in name_patterns]
+
+    results = []
+    dirs = [(base_dir, 0)]
+    while dirs:
+        dir_path, level = dirs.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            if not flags & ScanFlags.HIDDEN and entry.name.startswith("."):
+                continue
+            is_dir = entry.is_dir()
+            name = entry.name
+            if not flags & ScanFlags.CASE_SENSITIVE:
+                name = name.lower()
+            if ((is_dir and flags & ScanFlags.DIRS) or
+                    (not is_dir and flags & ScanFlags.FILES)):
+                if any(fnmatch.fnmatchcase(name, p) for p in name_patterns):
+                    if flags & ScanFlags.ABSPATH:
+                        results.append(entry.path)
+                    else:
+                        results.append(os.path.relpath(entry.path, base_dir))
+            if is_dir and (max_level < 0 or level < max_level):
+                dirs.append((entry.path, level + 1))
+    return results
+
+def cmdline_split(cmdline):
+    return shlex.split(cmdline, posix=False)
+
+def cmdline_quote(arg, force_quote=False):
+    if force_quote or not arg or any(c in arg for c in ' \t"'):
+        return '"' + arg.replace('"', '\\"') + '"'
+    return arg
+
+def shell_resolve_exe_path(path):
+    import shutil
+    return shutil.which(path)
+
+def shell_known_folder_path(known_folder_guid):
+    return os.path.expanduser("~")
+
+def shell_execute(*args, **kwargs):
+    pass
+
+def execute_default_action(*args, **kwargs):
+    pass
+
+def set_clipboard(text):
+    pass
+
+def read_link(link_file):
+    return {'target': link_file}
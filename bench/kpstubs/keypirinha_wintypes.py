@@ -0,0 +1,14 @@
+# Keypirinha: a fast launcher for Windows (keypirinha.com)
+#
+# Pure-Python stand-in for the "keypirinha_wintypes" module of the embedded
+# Python runtime (see keypirinha.py). Only the known folders are defined.
+
+import enum
+
+class FOLDERID(enum.Enum):
+    CommonStartMenu = "{A4115719-D62E-491D-AA7C-E74B8BE3B067}"
+    CommonStartup = "{82A5EA35-D9CD-47C5-9629-E15D2F714E6E}"
+    Desktop = "{B4BFCC3A-DB2C-424C-B029-7FE99A87C641}"
+    PublicDesktop = "{C4AA340D-F20F-4863-AFEF-F87EF2E6BA25}"
+    StartMenu = "{625B53C3-AB48-4EC1-BA1F-A1EF4146FC19}"
+    Startup = "{B97D20BB-F46A-4C97-BA10-5E3608430854}"
@@ -0,0 +1,96 @@
+# Keypirinha: a fast launcher for Windows (keypirinha.com)
+#
+# Generate reproducible synthetic directory trees for the benchmarks.
+
+import json
+import os
+import random
+import shutil
+
+DEFAULT_DEPTH = 6
+DEFAULT_FANOUT = 8
+DEFAULT_EXTENSIONS = (
+    ("exe", 10), ("dll", 15), ("lnk", 5), ("txt", 15), ("md", 5),
+    ("doc", 10), ("pdf", 10), ("jpg", 15), ("py", 10), ("", 5))
+DEFAULT_SEED = 0
+HIDDEN_RATIO = 0.02 # share of the entries which name starts with a dot
+
+MANIFEST_SUFFIX = ".synthtree.json"
+
+def parse_extensions(value):
+    """
+    Parse an extension mix like ``"exe:10,txt:5,:1"`` into a tuple of
+    ``(extension, weight)`` pairs. An empty extension produces files without
+    extension.
+    """
+    mix = []
+    for part in value.split(","):
+        ext, _, weight = part.strip().partition(":")
+        mix.append((ext.strip().lstrip("."), int(weight) if weight else 1))
+    return tuple(mix)
+
+def generate(root, entries, depth=DEFAULT_DEPTH, fanout=DEFAULT_FANOUT,
+             extensions=DEFAULT_EXTENSIONS, seed=DEFAULT_SEED):
+    """
+    Create a tree of *entries* files and directories under *root*, and return
+    the number of directories created.
+
+    Directories are created breadth-first, *fanout* sub-directories per
+    directory and down to *depth* levels below *root*, until they make up for
+    about 5% of the entries. The files are then spread randomly across all the
+    directories, with the given extension mix.
+
+    The same arguments always produce the same tree. A tree that already
+    exists with the same arguments is not generated again, which is told by a
+    manifest file written next to *root*.
+    """
+    params = {
+        'entries': entries, 'depth': depth, 'fanout': fanout,
+        'extensions': [list(ext) for ext in extensions], 'seed': seed}
+    manifest_file = root.rstrip("\\/") + MANIFEST_SUFFIX
+    try:
+        with open(manifest_file, "r", encoding="utf-8") as fh:
+            manifest = json.load(fh)
+        if manifest['params'] == params and os.path.isdir(root):
+            return manifest['dirs']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    if os.path.exists(manifest_file):
+        os.remove(manifest_file)
+    shutil.rmtree(root, ignore_errors=True)
+    os.makedirs(root)
+
+    rng = random.Random(seed)
+    max_dirs = max(1, entries // 20)
+    dirs = [(root, 0)]
+    idx = 0
+    while idx < len(dirs) and len(dirs) < max_dirs:
+        dir_path, level = dirs[idx]
+        idx += 1
+        if level >= depth:
+            continue
+        for sub_idx in range(fanout):
+            if len(dirs) >= max_dirs:
+                break
+            sub_path = os.path.join(dir_path, _name(rng, "d", sub_idx))
+            os.mkdir(sub_path)
+            dirs.append((sub_path, level + 1))
+
+    ext_names = [ext for ext, _ in extensions]
+    ext_weights = [weight for _, weight in extensions]
+    files_count = max(0, entries - (len(dirs) - 1))
+    for file_idx in range(files_count):
+        dir_path = dirs[rng.randrange(len(dirs))][0]
+        ext = rng.choices(ext_names, ext_weights)[0]
+        name = _name(rng, "f", file_idx) + ("." + ext if ext else "")
+        with open(os.path.join(dir_path, name), "wb"):
+            pass
+
+    with open(manifest_file, "w", encoding="utf-8") as fh:
+        json.dump({'params': params, 'dirs': len(dirs) - 1}, fh)
+    return len(dirs) - 1
+
+def _name(rng, prefix, idx):
+    hidden = "." if rng.random() < HIDDEN_RATIO else ""
+    return "{}{}{}_{:x}".format(hidden, prefix, idx, rng.getrandbits(24))
@@ -0,0 +1,14 @@
+# Keypirinha: a fast launcher for Windows (keypirinha.com)
+#
+# The tests run outside of Keypirinha, with the stand-ins of the modules of its
+# embedded Python runtime that the benchmarks use (see bench/kpstubs).
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench"))
+
+import benchlib
+
+benchlib.setup_stubs()
@@ -0,0 +1,47 @@
+# Keypirinha: a fast launcher for Windows (keypirinha.com)
+
+import keypirinha_util as kpu
+import pytest
+
+from Apps import apps
+
+@pytest.fixture
+def plugin(monkeypatch):
+    monkeypatch.setattr(kpu, "shell_resolve_exe_path",
+                        lambda path: "C:\\Windows\\System32\\" + path)
+    return apps.CustomCmds()
+
+def _custcmd(plugin, cmd_lines):
+    return {
+        'cmds': cmd_lines,
+        'templates': [plugin._customcmd_compile(cmdline)
+                      for cmdline in cmd_lines]}
+
+def test_apply_args(plugin):
+    custcmd = _custcmd(plugin, [
+        "cmd.exe /c echo {{0}} {{q1}} {{2}} [{{*}}]",
+        "notepad.exe {{q2}}"])
+    assert plugin._customcmd_apply_args(custcmd, ' a "b c" ') == [
+        'cmd.exe /c echo C:\\Windows\\System32\\cmd.exe "a" "\\"b c\\"" ' +
+            '[a "b c"]',
+        'notepad.exe "\\"b c\\""']
+
+def test_unsplittable_args_keep_cmd_lines(plugin):
+    # like it always did, an argument string that cannot be split leaves the
+    # command lines untouched, even the ones that do not need it split
+    cmd_lines = ["cmd.exe /c echo {{*}}", "notepad.exe"]
+    custcmd = _custcmd(plugin, cmd_lines)
+    assert plugin._customcmd_apply_args(custcmd, 'a "b') == cmd_lines
+
+def test_unsplittable_cmd_line_keeps_cmd_lines(plugin):
+    cmd_lines = ["notepad.exe {{1}}", '"cmd.exe /c echo {{*}}']
+    custcmd = _custcmd(plugin, cmd_lines)
+    assert plugin._customcmd_apply_args(custcmd, "a") == cmd_lines
+
+def test_unresolvable_exe_keeps_cmd_lines(plugin, monkeypatch):
+    def _resolve(path):
+        raise OSError(path)
+    monkeypatch.setattr(kpu, "shell_resolve_exe_path", _resolve)
+    cmd_lines = ["notepad.exe {{1}}"]
+    custcmd = _custcmd(plugin, cmd_lines)
+    assert plugin._customcmd_apply_args(custcmd, "a") == cmd_lines
@@ -0,0 +1,48 @@
+# Keypirinha: a fast launcher for Windows (keypirinha.com)
+
+import keypirinha as kp
+import pytest
+
+from Calc import calc
+
+@pytest.fixture
+def plugin(monkeypatch):
+    monkeypatch.setattr(kp, "SETTINGS_TEXT", "")
+    plugin = calc.Calc()
+    plugin.on_start()
+    return plugin
+
+def _labels(plugin, user_input):
+    plugin.on_suggest(user_input, [])
+    return [item.label() for item in plugin.suggestions]
+
+def _forbid(plugin, monkeypatch, *method_names):
+    def _fail(value):
+        raise AssertionError("variant computed over max_results")
+    for name in method_names:
+        monkeypatch.setattr(plugin, name, _fail)
+
+def test_default_cap_skips_int_formatting(plugin, monkeypatch):
+    _forbid(plugin, monkeypatch, "_numberfmt", "_currencyfmt")
+    assert _labels(plugin, "1234*5678") == [
+        "= 7006652", "= 0x6ae9bc", "= 0b11010101110100110111100",
+        "= 0o32564674"]
+
+def test_default_cap_skips_float_formatting(plugin, monkeypatch):
+    _forbid(plugin, monkeypatch, "_numberfmt", "_currencyfmt")
+    labels = _labels(plugin, "2.5*400")
+    # the decimal variants of the same length come in no particular order
+    assert set(labels[0:2]) == {"= 1000", "= 1e+3"}
+    assert labels[2:] == ["= 0x3e8", "= 0b1111101000"]
+
+def test_cap_skips_base_conversions(plugin, monkeypatch):
+    plugin.max_results = 1
+    _forbid(plugin, monkeypatch, "_numberfmt", "_currencyfmt")
+    assert _labels(plugin, "2**64") == ["= 18446744073709551616"]
+
+def test_raised_cap_gives_every_variant(plugin, monkeypatch):
+    monkeypatch.setattr(plugin, "currency_from_system", False)
+    plugin.max_results = 10
+    assert _labels(plugin, "1234*5678") == [
+        "= 7006652", "= 0x6ae9bc", "= 0b11010101110100110111100",
+        "= 0o32564674", "= 7,006,652"]